@@ -2,18 +2,26 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Avg, Sum, Count
+from revintel.query_budget import QueryBudgetMixin
+from revintel.admin_utils import CalendarDateHierarchyMixin
+from sales.models import Sale
+from .metrics import sync_metrics
 from .models import SalesMetric, DashboardFilter
 
 
 @admin.register(SalesMetric)
-class SalesMetricAdmin(admin.ModelAdmin):
+class SalesMetricAdmin(QueryBudgetMixin, CalendarDateHierarchyMixin, admin.ModelAdmin):
     """Administrador avanzado para métricas de ventas"""
+
+    changelist_query_budget = 8
+    changeform_query_budget = 4
     
     list_display = [
         'get_sale_id',
         'get_customer',
         'get_product',
         'revenue',
+        'cost',
         'profit',
         'get_profit_margin',
         'get_performance',
@@ -32,6 +40,9 @@ class SalesMetricAdmin(admin.ModelAdmin):
     
     readonly_fields = [
         'created_at',
+        'revenue',
+        'cost',
+        'profit',
         'get_sale_details',
         'get_profit_margin',
         'get_roi'
@@ -42,7 +53,7 @@ class SalesMetricAdmin(admin.ModelAdmin):
             'fields': ('sale',)
         }),
         ('Métricas Financieras', {
-            'fields': ('revenue', 'profit')
+            'fields': ('revenue', 'cost', 'profit')
         }),
         ('Análisis', {
             'fields': ('get_profit_margin', 'get_roi', 'get_sale_details'),
@@ -54,6 +65,9 @@ class SalesMetricAdmin(admin.ModelAdmin):
         }),
     )
     
+    # Un <select> con todas las ventas (y 2 consultas por opción) no escala
+    autocomplete_fields = ['sale']
+
     date_hierarchy = 'created_at'
     
     actions = ['recalculate_metrics', 'export_metrics']
@@ -181,20 +195,23 @@ class SalesMetricAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('sale__customer', 'sale__product')
+
+    def get_readonly_fields(self, request, obj=None):
+        # La venta de una métrica existente no cambia
+        readonly = list(super().get_readonly_fields(request, obj))
+        return readonly + ['sale'] if obj else readonly
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'sale':
+            kwargs['queryset'] = Sale.objects.select_related('customer', 'product')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
     
     # Acciones personalizadas
     
     @admin.action(description='Recalcular métricas')
     def recalculate_metrics(self, request, queryset):
-        """Recalcula las métricas de las ventas seleccionadas"""
-        for metric in queryset:
-            # Lógica de cálculo
-            metric.revenue = metric.sale.total_price
-            # Ejemplo: profit = 40% del revenue
-            metric.profit = metric.revenue * 0.4
-            metric.save()
-        
-        count = queryset.count()
+        """Recalcula las métricas de las ventas seleccionadas (un solo UPDATE)"""
+        _, count = sync_metrics(Sale.objects.filter(pk__in=queryset.values('sale_id')))
         self.message_user(
             request,
             f'Métricas recalculadas para {count} venta(s).'
@@ -210,8 +227,11 @@ class SalesMetricAdmin(admin.ModelAdmin):
 
 
 @admin.register(DashboardFilter)
-class DashboardFilterAdmin(admin.ModelAdmin):
+class DashboardFilterAdmin(QueryBudgetMixin, admin.ModelAdmin):
     """Administrador para filtros de dashboard"""
+
+    changelist_query_budget = 7
+    changeform_query_budget = 4
     
     list_display = [
         'name',
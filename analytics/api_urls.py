@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import live, views
 
 app_name = 'analytics_api'
 
@@ -10,4 +10,16 @@ urlpatterns = [
     path('top-customers/', views.TopCustomersView.as_view(), name='top_customers'),
     path('products/', views.ProductDistributionView.as_view(), name='products'),
     path('list/', views.SalesListView.as_view(), name='list'),
+    path('pivot/', views.PivotView.as_view(), name='pivot'),
+    path('bulk/', views.BulkSaleIngestView.as_view(), name='bulk'),
+    path('buffered/', views.BufferedSaleView.as_view(), name='buffered'),
+    path('buffered/<str:ticket>/', views.BufferedSaleStatusView.as_view(), name='buffered_status'),
+    path('changes/', views.ChangeLogView.as_view(), name='changes'),
+    path('changes/commit/', views.ChangeLogCommitView.as_view(), name='changes_commit'),
+    path('stats/customers/', views.CustomerStatsView.as_view(), name='customer_stats'),
+    path('stats/products/', views.ProductStatsView.as_view(), name='product_stats'),
+    path('typeahead/customers/', views.CustomerTypeaheadView.as_view(), name='customer_typeahead'),
+    path('typeahead/products/', views.ProductTypeaheadView.as_view(), name='product_typeahead'),
+    path('typeahead/categories/', views.CategoryTypeaheadView.as_view(), name='category_typeahead'),
+    path('live/kpis/', live.kpi_stream, name='live_kpis'),
 ]
@@ -0,0 +1,172 @@
+# analytics/live.py
+"""
+KPIs en directo para los dashboards abiertos (Server-Sent Events).
+
+``GET /api/sales/live/kpis/?<filtros>`` mantiene abierta la respuesta y envía
+un evento ``kpis`` con los KPIs y el punto de hoy de la serie diaria cada vez
+que se confirma un cambio en el ChangeLog. Necesita un servidor ASGI
+(``revintel.asgi``, p. ej. ``uvicorn revintel.asgi:application``); bajo WSGI
+responde 204 y el navegador no reintenta.
+
+``LiveHub`` comparte el trabajo entre conexiones: una sola tarea por proceso
+consulta el último ``seq`` cada ``LIVE_KPI_POLL_INTERVAL`` segundos mientras
+haya suscriptores, y los agregados se calculan una vez por cada combinación
+de filtros distinta, no una vez por espectador.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from sales.changelog import latest_seq
+from . import services
+from .serializers import KPISerializer, SalesByPeriodSerializer
+from .services import SalesFilters
+
+logger = logging.getLogger(__name__)
+
+
+def filter_key(params):
+    """Clave de suscripción: los filtros validados (``SalesFilters`` es inmutable)."""
+    return SalesFilters.from_params(params)
+
+
+def live_payload(key):
+    """KPIs y ventas de hoy con los filtros de ``key``, y el ``seq`` al que corresponden."""
+    # El seq se lee antes de agregar: un cambio durante el cálculo se verá en la siguiente consulta
+    seq = latest_seq()
+    today = services.sales_by_period(key, 'day', days=[timezone.localdate()])
+    return {
+        'seq': seq,
+        'kpis': KPISerializer(services.kpis(key)).data,
+        'today': SalesByPeriodSerializer(today[0]).data if today else None,
+    }
+
+
+def _offer(queue, payload):
+    # Un cliente lento sólo necesita el último estado: se descarta el pendiente
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+class _Subscription:
+    def __init__(self):
+        self.queues = set()
+        self.payload = None
+        self.lock = asyncio.Lock()
+
+
+class LiveHub:
+    """Suscripciones por filtros y tarea de sondeo del ChangeLog de un event loop."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.subscriptions = {}
+        self.seq = None
+        self._task = None
+
+    async def _refresh(self, key, subscription, seq):
+        async with subscription.lock:
+            if subscription.payload is None or subscription.payload['seq'] < seq:
+                subscription.payload = await sync_to_async(live_payload)(key)
+            return subscription.payload
+
+    async def subscribe(self, key):
+        """Cola que recibe el estado actual y los siguientes cambios de ``key``."""
+        subscription = self.subscriptions.setdefault(key, _Subscription())
+        queue = asyncio.Queue(maxsize=1)
+        subscription.queues.add(queue)
+
+        try:
+            if self.seq is None:
+                self.seq = await sync_to_async(latest_seq)()
+            _offer(queue, await self._refresh(key, subscription, self.seq))
+        except BaseException:
+            # Sin cola que devolver, _event_stream no llegará a darla de baja
+            self.unsubscribe(key, queue)
+            raise
+
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, key, queue):
+        subscription = self.subscriptions.get(key)
+        if subscription is None:
+            return
+        subscription.queues.discard(queue)
+        if not subscription.queues:
+            del self.subscriptions[key]
+        if not self.subscriptions and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def poll(self):
+        """Si hay cambios nuevos, recalcula cada filtro suscrito y lo envía a sus colas."""
+        seq = await sync_to_async(latest_seq)()
+        if seq == self.seq:
+            return
+        self.seq = seq
+        for key, subscription in list(self.subscriptions.items()):
+            payload = await self._refresh(key, subscription, seq)
+            for queue in subscription.queues:
+                _offer(queue, payload)
+
+    async def _run(self):
+        while self.subscriptions:
+            await asyncio.sleep(settings.LIVE_KPI_POLL_INTERVAL)
+            try:
+                await self.poll()
+            except Exception:
+                # Un error puntual (p. ej. "database is locked") no debe dejar
+                # sin eventos a los suscriptores: se reintenta en el siguiente ciclo
+                logger.exception("Error consultando el ChangeLog para los KPIs en directo")
+
+
+_hub = None
+
+
+def get_hub():
+    """``LiveHub`` del event loop actual (uno por proceso bajo ASGI)."""
+    global _hub
+    if _hub is None or _hub.loop is not asyncio.get_running_loop():
+        _hub = LiveHub()
+    return _hub
+
+
+async def _event_stream(hub, key):
+    queue = await hub.subscribe(key)
+    try:
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), settings.LIVE_KPI_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": ping\n\n"
+                continue
+            data = json.dumps(payload, cls=DjangoJSONEncoder)
+            yield f"id: {payload['seq']}\nevent: kpis\ndata: {data}\n\n"
+    finally:
+        hub.unsubscribe(key, queue)
+
+
+async def kpi_stream(request):
+    """Flujo SSE de KPIs con los mismos filtros que ``/api/sales/kpis/``."""
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI un flujo sin fin ocuparía un worker; con 204 EventSource no reconecta
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        _event_stream(get_hub(), filter_key(request.GET)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,30 @@
+# analytics/management/commands/recalculate_metrics.py
+"""
+Recalcula ``SalesMetric`` para todas las ventas (o un rango de fechas) con
+dos sentencias sobre conjuntos: útil tras cambiar costes unitarios o para
+rellenar las métricas de datos antiguos.
+"""
+from django.core.management.base import BaseCommand
+
+from analytics.metrics import sync_metrics
+from sales.models import Sale
+
+
+class Command(BaseCommand):
+    help = "Crea y recalcula las métricas de ventas (ingresos, coste y beneficio)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Sólo ventas desde esta fecha (AAAA-MM-DD)')
+        parser.add_argument('--date-to', help='Sólo ventas hasta esta fecha (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        sales = Sale.objects.all()
+        if options['date_from']:
+            sales = sales.filter(sale_date__date__gte=options['date_from'])
+        if options['date_to']:
+            sales = sales.filter(sale_date__date__lte=options['date_to'])
+
+        created, updated = sync_metrics(sales)
+        self.stdout.write(self.style.SUCCESS(
+            f"Métricas creadas: {created}, recalculadas: {updated}."
+        ))
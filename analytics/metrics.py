@@ -0,0 +1,85 @@
+# analytics/metrics.py
+"""
+Cálculo de ``SalesMetric`` con sentencias sobre conjuntos.
+
+- ingresos = ``Sale.total_price``
+- coste = coste unitario del producto x cantidad (``Product.unit_cost`` o,
+  si no se conoce, ``price * Product.DEFAULT_COST_RATIO``)
+- beneficio = ingresos - coste (columna generada por la base de datos)
+
+``sync_metrics`` crea las métricas que faltan con un único
+``INSERT ... SELECT`` y recalcula las existentes con un único ``UPDATE``,
+sin cargar filas en Python. Las señales de ``analytics.signals`` lo invocan
+para cada venta guardada o insertada en bloque, y para las ventas de un
+producto cuyo precio o coste unitario cambia.
+"""
+from django.db import connection
+from django.db.models import DateTimeField, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from sales import calendar_days
+from sales.models import Product, Sale
+from .models import SalesMetric
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def cost_expression():
+    """Coste de una venta (sobre un queryset de ``Sale``)."""
+    unit_cost = Coalesce(
+        F('product__unit_cost'),
+        ExpressionWrapper(F('product__price') * Value(Product.DEFAULT_COST_RATIO), output_field=MONEY),
+        output_field=MONEY,
+    )
+    return Round(ExpressionWrapper(unit_cost * F('quantity'), output_field=MONEY), 2, output_field=MONEY)
+
+
+def _create_missing(sales, now):
+    """Inserta las métricas que faltan con un solo INSERT ... SELECT. Devuelve cuántas."""
+    rows = (
+        sales.filter(salesmetric__isnull=True)
+        .order_by()
+        .annotate(
+            metric_sale=F('pk'),
+            metric_revenue=F('total_price'),
+            metric_cost=cost_expression(),
+            metric_created=Value(now, output_field=DateTimeField()),
+        )
+        .values('metric_sale', 'metric_revenue', 'metric_cost', 'metric_created')
+    )
+    select_sql, params = rows.query.sql_with_params()
+
+    opts = SalesMetric._meta
+    qn = connection.ops.quote_name
+    columns = ', '.join(
+        qn(opts.get_field(name).column) for name in ('sale', 'revenue', 'cost', 'created_at')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(opts.db_table)} ({columns}) {select_sql}", params)
+        return cursor.rowcount
+
+
+def _update_existing(sales):
+    """Recalcula ingresos y coste de las métricas existentes con un solo UPDATE."""
+    sale = Sale.objects.filter(pk=OuterRef('sale_id'))
+    return SalesMetric.objects.filter(sale__in=sales.order_by().values('pk')).update(
+        revenue=Subquery(sale.values('total_price')[:1]),
+        cost=Subquery(sale.annotate(metric_cost=cost_expression()).values('metric_cost')[:1]),
+    )
+
+
+def sync_metrics(sales=None):
+    """
+    Crea o recalcula las métricas de las ventas del queryset (todas por defecto).
+    Devuelve ``(creadas, actualizadas)``.
+    """
+    sales = Sale.objects.all() if sales is None else sales
+    now = timezone.now()
+    updated = _update_existing(sales)
+    created = _create_missing(sales, now)
+    if created:
+        # El INSERT no emite post_save: las métricas nuevas se suman al calendario del admin
+        calendar_days.add(calendar_days.source_for(SalesMetric, 'created_at'), calendar_days.to_day(now), created)
+    return created, updated
+
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+def profit_to_cost(apps, schema_editor):
+    # Conserva el beneficio ya calculado: coste = ingresos - beneficio
+    SalesMetric = apps.get_model('analytics', 'SalesMetric')
+    SalesMetric.objects.update(cost=models.F('revenue') - models.F('profit'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('sales', '0006_product_unit_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesmetric',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(profit_to_cost, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='salesmetric',
+            name='profit',
+        ),
+        migrations.AddField(
+            model_name='salesmetric',
+            name='profit',
+            field=models.GeneratedField(db_persist=True, expression=models.F('revenue') - models.F('cost'), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:20
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def fill_calendar(apps, schema_editor):
+    # Carga inicial del calendario del admin para las métricas
+    CalendarDay = apps.get_model('sales', 'CalendarDay')
+    SalesMetric = apps.get_model('analytics', 'SalesMetric')
+    rows = (
+        SalesMetric.objects.order_by()
+        .annotate(calendar_day=TruncDate('created_at'))
+        .values('calendar_day')
+        .annotate(calendar_count=models.Count('pk'))
+    )
+    CalendarDay.objects.bulk_create(
+        CalendarDay(source='analytics.SalesMetric.created_at', day=row['calendar_day'], count=row['calendar_count'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_salesmetric_cost_generated_profit'),
+        ('sales', '0008_calendar_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_calendar, migrations.RunPython.noop),
+    ]
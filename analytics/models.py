@@ -4,9 +4,19 @@ from django.utils.timezone import now
 from sales.models import Sale
 
 class SalesMetric(models.Model):
+    """
+    Ingresos, coste y beneficio de cada venta. Se mantiene con sentencias SQL
+    sobre conjuntos (``analytics.metrics.sync_metrics``); ``profit`` lo calcula
+    la propia base de datos.
+    """
     sale = models.OneToOneField(Sale, on_delete=models.CASCADE)
     revenue = models.DecimalField(max_digits=12, decimal_places=2)
-    profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    profit = models.GeneratedField(
+        expression=models.F("revenue") - models.F("cost"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
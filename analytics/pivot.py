@@ -0,0 +1,220 @@
+# analytics/pivot.py
+"""
+Consultas pivote sobre las ventas: cualquier combinación de dimensiones ×
+medidas en una sola consulta.
+
+``PivotQuery.from_params`` valida dimensiones, medidas, orden y límite contra
+las listas blancas ``DIMENSIONS`` y ``MEASURES`` (los filtros son los de
+``SalesFilters``) y ``run`` la compila a un único ``GROUP BY``. Un cruce como
+categoría × mes, que antes eran N peticiones, es una sola consulta.
+
+Sin filtros, si una tabla precalculada cubre la consulta se lee de ella en vez
+de recorrer las ventas:
+
+- ``CustomerStats`` / ``ProductStats``: por cliente o por producto con
+  facturación, pedidos, unidades o ticket medio;
+- ``CalendarDay``: pedidos por día, mes o año.
+"""
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.db.models import Avg, Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncYear
+from rest_framework import serializers
+
+from sales.calendar_days import source_for
+from sales.models import CalendarDay, CustomerStats, ProductStats, Sale
+from .services import SalesFilters
+
+PIVOT_MAX_DIMENSIONS = 3
+PIVOT_MAX_LIMIT = 1000
+PIVOT_DEFAULT_LIMIT = 100
+
+
+@dataclass(frozen=True)
+class Dimension:
+    expression: Any
+    # Columna que separa valores con la misma etiqueta (p. ej. clientes homónimos)
+    key: str | None = None
+    date_format: str | None = None
+    empty_label: str | None = None
+
+    def format(self, value):
+        # Los CharField con blank=True guardan '' en vez de NULL
+        if value is None or value == '':
+            return self.empty_label
+        if self.date_format:
+            return value.strftime(self.date_format)
+        return value
+
+
+@dataclass(frozen=True)
+class Measure:
+    aggregate: Any
+    # Campo DRF que da al valor el mismo formato que el resto de la API
+    output: serializers.Field
+
+
+DIMENSIONS = {
+    'day': Dimension(TruncDate('sale_date'), date_format='%Y-%m-%d'),
+    'month': Dimension(TruncMonth('sale_date'), date_format='%Y-%m'),
+    'year': Dimension(TruncYear('sale_date'), date_format='%Y'),
+    'category': Dimension(F('product__category'), empty_label='Sin categoría'),
+    'product': Dimension(F('product__name'), key='product_id'),
+    'customer': Dimension(F('customer__name'), key='customer_id'),
+}
+
+MEASURES = {
+    'revenue': Measure(Sum('total_price'), serializers.DecimalField(max_digits=14, decimal_places=2)),
+    'orders': Measure(Count('id'), serializers.IntegerField()),
+    'quantity': Measure(Sum('quantity'), serializers.IntegerField()),
+    'average_order': Measure(Avg('total_price'), serializers.DecimalField(max_digits=12, decimal_places=2)),
+    'customers': Measure(Count('customer', distinct=True), serializers.IntegerField()),
+}
+
+
+def _names(value, allowed, kind):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError(f"{kind} no válidas: {', '.join(unknown)}. Admitidas: {', '.join(allowed)}.")
+    if len(set(names)) != len(names):
+        raise ValidationError(f"{kind} repetidas.")
+    return tuple(names)
+
+
+@dataclass(frozen=True)
+class PivotQuery:
+    """Consulta pivote validada: dimensiones, medidas, filtros, orden y límite."""
+    dimensions: tuple = ()
+    measures: tuple = ('revenue', 'orders')
+    filters: SalesFilters = field(default_factory=SalesFilters)
+    sort: str | None = None
+    limit: int = PIVOT_DEFAULT_LIMIT
+
+    @classmethod
+    def from_params(cls, params):
+        """Consulta de los parámetros de una petición; lanza ``ValidationError`` si no es válida."""
+        dimensions = _names(params.get('dimensions', ''), DIMENSIONS, 'Dimensiones')
+        if len(dimensions) > PIVOT_MAX_DIMENSIONS:
+            raise ValidationError(f"Como máximo {PIVOT_MAX_DIMENSIONS} dimensiones.")
+        measures = _names(params.get('measures', 'revenue,orders'), MEASURES, 'Medidas')
+        if not measures:
+            raise ValidationError("Indica al menos una medida.")
+
+        sort = params.get('sort') or None
+        if sort is not None and sort.lstrip('-') not in dimensions + measures:
+            raise ValidationError("sort debe ser una de las dimensiones o medidas pedidas (con '-' para descendente).")
+
+        try:
+            limit = int(params.get('limit', PIVOT_DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError("limit debe ser un entero.")
+
+        return cls(
+            dimensions=dimensions,
+            measures=measures,
+            filters=SalesFilters.from_params(params),
+            sort=sort,
+            limit=max(1, min(limit, PIVOT_MAX_LIMIT)),
+        )
+
+
+def _stats_rollup(query):
+    """Estadísticas por cliente o producto (``sales.stats``) si cubren la consulta."""
+    if len(query.dimensions) != 1 or query.dimensions[0] not in ('customer', 'product'):
+        return None
+    if not set(query.measures) <= {'revenue', 'orders', 'quantity', 'average_order'}:
+        return None
+
+    name = query.dimensions[0]
+    model = CustomerStats if name == 'customer' else ProductStats
+    return model.objects.filter(sales_count__gt=0).annotate(**{
+        f'd_{name}': F(f'{name}__name'),
+        f'k_{name}': F(f'{name}_id'),
+        'm_revenue': F('revenue'),
+        'm_orders': F('sales_count'),
+        'm_quantity': F('quantity'),
+        'm_average_order': F('average'),
+    }).values(f'd_{name}', f'k_{name}', *(f'm_{measure}' for measure in query.measures))
+
+
+CALENDAR_DIMENSIONS = {'day': F('day'), 'month': TruncMonth('day'), 'year': TruncYear('day')}
+
+
+def _calendar_rollup(query):
+    """Pedidos por día, mes o año desde ``CalendarDay`` (``sales.calendar_days``)."""
+    if not set(query.dimensions) <= set(CALENDAR_DIMENSIONS) or query.measures != ('orders',):
+        return None
+    days = CalendarDay.objects.filter(source=source_for(Sale, 'sale_date'), count__gt=0)
+    group = {f'd_{name}': CALENDAR_DIMENSIONS[name] for name in query.dimensions}
+    if not group:
+        return [days.aggregate(m_orders=Sum('count'))]
+    return days.annotate(**group).values(*group).annotate(m_orders=Sum('count'))
+
+
+ROLLUPS = {
+    'stats': _stats_rollup,
+    'calendar': _calendar_rollup,
+}
+
+
+def _sales_query(query):
+    group = {}
+    for name in query.dimensions:
+        dimension = DIMENSIONS[name]
+        group[f'd_{name}'] = dimension.expression
+        if dimension.key:
+            group[f'k_{name}'] = F(dimension.key)
+    aggregates = {f'm_{name}': MEASURES[name].aggregate for name in query.measures}
+
+    qs = query.filters.queryset()
+    if not group:
+        # Sin dimensiones: una sola fila con los totales
+        return [qs.aggregate(**aggregates)]
+    return qs.annotate(**group).values(*group).annotate(**aggregates)
+
+
+def run(query):
+    """
+    Ejecuta la consulta. Devuelve ``(filas, origen)``: cada fila es un dict con
+    las dimensiones pedidas (y ``<dimensión>_id`` en cliente y producto) y las
+    medidas; ``origen`` es ``'sales'`` o el resumen precalculado usado (``ROLLUPS``).
+    """
+    qs, source = None, 'sales'
+    if not query.filters.as_params():
+        for name, rollup in ROLLUPS.items():
+            qs = rollup(query)
+            if qs is not None:
+                source = name
+                break
+    if qs is None:
+        qs = _sales_query(query)
+
+    # Orden pedido y, para desempatar, las dimensiones en el orden indicado
+    order = []
+    if query.sort and query.dimensions:
+        descending = query.sort.startswith('-')
+        name = query.sort.lstrip('-')
+        column = f'd_{name}' if name in query.dimensions else f'm_{name}'
+        order.append(f"{'-' if descending else ''}{column}")
+    for name in query.dimensions:
+        order.append(f'd_{name}')
+        if DIMENSIONS[name].key:
+            order.append(f'k_{name}')
+    if order:
+        qs = qs.order_by(*order)
+
+    rows = []
+    for item in qs[:query.limit]:
+        row = {}
+        for name in query.dimensions:
+            row[name] = DIMENSIONS[name].format(item[f'd_{name}'])
+            if DIMENSIONS[name].key:
+                row[f'{name}_id'] = item[f'k_{name}']
+        for name in query.measures:
+            value = item[f'm_{name}']
+            row[name] = MEASURES[name].output.to_representation(value) if value is not None else None
+        rows.append(row)
+    return rows, source
@@ -0,0 +1,33 @@
+# analytics/renderers.py
+"""
+Respuestas en columnas (``?format=columnar``) para agregados grandes.
+
+Una lista de objetos repite cada clave en cada fila y envía los importes como
+texto. En columnas la respuesta es ``{"columns": [...], "data": {columna:
+[valores]}}`` con los importes como números: Chart.js usa cada columna
+directamente como ``labels`` o ``data`` de un gráfico.
+"""
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON elegido con ``?format=columnar``; la vista construye la forma en columnas."""
+    format = 'columnar'
+
+
+def is_columnar(request):
+    return request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+
+def to_columnar(serializer):
+    """``{columns, data}`` a partir de un serializer ``many=True``."""
+    fields = serializer.child.fields
+    rows = serializer.data
+    data = {}
+    for name, field in fields.items():
+        values = [row[name] for row in rows]
+        if isinstance(field, serializers.DecimalField):
+            values = [float(value) if value is not None else None for value in values]
+        data[name] = values
+    return {'columns': list(fields), 'data': data}
@@ -1,6 +1,6 @@
 # analytics/serializers.py
 from rest_framework import serializers
-from sales.models import Sale, Product, Customer
+from sales.models import Sale, Product, Customer, CustomerStats, ProductStats
 
 
 class SaleSerializer(serializers.ModelSerializer):
@@ -46,3 +46,126 @@ class ProductDistributionSerializer(serializers.Serializer):
     product_name = serializers.CharField()
     quantity_sold = serializers.IntegerField()
     revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class SalesPageSerializer(serializers.Serializer):
+    data = SaleSerializer(source='sales', many=True)
+    total = serializers.IntegerField()
+    page = serializers.IntegerField()
+    per_page = serializers.IntegerField()
+    total_pages = serializers.IntegerField()
+
+
+class KPIDeltaSerializer(serializers.Serializer):
+    watermark = serializers.IntegerField()
+    reset = serializers.BooleanField()
+    kpis = KPISerializer(allow_null=True)
+
+
+class SalesByPeriodDeltaSerializer(serializers.Serializer):
+    watermark = serializers.IntegerField()
+    reset = serializers.BooleanField()
+    periods = SalesByPeriodSerializer(many=True)
+
+
+class SalesListDeltaSerializer(serializers.Serializer):
+    watermark = serializers.IntegerField()
+    reset = serializers.BooleanField()
+    upserted = SaleSerializer(many=True)
+    removed = serializers.ListField(child=serializers.IntegerField())
+
+
+class PivotResultSerializer(serializers.Serializer):
+    dimensions = serializers.ListField(child=serializers.CharField())
+    measures = serializers.ListField(child=serializers.CharField())
+    source = serializers.CharField()
+    rows = serializers.ListField(child=serializers.DictField())
+
+
+class BulkSaleIngestSerializer(serializers.Serializer):
+    idempotency_key = serializers.CharField(max_length=100, required=False)
+    # Las filas se validan una a una en sales.services.ingest_sales para
+    # poder reportar errores por fila sin rechazar el lote completo.
+    sales = serializers.ListField(child=serializers.JSONField(), allow_empty=False, max_length=10000)
+
+
+class BulkSaleIngestResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    sale_ids = serializers.ListField(child=serializers.IntegerField())
+    errors = serializers.ListField(child=serializers.DictField())
+    replayed = serializers.BooleanField()
+
+
+class BufferedSaleSerializer(serializers.Serializer):
+    customer = serializers.IntegerField()
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BufferedSaleTicketSerializer(serializers.Serializer):
+    ticket = serializers.CharField()
+
+
+class BufferedSaleStatusSerializer(serializers.Serializer):
+    ticket = serializers.CharField()
+    status = serializers.ChoiceField(choices=['pending', 'created', 'rejected'])
+    sale = serializers.IntegerField(allow_null=True)
+    errors = serializers.DictField(allow_null=True)
+
+
+class ChangeSerializer(serializers.Serializer):
+    seq = serializers.IntegerField()
+    entity = serializers.CharField()
+    object_id = serializers.IntegerField()
+    action = serializers.CharField()
+    payload = serializers.JSONField()
+    created_at = serializers.DateTimeField()
+
+
+class ChangeLogPageSerializer(serializers.Serializer):
+    changes = ChangeSerializer(many=True)
+    next = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+
+
+class ChangeLogCommitSerializer(serializers.Serializer):
+    consumer = serializers.CharField(max_length=100)
+    seq = serializers.IntegerField(min_value=0)
+
+
+class CustomerStatsSerializer(serializers.ModelSerializer):
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    # Columna generada: en SQLite llega como float
+    average = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CustomerStats
+        fields = [
+            'customer', 'customer_name', 'sales_count', 'quantity', 'revenue',
+            'average', 'first_purchase', 'last_purchase'
+        ]
+
+
+class ProductStatsSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    # Columna generada: en SQLite llega como float
+    average = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = ProductStats
+        fields = [
+            'product', 'product_name', 'sales_count', 'quantity', 'revenue',
+            'average', 'first_purchase', 'last_purchase'
+        ]
+
+
+class CustomerSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ['id', 'name']
+
+
+class ProductSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'category']
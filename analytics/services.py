@@ -0,0 +1,364 @@
+# analytics/services.py
+"""
+Capa de servicio de las analíticas de ventas.
+
+Agregados con filtros y resultados tipados, sin HTTP ni DRF. Los usan las
+vistas de la API (``analytics.views``), la instantánea del dashboard, los KPIs
+en directo y, con Django configurado en el mismo proceso, la app Reflex
+(``REVINTEL_TRANSPORT=inprocess``). Los serializers de ``analytics.serializers``
+convierten los resultados al JSON de la API.
+
+Modo incremental: una marca es un ``seq`` del ChangeLog; las funciones
+``*_since`` devuelven sólo lo que ha cambiado después de ella.
+"""
+import datetime
+from dataclasses import dataclass, fields
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_filters import rest_framework as filters
+
+from sales import changelog
+from sales.models import ChangeLog, Sale
+
+DELTA_MAX_CHANGES = 5000
+
+
+class SaleFilter(filters.FilterSet):
+    """Filtros avanzados para ventas"""
+    date_from = filters.DateFilter(field_name='sale_date', lookup_expr='gte')
+    date_to = filters.DateFilter(field_name='sale_date', lookup_expr='lte')
+    category = filters.CharFilter(field_name='product__category', lookup_expr='icontains')
+    product = filters.NumberFilter(field_name='product_id')
+    customer = filters.NumberFilter(field_name='customer_id')
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(
+            customer__name__icontains=value
+        ) | queryset.filter(
+            product__name__icontains=value
+        )
+
+    class Meta:
+        model = Sale
+        fields = ['date_from', 'date_to', 'category', 'product', 'customer']
+
+
+@dataclass(frozen=True)
+class SalesFilters:
+    """Filtros de ``SaleFilter`` ya validados (inmutable: sirve de clave de caché)."""
+    date_from: datetime.date | None = None
+    date_to: datetime.date | None = None
+    category: str | None = None
+    product: int | None = None
+    customer: int | None = None
+    search: str | None = None
+
+    @classmethod
+    def from_params(cls, params):
+        """Filtros de los parámetros de una petición; como en la API, los no válidos se ignoran."""
+        form = SaleFilter(params, queryset=Sale.objects.none()).form
+        form.is_valid()
+        values = {}
+        for field in fields(cls):
+            value = form.cleaned_data.get(field.name)
+            if value in (None, ''):
+                continue
+            values[field.name] = int(value) if field.name in ('product', 'customer') else value
+        return cls(**values)
+
+    def as_params(self):
+        return {
+            field.name: getattr(self, field.name)
+            for field in fields(self) if getattr(self, field.name) is not None
+        }
+
+    def queryset(self):
+        return SaleFilter(self.as_params(), queryset=Sale.objects.all()).qs
+
+
+@dataclass(frozen=True)
+class KPIs:
+    total_sales: Decimal
+    total_orders: int
+    average_order: Decimal
+    total_customers: int
+
+
+@dataclass(frozen=True)
+class PeriodTotal:
+    period: str
+    total: Decimal
+    count: int
+
+
+@dataclass(frozen=True)
+class CategoryTotal:
+    category: str
+    total: Decimal
+    count: int
+
+
+@dataclass(frozen=True)
+class CustomerTotal:
+    customer_id: int
+    customer_name: str
+    total_spent: Decimal
+    order_count: int
+
+
+@dataclass(frozen=True)
+class ProductTotal:
+    product_name: str
+    quantity_sold: int
+    revenue: Decimal
+
+
+@dataclass(frozen=True)
+class SalesPage:
+    sales: list
+    total: int
+    page: int
+    per_page: int
+    total_pages: int
+
+
+@dataclass(frozen=True)
+class Changes:
+    """Ventas cambiadas desde una marca; con ``reset`` hay que recargar entero."""
+    watermark: int
+    reset: bool
+    sale_ids: frozenset = frozenset()
+    sale_dates: tuple = ()
+
+
+@dataclass(frozen=True)
+class KPIsDelta:
+    watermark: int
+    reset: bool
+    kpis: KPIs | None
+
+
+@dataclass(frozen=True)
+class PeriodsDelta:
+    watermark: int
+    reset: bool
+    periods: list
+
+
+@dataclass(frozen=True)
+class SalesDelta:
+    watermark: int
+    reset: bool
+    upserted: list
+    removed: list
+
+
+def _sales(sales_filters):
+    return (sales_filters or SalesFilters()).queryset()
+
+
+def _kpis(qs):
+    aggregates = qs.aggregate(
+        total_sales=Sum('total_price'),
+        total_orders=Count('id'),
+        average_order=Avg('total_price')
+    )
+
+    total_customers = qs.values('customer').distinct().count()
+
+    return KPIs(
+        total_sales=aggregates['total_sales'] or 0,
+        total_orders=aggregates['total_orders'] or 0,
+        average_order=aggregates['average_order'] or 0,
+        total_customers=total_customers,
+    )
+
+
+def _period_totals(qs, group_by):
+    if group_by == 'month':
+        qs = qs.annotate(period=TruncMonth('sale_date'))
+    else:
+        qs = qs.annotate(period=TruncDate('sale_date'))
+
+    data = qs.values('period').annotate(
+        total=Sum('total_price'),
+        count=Count('id')
+    ).order_by('period')
+
+    return [
+        PeriodTotal(
+            period=item['period'].strftime('%Y-%m-%d') if group_by == 'day' else item['period'].strftime('%Y-%m'),
+            total=item['total'],
+            count=item['count'],
+        )
+        for item in data if item['period']
+    ]
+
+
+def kpis(sales_filters=None):
+    """Importe total, nº de pedidos, ticket medio y clientes únicos."""
+    return _kpis(_sales(sales_filters))
+
+
+def sales_by_period(sales_filters=None, group_by='day', days=None):
+    """Ventas por día o mes (``group_by``); con ``days``, sólo de esos días."""
+    qs = _sales(sales_filters)
+    if days is not None:
+        qs = qs.filter(sale_date__date__in=days)
+    return _period_totals(qs, group_by)
+
+
+def sales_by_category(sales_filters=None):
+    data = _sales(sales_filters).values('product__category').annotate(
+        total=Sum('total_price'),
+        count=Count('id')
+    ).order_by('-total')
+
+    return [
+        CategoryTotal(
+            category=item['product__category'] or 'Sin categoría',
+            total=item['total'],
+            count=item['count'],
+        )
+        for item in data
+    ]
+
+
+def top_customers(sales_filters=None, limit=10):
+    data = _sales(sales_filters).values('customer_id', 'customer__name').annotate(
+        total_spent=Sum('total_price'),
+        order_count=Count('id')
+    ).order_by('-total_spent')[:limit]
+
+    return [
+        CustomerTotal(
+            customer_id=item['customer_id'],
+            customer_name=item['customer__name'],
+            total_spent=item['total_spent'],
+            order_count=item['order_count'],
+        )
+        for item in data
+    ]
+
+
+def product_distribution(sales_filters=None, limit=10):
+    data = _sales(sales_filters).values('product__name').annotate(
+        quantity_sold=Sum('quantity'),
+        revenue=Sum('total_price')
+    ).order_by('-revenue')[:limit]
+
+    return [
+        ProductTotal(
+            product_name=item['product__name'],
+            quantity_sold=item['quantity_sold'],
+            revenue=item['revenue'],
+        )
+        for item in data
+    ]
+
+
+def sales_page(sales_filters=None, page=1, per_page=25):
+    """Una página del listado de ventas, de la más reciente a la más antigua."""
+    qs = _sales(sales_filters).select_related('customer', 'product').order_by('-sale_date')
+
+    # Paginación simple
+    start = (page - 1) * per_page
+    end = start + per_page
+
+    total = qs.count()
+    return SalesPage(
+        sales=list(qs[start:end]),
+        total=total,
+        page=page,
+        per_page=per_page,
+        total_pages=(total + per_page - 1) // per_page,
+    )
+
+
+def changes_since(since):
+    """
+    Ventas cambiadas después de la marca ``since``.
+
+    ``reset`` indica que no se puede responder de forma incremental: la marca ya
+    no está en el ChangeLog, hay demasiados cambios o se modificaron productos o
+    clientes (sus nombres y categorías afectan a filas y filtros ya enviados).
+    """
+    def reset():
+        return Changes(watermark=changelog.stable_offset(), reset=True)
+
+    if since and not ChangeLog.objects.filter(seq=since).exists():
+        return reset()
+
+    changes, watermark = changelog.read_changes(since, DELTA_MAX_CHANGES)
+    if len(changes) == DELTA_MAX_CHANGES:
+        return reset()
+
+    sale_ids = set()
+    sale_dates = []
+    for change in changes:
+        if change['entity'] != ChangeLog.ENTITY_SALE:
+            if change['action'] != ChangeLog.ACTION_CREATE:
+                return reset()
+            continue
+        sale_ids.add(change['object_id'])
+        sale_date = parse_datetime(change['payload'].get('sale_date') or '')
+        if sale_date is not None:
+            sale_dates.append(sale_date)
+    return Changes(watermark=watermark, reset=False, sale_ids=frozenset(sale_ids), sale_dates=tuple(sale_dates))
+
+
+def kpis_since(sales_filters, since):
+    """KPIs recalculados sólo si hay ventas cambiadas desde ``since``."""
+    changes = changes_since(since)
+    return KPIsDelta(
+        watermark=changes.watermark,
+        reset=changes.reset,
+        kpis=kpis(sales_filters) if changes.sale_ids else None,
+    )
+
+
+def sales_by_period_since(sales_filters, since, group_by='day'):
+    """Periodos con ventas cambiadas desde ``since``; los que se quedan vacíos van con 0."""
+    changes = changes_since(since)
+    if not changes.sale_dates:
+        return PeriodsDelta(watermark=changes.watermark, reset=changes.reset, periods=[])
+
+    days = {timezone.localdate(sale_date) for sale_date in changes.sale_dates}
+    if group_by == 'month':
+        months = {(day.year, day.month) for day in days}
+        condition = Q()
+        for year, month in months:
+            condition |= Q(sale_date__year=year, sale_date__month=month)
+        labels = {f'{year:04d}-{month:02d}' for year, month in months}
+    else:
+        condition = Q(sale_date__date__in=days)
+        labels = {day.strftime('%Y-%m-%d') for day in days}
+
+    periods = _period_totals(_sales(sales_filters).filter(condition), group_by)
+    emptied = labels - {period.period for period in periods}
+    periods += [PeriodTotal(period=label, total=Decimal('0'), count=0) for label in emptied]
+    return PeriodsDelta(
+        watermark=changes.watermark,
+        reset=changes.reset,
+        periods=sorted(periods, key=lambda period: period.period),
+    )
+
+
+def sales_since(sales_filters, since):
+    """Ventas cambiadas desde ``since`` que cumplen los filtros, e ids que ya no."""
+    changes = changes_since(since)
+    upserted = list(
+        _sales(sales_filters).filter(pk__in=changes.sale_ids)
+        .select_related('customer', 'product').order_by('-sale_date')
+    ) if changes.sale_ids else []
+    return SalesDelta(
+        watermark=changes.watermark,
+        reset=changes.reset,
+        upserted=upserted,
+        removed=sorted(changes.sale_ids - {sale.pk for sale in upserted}),
+    )
@@ -0,0 +1,51 @@
+# analytics/signals.py
+"""Mantiene SalesMetric sincronizado con las ventas y su calendario en el admin."""
+from django.db.models.signals import post_save, pre_save
+
+from sales import calendar_days
+from sales.models import Product, Sale
+from sales.signals import product_prices_updated, sales_bulk_created
+from .metrics import sync_metrics
+from .models import SalesMetric
+
+# Campos de Product que intervienen en el coste de una venta
+COST_FIELDS = ('price', 'unit_cost')
+
+
+def sync_sale_metric(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync_metrics(Sale.objects.filter(pk=instance.pk))
+
+
+def sync_bulk_metrics(sender, queryset, **kwargs):
+    sync_metrics(queryset)
+
+
+def remember_product_cost(sender, instance, raw=False, **kwargs):
+    instance._metrics_previous_cost = None
+    if instance.pk is not None and not raw:
+        instance._metrics_previous_cost = (
+            Product.objects.filter(pk=instance.pk).values_list(*COST_FIELDS).first()
+        )
+
+
+def sync_product_metrics(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    current = tuple(getattr(instance, name) for name in COST_FIELDS)
+    if getattr(instance, '_metrics_previous_cost', None) != current:
+        sync_metrics(Sale.objects.filter(product_id=instance.pk))
+
+
+def sync_repriced_metrics(sender, queryset, **kwargs):
+    sync_metrics(Sale.objects.filter(product__in=queryset.values('pk')))
+
+
+def connect():
+    post_save.connect(sync_sale_metric, sender=Sale, dispatch_uid='analytics_sync_sale_metric')
+    sales_bulk_created.connect(sync_bulk_metrics, sender=Sale, dispatch_uid='analytics_sync_bulk_metrics')
+    pre_save.connect(remember_product_cost, sender=Product, dispatch_uid='analytics_product_cost')
+    post_save.connect(sync_product_metrics, sender=Product, dispatch_uid='analytics_sync_product_metrics')
+    product_prices_updated.connect(sync_repriced_metrics, sender=Product, dispatch_uid='analytics_sync_repriced_metrics')
+    calendar_days.track(SalesMetric, 'created_at')
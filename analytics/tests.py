@@ -1,9 +1,23 @@
-from django.test import TestCase
+import asyncio
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 
 from sales.models import Customer, Product, Sale
+from users.models import RevUser
+from sales.services import ingest_sales
+from . import live, services
+from .metrics import sync_metrics
+from .models import SalesMetric
+from .serializers import KPISerializer, SalesByCategorySerializer
 
 
 class SchemaAndSalesApiTests(TestCase):
@@ -48,6 +62,312 @@ class SchemaAndSalesApiTests(TestCase):
         for key in ("total_sales", "total_orders", "average_order", "total_customers"):
             self.assertIn(key, data)
 
-from django.test import TestCase
 
-# Create your tests here.
+class SalesMetricTests(TestCase):
+    """Métricas calculadas por la base de datos y mantenidas automáticamente."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente Métricas", email="metricas@test.com")
+        self.costed = Product.objects.create(
+            name="Con coste", price=Decimal("10.00"), unit_cost=Decimal("7.00"), in_stock=100
+        )
+        self.estimated = Product.objects.create(name="Sin coste", price=Decimal("5.00"), in_stock=100)
+
+    def test_metrics_follow_sales_and_use_cost_model(self):
+        sale = Sale.objects.create(customer=self.customer, product_id=self.costed.pk, quantity=2)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.estimated.pk, 'quantity': 4}])
+
+        metric = SalesMetric.objects.get(sale=sale)
+        self.assertEqual((metric.revenue, metric.cost, metric.profit), (Decimal("20.00"), Decimal("14.00"), Decimal("6.00")))
+        bulk_metric = SalesMetric.objects.get(sale__product=self.estimated)
+        self.assertEqual(bulk_metric.profit, Decimal("8.00"))
+
+        sale.quantity = 3
+        sale.save()
+        self.assertEqual(SalesMetric.objects.get(sale=sale).profit, Decimal("9.00"))
+
+    def test_product_cost_changes_resync_metrics(self):
+        costed = Sale.objects.create(customer=self.customer, product_id=self.costed.pk, quantity=2)
+        estimated = Sale.objects.create(customer=self.customer, product_id=self.estimated.pk, quantity=4)
+
+        self.costed.unit_cost = Decimal("9.00")
+        self.costed.save()
+        self.assertEqual(SalesMetric.objects.get(sale=costed).cost, Decimal("18.00"))
+
+        admin_user = RevUser.objects.create_superuser(username="admin-metricas", password="secreto-123")
+        self.client.force_login(admin_user)
+        self.client.post(reverse("admin:sales_product_changelist"), {
+            "action": "apply_discount",
+            "_selected_action": [self.estimated.pk],
+        })
+        # 5.00 * 0.9 * 0.6 por unidad
+        self.assertEqual(SalesMetric.objects.get(sale=estimated).cost, Decimal("10.80"))
+
+    def test_bulk_recalculation_is_set_based(self):
+        for _ in range(5):
+            Sale.objects.create(customer=self.customer, product_id=self.costed.pk, quantity=1)
+        SalesMetric.objects.all().delete()
+        Product.objects.filter(pk=self.costed.pk).update(unit_cost=Decimal("8.00"))
+
+        with CaptureQueriesContext(connection) as queries:
+            created, updated = sync_metrics()
+        self.assertEqual((created, updated), (5, 0))
+        # UPDATE + INSERT ... SELECT + upsert del calendario del admin
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(SalesMetric.objects.filter(profit=Decimal("2.00")).count(), 5)
+
+
+
+class ConditionalSalesApiTests(TestCase):
+    """ETag de las lecturas de ventas ligado al ChangeLog."""
+
+    def test_unchanged_data_returns_304_without_aggregating(self):
+        client = APIClient()
+        customer = Customer.objects.create(name="Cliente ETag", email="etag@test.com")
+        product = Product.objects.create(name="Taza", price=Decimal("4.00"), in_stock=10)
+        ingest_sales([{'customer': customer.pk, 'product': product.pk, 'quantity': 1}])
+
+        url = reverse("analytics_api:by_period")
+        first = client.get(url, {"group_by": "month"})
+        with self.assertNumQueries(1):
+            repeated = client.get(url, {"group_by": "month"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertNotEqual(client.get(url, {"group_by": "day"})["ETag"], first["ETag"])
+
+        ingest_sales([{'customer': customer.pk, 'product': product.pk, 'quantity': 1}])
+        changed = client.get(url, {"group_by": "month"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()[0]["count"], 2)
+
+
+class SalesDeltaApiTests(TestCase):
+    """Modo incremental (?since=) de KPIs, serie por periodo y listado."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = Customer.objects.create(name="Cliente Delta", email="delta@test.com")
+        self.product = Product.objects.create(name="Cuaderno", price=Decimal("3.00"), in_stock=100)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}] * 3)
+
+    def test_only_changes_after_watermark_are_returned(self):
+        watermark = self.client.get(reverse("analytics_api:by_period"))["X-Sales-Watermark"]
+
+        with self.assertNumQueries(3):
+            unchanged = self.client.get(reverse("analytics_api:kpis"), {"since": watermark}).json()
+        self.assertEqual(unchanged, {"watermark": int(watermark), "reset": False, "kpis": None})
+
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 2}])
+        new_sale = Sale.objects.latest("id")
+        periods = self.client.get(reverse("analytics_api:by_period"), {"since": watermark}).json()
+        listing = self.client.get(reverse("analytics_api:list"), {"since": watermark}).json()
+
+        self.assertGreater(periods["watermark"], int(watermark))
+        self.assertEqual([(p["count"], p["total"]) for p in periods["periods"]], [(4, "15.00")])
+        self.assertEqual([sale["id"] for sale in listing["upserted"]], [new_sale.pk])
+
+        new_sale_id = new_sale.pk
+        new_sale.delete()
+        listing = self.client.get(reverse("analytics_api:list"), {"since": periods["watermark"]}).json()
+        self.assertEqual((listing["upserted"], listing["removed"]), ([], [new_sale_id]))
+
+    def test_product_changes_or_unknown_watermark_ask_for_reload(self):
+        watermark = self.client.get(reverse("analytics_api:list"))["X-Sales-Watermark"]
+        self.product.name = "Cuaderno A4"
+        self.product.save()
+
+        self.assertTrue(self.client.get(reverse("analytics_api:list"), {"since": watermark}).json()["reset"])
+        self.assertTrue(self.client.get(reverse("analytics_api:kpis"), {"since": 999999}).json()["reset"])
+        self.assertEqual(self.client.get(reverse("analytics_api:kpis"), {"since": "x"}).status_code, 400)
+
+
+class SalesServicesTests(TestCase):
+    """La capa de servicio devuelve lo mismo que la API, con filtros tipados."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Cliente Servicio", email="servicio@test.com")
+        lamp = Product.objects.create(name="Lámpara", price=Decimal("25.00"), category="Hogar", in_stock=10)
+        pen = Product.objects.create(name="Bolígrafo", price=Decimal("1.50"), category="Oficina", in_stock=10)
+        ingest_sales([
+            {'customer': customer.pk, 'product': lamp.pk, 'quantity': 2},
+            {'customer': customer.pk, 'product': pen.pk, 'quantity': 4},
+        ])
+
+    def test_filters_are_validated_like_the_api(self):
+        filters = services.SalesFilters.from_params({"category": "hog", "customer": "x", "search": ""})
+
+        self.assertEqual(filters, services.SalesFilters(category="hog"))
+        self.assertEqual(services.kpis(filters).total_sales, Decimal("50.00"))
+
+    def test_serialized_results_match_api_responses(self):
+        client = APIClient()
+        filters = services.SalesFilters(category="Oficina")
+
+        self.assertEqual(
+            client.get(reverse("analytics_api:kpis"), {"category": "Oficina"}).json(),
+            KPISerializer(services.kpis(filters)).data,
+        )
+        self.assertEqual(
+            client.get(reverse("analytics_api:by_category")).json(),
+            SalesByCategorySerializer(services.sales_by_category(), many=True).data,
+        )
+
+
+class PivotApiTests(TestCase):
+    """Consultas pivote (dimensiones × medidas) en una sola consulta."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.ana = Customer.objects.create(name="Ana", email="ana@test.com")
+        self.luis = Customer.objects.create(name="Luis", email="luis@test.com")
+        mug = Product.objects.create(name="Taza", price=Decimal("4.00"), category="Hogar", in_stock=50)
+        pen = Product.objects.create(name="Boli", price=Decimal("1.00"), category="Oficina", in_stock=50)
+        ingest_sales([
+            {'customer': self.ana.pk, 'product': mug.pk, 'quantity': 2},
+            {'customer': self.ana.pk, 'product': pen.pk, 'quantity': 5},
+            {'customer': self.luis.pk, 'product': mug.pk, 'quantity': 1},
+        ])
+
+    def test_multi_dimension_group_by_is_one_query(self):
+        # ETag (último seq) + la agregación
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("analytics_api:pivot"), {
+                "dimensions": "category,customer",
+                "measures": "revenue,quantity",
+                "sort": "-revenue",
+            }).json()
+
+        self.assertEqual(data["source"], "sales")
+        self.assertEqual(
+            [(row["category"], row["customer"], row["revenue"], row["quantity"]) for row in data["rows"]],
+            [("Hogar", "Ana", "8.00", 2), ("Oficina", "Ana", "5.00", 5), ("Hogar", "Luis", "4.00", 1)],
+        )
+
+    def test_unfiltered_queries_use_rollups_with_same_results(self):
+        url = reverse("analytics_api:pivot")
+        params = {"dimensions": "customer", "measures": "revenue,orders", "sort": "-revenue"}
+
+        from_stats = self.client.get(url, params).json()
+        from_sales = self.client.get(url, {**params, "date_from": "2000-01-01"}).json()
+        self.assertEqual((from_stats["source"], from_sales["source"]), ("stats", "sales"))
+        self.assertEqual(from_stats["rows"], from_sales["rows"])
+        self.assertEqual(from_stats["rows"][0]["customer_id"], self.ana.pk)
+
+        by_month = self.client.get(url, {"dimensions": "month", "measures": "orders"}).json()
+        self.assertEqual((by_month["source"], by_month["rows"][0]["orders"]), ("calendar", 3))
+
+    def test_stats_rollup_matches_sales_for_every_measure(self):
+        # Ana: 8.00 + 5.00 + 1.00 en 3 ventas, una media que no es exacta (4.67)
+        ingest_sales([{'customer': self.ana.pk, 'product': Product.objects.get(name="Boli").pk, 'quantity': 1}])
+        url = reverse("analytics_api:pivot")
+        for dimension in ("customer", "product"):
+            params = {"dimensions": dimension, "measures": "revenue,orders,quantity,average_order"}
+            from_stats = self.client.get(url, params).json()
+            from_sales = self.client.get(url, {**params, "date_from": "2000-01-01"}).json()
+            self.assertEqual((from_stats["source"], from_sales["source"]), ("stats", "sales"))
+            self.assertEqual(from_stats["rows"], from_sales["rows"])
+
+    def test_blank_category_uses_empty_label(self):
+        loose = Product.objects.create(name="Suelto", price=Decimal("3.00"), in_stock=50)
+        ingest_sales([{'customer': self.luis.pk, 'product': loose.pk, 'quantity': 1}])
+        data = self.client.get(reverse("analytics_api:pivot"), {"dimensions": "category"}).json()
+        self.assertIn("Sin categoría", [row["category"] for row in data["rows"]])
+        self.assertNotIn("", [row["category"] for row in data["rows"]])
+
+    def test_unknown_names_are_rejected(self):
+        url = reverse("analytics_api:pivot")
+        self.assertEqual(self.client.get(url, {"dimensions": "customer__email"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"measures": "revenue", "sort": "orders"}).status_code, 400)
+
+
+class ColumnarResponseTests(TestCase):
+    """Modo ?format=columnar de la serie por periodo y del listado."""
+
+    def setUp(self):
+        self.client = APIClient()
+        customer = Customer.objects.create(name="Cliente Columnas", email="columnas@test.com")
+        product = Product.objects.create(name="Regla", price=Decimal("2.50"), in_stock=50)
+        ingest_sales([{'customer': customer.pk, 'product': product.pk, 'quantity': 2}] * 3)
+
+    def test_rows_become_numeric_columns(self):
+        periods = self.client.get(reverse("analytics_api:by_period"), {"format": "columnar"}).json()
+        self.assertEqual(periods["columns"], ["period", "total", "count"])
+        self.assertEqual((periods["data"]["total"], periods["data"]["count"]), ([15.0], [3]))
+
+        rows = self.client.get(reverse("analytics_api:list")).json()
+        columnar = self.client.get(reverse("analytics_api:list"), {"format": "columnar", "per_page": 2}).json()
+        self.assertEqual(columnar["data"]["id"], [sale["id"] for sale in rows["data"][:2]])
+        self.assertEqual((columnar["data"]["total_price"], columnar["total"]), ([5.0, 5.0], 3))
+
+
+class TypeaheadApiTests(TestCase):
+    """Sugerencias por prefijo para los filtros del dashboard."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for name in ("Álvaro Gómez", "alba ruiz", "Alberto Díaz", "Beatriz Sanz"):
+            Customer.objects.create(name=name, email=f"{name.split()[0].lower()}@test.com")
+        Product.objects.create(name="Mesa", price=Decimal("50.00"), category="Muebles")
+        Product.objects.create(name="Silla", price=Decimal("20.00"), category="muebles de jardín")
+
+    def test_customers_match_prefix_ignoring_case_and_accents(self):
+        url = reverse("analytics_api:customer_typeahead")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"q": "AL", "limit": 2})
+
+        self.assertEqual([item["name"] for item in response.json()], ["alba ruiz", "Alberto Díaz"])
+        self.assertEqual(len(self.client.get(url, {"q": "alv"}).json()), 1)
+        self.assertEqual(self.client.get(url, {"limit": "x"}).status_code, 400)
+
+    def test_categories_index_follows_product_changes(self):
+        url = reverse("analytics_api:category_typeahead")
+        self.assertEqual(self.client.get(url, {"q": "mue"}).json(), ["Muebles", "muebles de jardín"])
+
+        Product.objects.create(name="Sofá", price=Decimal("300.00"), category="Mueblería")
+        self.assertEqual(self.client.get(url, {"q": "muebler"}).json(), ["Mueblería"])
+
+
+@override_settings(LIVE_KPI_POLL_INTERVAL=3600)
+class LiveKpiHubTests(TestCase):
+    """Los espectadores con los mismos filtros comparten el cálculo de KPIs."""
+
+    async def test_identical_filters_share_one_computation(self):
+        customer = await Customer.objects.acreate(name="Cliente Directo", email="directo@test.com")
+        product = await Product.objects.acreate(name="Vela", price=Decimal("5.00"), category="Hogar", in_stock=20)
+        key = live.filter_key({"category": "Hogar", "search": ""})
+
+        hub = live.LiveHub()
+        with mock.patch.object(live, "live_payload", wraps=live.live_payload) as compute:
+            queues = [await hub.subscribe(key) for _ in range(3)]
+            self.assertEqual([(await queue.get())["kpis"]["total_orders"] for queue in queues], [0, 0, 0])
+
+            await sync_to_async(ingest_sales)([{'customer': customer.pk, 'product': product.pk, 'quantity': 2}])
+            await hub.poll()
+            await hub.poll()  # sin cambios nuevos no recalcula
+
+            payloads = [await queue.get() for queue in queues]
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual({payload["kpis"]["total_orders"] for payload in payloads}, {1})
+        self.assertEqual(payloads[0]["today"]["count"], 1)
+
+        for queue in queues:
+            hub.unsubscribe(key, queue)
+        self.assertEqual(hub.subscriptions, {})
+
+    async def test_failures_do_not_leak_queues_or_stop_polling(self):
+        key = live.filter_key({})
+        hub = live.LiveHub()
+        with mock.patch.object(live, "live_payload", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                await hub.subscribe(key)
+        self.assertEqual(hub.subscriptions, {})
+
+        queue = await hub.subscribe(key)
+        await queue.get()
+        with self.settings(LIVE_KPI_POLL_INTERVAL=0), \
+                mock.patch.object(hub, "poll", side_effect=[OperationalError("database is locked"), None]) as poll, \
+                self.assertLogs("analytics.live", level="ERROR"):
+            while poll.call_count < 2:
+                await asyncio.sleep(0)
+        self.assertFalse(hub._task.done())
+        hub.unsubscribe(key, queue)
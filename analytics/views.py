@@ -1,8 +1,11 @@
 # analytics/views.py
-from django.db.models import Sum, Count, Avg
-from django.db.models.functions import TruncDate, TruncMonth
-from django_filters import rest_framework as filters
-from rest_framework import serializers
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -10,41 +13,103 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
     extend_schema,
-    inline_serializer,
 )
 
-from sales.models import Customer, Product, Sale
+from sales import changelog
+from sales.buffer import get_buffer
+from sales.models import BufferedSaleOutcome, ChangeLog, Customer, CustomerStats, Product, ProductStats
+from sales.search import category_index, prefix_filter
+from sales.services import ingest_sales
+from . import pivot, services
+from .renderers import ColumnarJSONRenderer, is_columnar, to_columnar
+from .pivot import DIMENSIONS, MEASURES, PIVOT_DEFAULT_LIMIT, PIVOT_MAX_LIMIT, PivotQuery
+from .services import SalesFilters
 from .serializers import (
+    BufferedSaleSerializer,
+    BufferedSaleStatusSerializer,
+    BufferedSaleTicketSerializer,
+    BulkSaleIngestResultSerializer,
+    BulkSaleIngestSerializer,
+    ChangeLogCommitSerializer,
+    ChangeLogPageSerializer,
+    CustomerStatsSerializer,
+    CustomerSuggestionSerializer,
+    KPIDeltaSerializer,
     KPISerializer,
+    PivotResultSerializer,
     ProductDistributionSerializer,
+    ProductStatsSerializer,
+    ProductSuggestionSerializer,
     SaleSerializer,
     SalesByCategorySerializer,
+    SalesByPeriodDeltaSerializer,
     SalesByPeriodSerializer,
+    SalesListDeltaSerializer,
+    SalesPageSerializer,
     TopCustomerSerializer,
 )
 
 
-class SaleFilter(filters.FilterSet):
-    """Filtros avanzados para ventas"""
-    date_from = filters.DateFilter(field_name='sale_date', lookup_expr='gte')
-    date_to = filters.DateFilter(field_name='sale_date', lookup_expr='lte')
-    category = filters.CharFilter(field_name='product__category', lookup_expr='icontains')
-    product = filters.NumberFilter(field_name='product_id')
-    customer = filters.NumberFilter(field_name='customer_id')
-    search = filters.CharFilter(method='filter_search')
-
-    def filter_search(self, queryset, name, value):
-        return queryset.filter(
-            customer__name__icontains=value
-        ) | queryset.filter(
-            product__name__icontains=value
-        )
+def sales_etag(request, *args, **kwargs):
+    """
+    ETag de las lecturas de ventas: último ``seq`` del ChangeLog y la petición.
+
+    Mientras no cambien ventas, productos ni clientes, una petición repetida con
+    ``If-None-Match`` recibe un 304 sin recalcular los agregados.
+    """
+    key = f"{changelog.latest_seq()}|{request.get_full_path()}|{request.headers.get('Accept', '')}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+sales_conditional = method_decorator(etag(sales_etag), name='get')
+
+
+# Modo incremental (?since=<marca>): la marca es un seq del ChangeLog. Las
+# respuestas completas la envían en la cabecera X-Sales-Watermark y las
+# incrementales en "watermark"; con "reset" el cliente debe recargar entero.
+WATERMARK_HEADER = 'X-Sales-Watermark'
+
+SINCE_PARAMETER = OpenApiParameter(
+    "since",
+    OpenApiTypes.INT,
+    description=(
+        "Marca (X-Sales-Watermark o watermark de la respuesta anterior): devuelve sólo "
+        "lo que ha cambiado desde entonces"
+    ),
+)
+
+
+def parse_since(request):
+    """Marca ``since`` de la petición, ``None`` si no se pide el modo incremental."""
+    since = request.query_params.get('since')
+    if since is None:
+        return None
+    if not since.isdigit():
+        raise serializers.ValidationError({'since': 'Debe ser un entero no negativo.'})
+    return int(since)
+
 
-    class Meta:
-        model = Sale
-        fields = ['date_from', 'date_to', 'category', 'product', 'customer']
+def with_watermark(response, watermark):
+    response[WATERMARK_HEADER] = watermark
+    return response
 
 
+# ?format=columnar: filas en columnas con importes numéricos (analytics.renderers).
+# Sólo cambia la forma de las respuestas completas, no la de las incrementales.
+COLUMNAR_RENDERER_CLASSES = [*APIView.renderer_classes, ColumnarJSONRenderer]
+
+FORMAT_PARAMETER = OpenApiParameter(
+    "format",
+    OpenApiTypes.STR,
+    enum=["json", "columnar"],
+    description="`columnar`: `{columns, data: {columna: [valores]}}` con los importes como números",
+)
+
+
+# Las vistas sólo traducen la petición a analytics.services y serializan el
+# resultado; la agregación vive en el servicio.
+
+@sales_conditional
 class KPIView(APIView):
     """Métricas KPI generales"""
 
@@ -53,10 +118,13 @@ class KPIView(APIView):
         description=(
             "Devuelve métricas agregadas de ventas (importe total, nº pedidos, "
             "ticket medio y número de clientes únicos).\n\n"
+            "Con `since` devuelve `{watermark, reset, kpis}`: `kpis` es nulo si no ha "
+            "cambiado ninguna venta desde la marca.\n\n"
             "Permite filtrar por rango de fechas, categoría, producto, cliente y búsqueda "
             "por nombre de cliente o producto."
         ),
         parameters=[
+            SINCE_PARAMETER,
             OpenApiParameter("date_from", OpenApiTypes.DATE, description="Fecha mínima de la venta (YYYY-MM-DD)"),
             OpenApiParameter("date_to", OpenApiTypes.DATE, description="Fecha máxima de la venta (YYYY-MM-DD)"),
             OpenApiParameter("category", OpenApiTypes.STR, description="Filtro por categoría de producto (icontains)"),
@@ -71,40 +139,34 @@ class KPIView(APIView):
         responses={200: KPISerializer},
     )
     def get(self, request):
-        queryset = Sale.objects.all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs
-        
-        aggregates = qs.aggregate(
-            total_sales=Sum('total_price'),
-            total_orders=Count('id'),
-            average_order=Avg('total_price')
-        )
-        
-        total_customers = qs.values('customer').distinct().count()
-        
-        data = {
-            'total_sales': aggregates['total_sales'] or 0,
-            'total_orders': aggregates['total_orders'] or 0,
-            'average_order': aggregates['average_order'] or 0,
-            'total_customers': total_customers
-        }
-        
-        serializer = KPISerializer(data)
-        return Response(serializer.data)
+        filters = SalesFilters.from_params(request.query_params)
+
+        since = parse_since(request)
+        if since is not None:
+            return Response(KPIDeltaSerializer(services.kpis_since(filters, since)).data)
+        watermark = changelog.stable_offset()
+        return with_watermark(Response(KPISerializer(services.kpis(filters)).data), watermark)
 
 
+@sales_conditional
 class SalesByPeriodView(APIView):
     """Ventas agrupadas por día o mes"""
+    renderer_classes = COLUMNAR_RENDERER_CLASSES
 
     @extend_schema(
         summary="Ventas por periodo",
         description=(
             "Devuelve ventas agregadas por periodo (día o mes), con importe total y nº de pedidos.\n\n"
             "Se puede controlar la granularidad con el parámetro `group_by`.\n"
-            "Admite los mismos filtros que el resto de endpoints de ventas."
+            "Admite los mismos filtros que el resto de endpoints de ventas.\n\n"
+            "Con `since` devuelve `{watermark, reset, periods}` sólo con los periodos que "
+            "tienen ventas cambiadas desde la marca (con 0 si se han quedado vacíos).\n\n"
+            "Con `format=columnar` devuelve `{columns, data}`: una lista de valores por "
+            "columna, con los importes como números."
         ),
         parameters=[
+            SINCE_PARAMETER,
+            FORMAT_PARAMETER,
             OpenApiParameter("group_by", OpenApiTypes.STR, enum=["day", "month"], description="Agrupar por día o mes"),
             OpenApiParameter("date_from", OpenApiTypes.DATE, description="Fecha mínima de la venta (YYYY-MM-DD)"),
             OpenApiParameter("date_to", OpenApiTypes.DATE, description="Fecha máxima de la venta (YYYY-MM-DD)"),
@@ -115,35 +177,20 @@ class SalesByPeriodView(APIView):
         responses={200: SalesByPeriodSerializer(many=True)},
     )
     def get(self, request):
-        queryset = Sale.objects.all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs
-        
+        filters = SalesFilters.from_params(request.query_params)
+
         group_by = request.query_params.get('group_by', 'day')
-        
-        if group_by == 'month':
-            qs = qs.annotate(period=TruncMonth('sale_date'))
-        else:
-            qs = qs.annotate(period=TruncDate('sale_date'))
-        
-        data = qs.values('period').annotate(
-            total=Sum('total_price'),
-            count=Count('id')
-        ).order_by('period')
-        
-        result = [
-            {
-                'period': item['period'].strftime('%Y-%m-%d') if group_by == 'day' else item['period'].strftime('%Y-%m'),
-                'total': item['total'],
-                'count': item['count']
-            }
-            for item in data if item['period']
-        ]
-        
-        serializer = SalesByPeriodSerializer(result, many=True)
-        return Response(serializer.data)
+        since = parse_since(request)
+        if since is not None:
+            delta = services.sales_by_period_since(filters, since, group_by)
+            return Response(SalesByPeriodDeltaSerializer(delta).data)
+        watermark = changelog.stable_offset()
+        serializer = SalesByPeriodSerializer(services.sales_by_period(filters, group_by), many=True)
+        data = to_columnar(serializer) if is_columnar(request) else serializer.data
+        return with_watermark(Response(data), watermark)
 
 
+@sales_conditional
 class SalesByCategoryView(APIView):
     """Ventas agrupadas por categoría de producto"""
 
@@ -163,28 +210,12 @@ class SalesByCategoryView(APIView):
         responses={200: SalesByCategorySerializer(many=True)},
     )
     def get(self, request):
-        queryset = Sale.objects.all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs
-        
-        data = qs.values('product__category').annotate(
-            total=Sum('total_price'),
-            count=Count('id')
-        ).order_by('-total')
-        
-        result = [
-            {
-                'category': item['product__category'] or 'Sin categoría',
-                'total': item['total'],
-                'count': item['count']
-            }
-            for item in data
-        ]
-        
-        serializer = SalesByCategorySerializer(result, many=True)
-        return Response(serializer.data)
+        filters = SalesFilters.from_params(request.query_params)
+
+        return Response(SalesByCategorySerializer(services.sales_by_category(filters), many=True).data)
 
 
+@sales_conditional
 class TopCustomersView(APIView):
     """Top clientes por volumen de compra"""
 
@@ -209,31 +240,13 @@ class TopCustomersView(APIView):
         responses={200: TopCustomerSerializer(many=True)},
     )
     def get(self, request):
-        queryset = Sale.objects.all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs
-        
+        filters = SalesFilters.from_params(request.query_params)
+
         limit = int(request.query_params.get('limit', 10))
-        
-        data = qs.values('customer_id', 'customer__name').annotate(
-            total_spent=Sum('total_price'),
-            order_count=Count('id')
-        ).order_by('-total_spent')[:limit]
-        
-        result = [
-            {
-                'customer_id': item['customer_id'],
-                'customer_name': item['customer__name'],
-                'total_spent': item['total_spent'],
-                'order_count': item['order_count']
-            }
-            for item in data
-        ]
-        
-        serializer = TopCustomerSerializer(result, many=True)
-        return Response(serializer.data)
+        return Response(TopCustomerSerializer(services.top_customers(filters, limit), many=True).data)
 
 
+@sales_conditional
 class ProductDistributionView(APIView):
     """Distribución de productos vendidos"""
 
@@ -259,41 +272,31 @@ class ProductDistributionView(APIView):
         responses={200: ProductDistributionSerializer(many=True)},
     )
     def get(self, request):
-        queryset = Sale.objects.all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs
-        
+        filters = SalesFilters.from_params(request.query_params)
+
         limit = int(request.query_params.get('limit', 10))
-        
-        data = qs.values('product__name').annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('total_price')
-        ).order_by('-revenue')[:limit]
-        
-        result = [
-            {
-                'product_name': item['product__name'],
-                'quantity_sold': item['quantity_sold'],
-                'revenue': item['revenue']
-            }
-            for item in data
-        ]
-        
-        serializer = ProductDistributionSerializer(result, many=True)
-        return Response(serializer.data)
+        return Response(ProductDistributionSerializer(services.product_distribution(filters, limit), many=True).data)
 
 
+@sales_conditional
 class SalesListView(APIView):
     """Lista de ventas con filtros y búsqueda"""
+    renderer_classes = COLUMNAR_RENDERER_CLASSES
 
     @extend_schema(
         summary="Listado detallado de ventas",
         description=(
             "Devuelve un listado paginado de ventas con información de cliente y producto.\n\n"
             "Admite filtros avanzados (rango de fechas, categoría, producto, cliente y búsqueda "
-            "por nombre) y paginación mediante `page` y `per_page`."
+            "por nombre) y paginación mediante `page` y `per_page`.\n\n"
+            "Con `since` devuelve `{watermark, reset, upserted, removed}`: las ventas "
+            "cambiadas desde la marca que cumplen los filtros y los ids a quitar.\n\n"
+            "Con `format=columnar` las ventas de la página van en `{columns, data}` (una "
+            "lista de valores por columna, importes como números) junto a la paginación."
         ),
         parameters=[
+            SINCE_PARAMETER,
+            FORMAT_PARAMETER,
             OpenApiParameter("page", OpenApiTypes.INT, description="Número de página (1-based)", default=1),
             OpenApiParameter(
                 "per_page",
@@ -312,38 +315,413 @@ class SalesListView(APIView):
                 description="Búsqueda por nombre de cliente o producto (icontains)",
             ),
         ],
-        responses={
-            200: inline_serializer(
-                name="SalesListResponse",
-                fields={
-                    "data": SaleSerializer(many=True),
-                    "total": serializers.IntegerField(),
-                    "page": serializers.IntegerField(),
-                    "per_page": serializers.IntegerField(),
-                    "total_pages": serializers.IntegerField(),
-                },
-            )
-        },
+        responses={200: SalesPageSerializer},
     )
     def get(self, request):
-        queryset = Sale.objects.select_related('customer', 'product').all()
-        filterset = SaleFilter(request.query_params, queryset=queryset)
-        qs = filterset.qs.order_by('-sale_date')
-        
-        # Paginación simple
+        filters = SalesFilters.from_params(request.query_params)
         page = int(request.query_params.get('page', 1))
         per_page = int(request.query_params.get('per_page', 25))
-        start = (page - 1) * per_page
-        end = start + per_page
-        
-        total = qs.count()
-        sales = qs[start:end]
-        
-        serializer = SaleSerializer(sales, many=True)
-        return Response({
-            'data': serializer.data,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        })
+        since = parse_since(request)
+        if since is not None:
+            return Response(SalesListDeltaSerializer(services.sales_since(filters, since)).data)
+        watermark = changelog.stable_offset()
+        sales_page = services.sales_page(filters, page, per_page)
+        if is_columnar(request):
+            data = {
+                **to_columnar(SaleSerializer(sales_page.sales, many=True)),
+                'total': sales_page.total,
+                'page': sales_page.page,
+                'per_page': sales_page.per_page,
+                'total_pages': sales_page.total_pages,
+            }
+        else:
+            data = SalesPageSerializer(sales_page).data
+        return with_watermark(Response(data), watermark)
+
+
+@sales_conditional
+class PivotView(APIView):
+    """Consultas pivote: cualquier combinación de dimensiones y medidas"""
+
+    @extend_schema(
+        summary="Pivote de ventas",
+        description=(
+            "Agrega las ventas por las `dimensions` indicadas (p. ej. `category,month`) y "
+            "calcula las `measures` pedidas en una sola consulta. Cada fila trae las "
+            "dimensiones (y `customer_id` / `product_id` si se agrupa por cliente o "
+            "producto) y las medidas.\n\n"
+            "Sin filtros, las consultas que cubren las tablas precalculadas (por cliente "
+            "o producto, o pedidos por día/mes/año) se leen de ellas; `source` indica "
+            "de dónde salen los datos."
+        ),
+        parameters=[
+            OpenApiParameter(
+                "dimensions",
+                OpenApiTypes.STR,
+                description=f"Dimensiones separadas por comas: {', '.join(DIMENSIONS)}",
+            ),
+            OpenApiParameter(
+                "measures",
+                OpenApiTypes.STR,
+                description=f"Medidas separadas por comas: {', '.join(MEASURES)}",
+                default="revenue,orders",
+            ),
+            OpenApiParameter(
+                "sort",
+                OpenApiTypes.STR,
+                description="Dimensión o medida pedida por la que ordenar; prefijo '-' para descendente",
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=f"Número máximo de filas (máx. {PIVOT_MAX_LIMIT})",
+                default=PIVOT_DEFAULT_LIMIT,
+            ),
+            OpenApiParameter("date_from", OpenApiTypes.DATE, description="Fecha mínima de la venta (YYYY-MM-DD)"),
+            OpenApiParameter("date_to", OpenApiTypes.DATE, description="Fecha máxima de la venta (YYYY-MM-DD)"),
+            OpenApiParameter("category", OpenApiTypes.STR, description="Filtro por categoría de producto (icontains)"),
+            OpenApiParameter("product", OpenApiTypes.INT, description="ID del producto"),
+            OpenApiParameter("customer", OpenApiTypes.INT, description="ID del cliente"),
+            OpenApiParameter(
+                "search",
+                OpenApiTypes.STR,
+                description="Búsqueda por nombre de cliente o producto (icontains)",
+            ),
+        ],
+        responses={200: PivotResultSerializer},
+    )
+    def get(self, request):
+        try:
+            query = PivotQuery.from_params(request.query_params)
+        except ValidationError as exc:
+            return Response({'detail': exc.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, source = pivot.run(query)
+        data = {
+            'dimensions': query.dimensions,
+            'measures': query.measures,
+            'source': source,
+            'rows': rows,
+        }
+        return Response(PivotResultSerializer(data).data)
+
+
+class BulkSaleIngestView(APIView):
+    """Ingesta de ventas en bloque (subidas de TPV)"""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Ingesta de ventas en bloque",
+        description=(
+            "Registra miles de ventas en una sola transacción: valida el stock agregado "
+            "por producto, descuenta el stock con un UPDATE por producto e inserta las "
+            "ventas en bloque.\n\n"
+            "Las filas con errores se devuelven en `errors` con su índice y no impiden "
+            "insertar el resto. La clave de idempotencia (cabecera `Idempotency-Key` o "
+            "campo `idempotency_key`) evita contabilizar dos veces un lote reintentado."
+        ),
+        parameters=[
+            OpenApiParameter(
+                "Idempotency-Key",
+                OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description="Clave única del lote para reintentos seguros",
+            ),
+        ],
+        request=BulkSaleIngestSerializer,
+        responses={201: BulkSaleIngestResultSerializer, 200: BulkSaleIngestResultSerializer},
+    )
+    def post(self, request):
+        serializer = BulkSaleIngestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        idempotency_key = (
+            request.headers.get('Idempotency-Key')
+            or serializer.validated_data.get('idempotency_key')
+        )
+        result = ingest_sales(serializer.validated_data['sales'], idempotency_key=idempotency_key)
+
+        response_status = status.HTTP_200_OK if result['replayed'] else status.HTTP_201_CREATED
+        return Response(BulkSaleIngestResultSerializer(result).data, status=response_status)
+
+
+class BufferedSaleView(APIView):
+    """Registro de una venta con escritura diferida (picos de checkout)"""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Registrar venta (escritura diferida)",
+        description=(
+            "Valida la venta contra la reserva de stock en memoria, la anota en el "
+            "journal local y responde al momento con un ticket. La venta se inserta "
+            "en la base de datos en el siguiente volcado por lotes.\n\n"
+            "Requiere `SALES_BUFFER_ENABLED`; si está desactivada responde 503."
+        ),
+        request=BufferedSaleSerializer,
+        responses={202: BufferedSaleTicketSerializer},
+    )
+    def post(self, request):
+        buffer = get_buffer()
+        if buffer is None:
+            return Response(
+                {'detail': 'La escritura diferida de ventas está desactivada.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        serializer = BufferedSaleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ticket = buffer.submit(**serializer.validated_data)
+        except ValidationError as exc:
+            return Response({'detail': exc.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'ticket': ticket}, status=status.HTTP_202_ACCEPTED)
+
+
+class BufferedSaleStatusView(APIView):
+    """Estado de una venta diferida por su ticket"""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Estado de una venta diferida",
+        description=(
+            "`created` con el id de la venta, `rejected` con los errores del volcado "
+            "(p. ej. stock agotado por otra escritura antes del volcado) o `pending` "
+            "mientras el ticket no se ha volcado (también para tickets desconocidos)."
+        ),
+        responses=BufferedSaleStatusSerializer,
+    )
+    def get(self, request, ticket):
+        outcome = BufferedSaleOutcome.objects.filter(ticket=ticket).first()
+        if outcome is None:
+            data = {'ticket': ticket, 'status': 'pending', 'sale': None, 'errors': None}
+        else:
+            data = {
+                'ticket': ticket,
+                'status': 'rejected' if outcome.rejected else 'created',
+                'sale': outcome.sale_id,
+                'errors': outcome.errors,
+            }
+        return Response(BufferedSaleStatusSerializer(data).data)
+
+
+class ChangeLogView(APIView):
+    """Lectura incremental del registro de cambios"""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Cambios desde un offset",
+        description=(
+            "Devuelve en orden los cambios (altas, modificaciones y bajas de ventas, "
+            "productos y clientes) posteriores a `after`, o al offset guardado de "
+            "`consumer`. Usa `next` como siguiente `after`, o confírmalo con "
+            "`changes/commit/` si trabajas con un consumidor."
+        ),
+        parameters=[
+            OpenApiParameter("after", OpenApiTypes.INT, description="Último seq ya procesado"),
+            OpenApiParameter("consumer", OpenApiTypes.STR, description="Lee desde el offset guardado de este consumidor"),
+            OpenApiParameter("entity", OpenApiTypes.STR, enum=[value for value, _ in ChangeLog.ENTITY_CHOICES]),
+            OpenApiParameter("limit", OpenApiTypes.INT, description="Máximo de cambios (por defecto 500, máx. 5000)"),
+        ],
+        responses=ChangeLogPageSerializer,
+    )
+    def get(self, request):
+        params = request.query_params
+        try:
+            limit = min(int(params.get('limit', 500)), 5000)
+            after = int(params['after']) if 'after' in params else None
+        except ValueError:
+            return Response({'detail': 'after y limit deben ser enteros.'}, status=status.HTTP_400_BAD_REQUEST)
+        if after is None:
+            consumer = params.get('consumer')
+            after = changelog.get_offset(consumer) if consumer else 0
+
+        entity = params.get('entity')
+        changes, next_offset = changelog.read_changes(after, limit, [entity] if entity else None)
+        data = {
+            'changes': changes,
+            'next': next_offset,
+            'has_more': ChangeLog.objects.filter(seq__gt=next_offset).exists(),
+        }
+        return Response(ChangeLogPageSerializer(data).data)
+
+
+class ChangeLogCommitView(APIView):
+    """Confirma el offset de un consumidor del registro de cambios"""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Confirmar offset de consumidor",
+        request=ChangeLogCommitSerializer,
+        responses=ChangeLogCommitSerializer,
+    )
+    def post(self, request):
+        serializer = ChangeLogCommitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        consumer = serializer.validated_data['consumer']
+        offset = changelog.commit_offset(consumer, serializer.validated_data['seq'])
+        return Response({'consumer': consumer, 'seq': offset})
+
+
+STATS_ORDERINGS = ['revenue', 'sales_count', 'quantity', 'average', 'last_purchase', 'first_purchase']
+
+
+class _EntityStatsView(APIView):
+    """Base para las estadísticas precalculadas por cliente / producto"""
+    model = None
+    serializer_class = None
+    related = None
+
+    def get(self, request):
+        ordering = request.query_params.get('ordering', '-revenue')
+        if ordering.lstrip('-') not in STATS_ORDERINGS:
+            return Response(
+                {'detail': f"ordering debe ser uno de: {', '.join(STATS_ORDERINGS)} (con '-' para descendente)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'detail': 'limit debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, 1000))
+
+        qs = self.model.objects.select_related(self.related).order_by(ordering, 'pk')[:limit]
+        return Response(self.serializer_class(qs, many=True).data)
+
+
+STATS_PARAMETERS = [
+    OpenApiParameter("limit", OpenApiTypes.INT, description="Número máximo de filas (máx. 1000)", default=10),
+    OpenApiParameter(
+        "ordering",
+        OpenApiTypes.STR,
+        description="Campo de orden; prefijo '-' para descendente",
+        enum=STATS_ORDERINGS + [f'-{field}' for field in STATS_ORDERINGS],
+        default='-revenue',
+    ),
+]
+
+
+class CustomerStatsView(_EntityStatsView):
+    """Estadísticas acumuladas por cliente"""
+    model = CustomerStats
+    serializer_class = CustomerStatsSerializer
+    related = 'customer'
+
+    @extend_schema(
+        summary="Estadísticas por cliente",
+        description=(
+            "Compras, unidades, facturación, ticket medio y fechas de primera y última "
+            "compra de cada cliente, leídas de la tabla precalculada CustomerStats."
+        ),
+        parameters=STATS_PARAMETERS,
+        responses={200: CustomerStatsSerializer(many=True)},
+    )
+    def get(self, request):
+        return super().get(request)
+
+
+class ProductStatsView(_EntityStatsView):
+    """Estadísticas acumuladas por producto"""
+    model = ProductStats
+    serializer_class = ProductStatsSerializer
+    related = 'product'
+
+    @extend_schema(
+        summary="Estadísticas por producto",
+        description=(
+            "Ventas, unidades, facturación, importe medio y fechas de primera y última "
+            "venta de cada producto, leídas de la tabla precalculada ProductStats."
+        ),
+        parameters=STATS_PARAMETERS,
+        responses={200: ProductStatsSerializer(many=True)},
+    )
+    def get(self, request):
+        return super().get(request)
+
+
+TYPEAHEAD_MAX_LIMIT = 50
+
+TYPEAHEAD_PARAMETERS = [
+    OpenApiParameter("q", OpenApiTypes.STR, description="Prefijo del nombre (sin distinguir mayúsculas ni acentos)"),
+    OpenApiParameter("limit", OpenApiTypes.INT, description=f"Número máximo de sugerencias (máx. {TYPEAHEAD_MAX_LIMIT})", default=10),
+]
+
+
+def typeahead_params(request):
+    """``(q, limit)`` de una petición de sugerencias, o ``None`` si ``limit`` no es válido."""
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return None
+    return request.query_params.get('q', ''), max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+
+
+class _TypeaheadView(APIView):
+    """Base para las sugerencias por prefijo sobre ``name_normalized`` (índice)"""
+    model = None
+    serializer_class = None
+    fields = None
+
+    def get(self, request):
+        params = typeahead_params(request)
+        if params is None:
+            return Response({'detail': 'limit debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+        q, limit = params
+
+        qs = (
+            self.model.objects.filter(prefix_filter('name_normalized', q))
+            .order_by('name_normalized', 'pk')
+            .only(*self.fields)[:limit]
+        )
+        return Response(self.serializer_class(qs, many=True).data)
+
+
+class CustomerTypeaheadView(_TypeaheadView):
+    """Sugerencias de clientes por prefijo del nombre"""
+    model = Customer
+    serializer_class = CustomerSuggestionSerializer
+    fields = ['id', 'name']
+
+    @extend_schema(
+        summary="Sugerencias de clientes",
+        description="Primeros clientes (por orden alfabético) cuyo nombre empieza por `q`.",
+        parameters=TYPEAHEAD_PARAMETERS,
+        responses={200: CustomerSuggestionSerializer(many=True)},
+    )
+    def get(self, request):
+        return super().get(request)
+
+
+class ProductTypeaheadView(_TypeaheadView):
+    """Sugerencias de productos por prefijo del nombre"""
+    model = Product
+    serializer_class = ProductSuggestionSerializer
+    fields = ['id', 'name', 'category']
+
+    @extend_schema(
+        summary="Sugerencias de productos",
+        description="Primeros productos (por orden alfabético) cuyo nombre empieza por `q`.",
+        parameters=TYPEAHEAD_PARAMETERS,
+        responses={200: ProductSuggestionSerializer(many=True)},
+    )
+    def get(self, request):
+        return super().get(request)
+
+
+class CategoryTypeaheadView(APIView):
+    """Sugerencias de categorías por prefijo"""
+
+    @extend_schema(
+        summary="Sugerencias de categorías",
+        description=(
+            "Categorías de producto que empiezan por `q`, buscadas en un índice "
+            "ordenado en memoria que se reconstruye al cambiar los productos."
+        ),
+        parameters=TYPEAHEAD_PARAMETERS,
+        responses={200: {'type': 'array', 'items': {'type': 'string'}}},
+    )
+    def get(self, request):
+        params = typeahead_params(request)
+        if params is None:
+            return Response({'detail': 'limit debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+        q, limit = params
+        return Response(category_index().search(q, limit))
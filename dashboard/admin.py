@@ -2,6 +2,9 @@
 from django.contrib import admin
 from django.db.models import Count, Sum
 from django.utils.html import format_html
+from revintel.query_budget import QueryBudgetMixin
+from revintel.admin_utils import sales_totals
+from sales.models import Sale
 from .models import GraphConfig
 
 # Helper: formatea dinero de forma consistente
@@ -30,6 +33,11 @@ class SaleInline(admin.TabularInline):
     # Campos de solo lectura para mostrar info de la venta
     readonly_fields = ['get_sale_info']
     fields = ['sale', 'get_sale_info']
+    # Un <select> con todas las ventas por fila no escala
+    raw_id_fields = ['sale']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('sale__customer')
 
     def get_sale_info(self, obj):
         if getattr(obj, "sale", None):
@@ -47,9 +55,12 @@ class SaleInline(admin.TabularInline):
 
 
 @admin.register(GraphConfig)
-class GraphConfigAdmin(admin.ModelAdmin):
+class GraphConfigAdmin(QueryBudgetMixin, admin.ModelAdmin):
     """Administrador avanzado para configuración de gráficos"""
 
+    changelist_query_budget = 7
+    changeform_query_budget = 7
+
     list_display = [
         'name',
         'chart_type',
@@ -70,7 +81,8 @@ class GraphConfigAdmin(admin.ModelAdmin):
         'sales__product__name'
     ]
 
-    filter_horizontal = ['sales']
+    # Sólo se cargan las ventas seleccionadas (búsqueda vía SaleAdmin)
+    autocomplete_fields = ['sales']
 
     readonly_fields = [
         'created_at',
@@ -101,7 +113,7 @@ class GraphConfigAdmin(admin.ModelAdmin):
 
     @admin.display(description='Ventas', ordering='sales_count')
     def get_sales_count(self, obj):
-        count = obj.sales.count()
+        count = obj.sales_count
         if count == 0:
             return format_html('<span style="color: red;">0 ventas</span>')
         elif count < 5:
@@ -111,9 +123,7 @@ class GraphConfigAdmin(admin.ModelAdmin):
 
     @admin.display(description='Ingresos Totales', ordering='total_revenue')
     def get_total_revenue(self, obj):
-        # Usamos or 0 para evitar None
-        total = obj.sales.aggregate(total=Sum('total_price'))['total'] or 0
-        total_fmt = money(total)
+        total_fmt = money(obj.total_revenue)
         # Pasamos ya la cadena formateada a format_html
         return format_html('<strong>{}</strong>', total_fmt)
 
@@ -130,15 +140,14 @@ class GraphConfigAdmin(admin.ModelAdmin):
     @admin.display(description='Resumen de Ventas')
     def get_sales_summary(self, obj):
         """Muestra un resumen detallado de las ventas"""
-        sales = obj.sales.all()
-        if not sales:
+        if not obj.pk or not obj.sales_count:
             return "No hay ventas asociadas"
 
         summary = []
-        summary.append(f"<strong>Total de ventas:</strong> {sales.count()}<br>")
+        summary.append(f"<strong>Total de ventas:</strong> {obj.sales_count}<br>")
 
-        # Agrupar por cliente
-        customers = sales.values('customer__name').annotate(
+        # Agrupar por cliente (consulta acotada: sólo el top 5)
+        customers = obj.sales.values('customer__name').annotate(
             count=Count('id'),
             total=Sum('total_price')
         ).order_by('-total')[:5]
@@ -162,11 +171,13 @@ class GraphConfigAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        qs = qs.annotate(
-            sales_count=Count('sales'),
-            total_revenue=Sum('sales__total_price')
-        )
-        return qs.prefetch_related('sales', 'sales__customer', 'sales__product')
+        return qs.annotate(**sales_totals(GraphConfig.sales.through, 'graphconfig'))
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'sales':
+            # str(Sale) usa cliente y producto: evitamos 2 consultas por venta seleccionada
+            kwargs['queryset'] = Sale.objects.select_related('customer', 'product')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
 
     # Acciones personalizadas
 
@@ -0,0 +1,46 @@
+# dashboard/snapshot.py
+"""
+Instantánea de los datos del dashboard sin filtros, incrustada en la página.
+
+Con ella los gráficos se pintan sin esperar a las seis llamadas a la API de la
+carga inicial. Se guarda en la caché de Django con el último ``seq`` del
+``ChangeLog`` en la clave: cualquier alta, modificación o baja de ventas,
+productos o clientes la invalida, y ``DASHBOARD_SNAPSHOT_TTL`` limita su vida.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from analytics import services
+from analytics.renderers import to_columnar
+from analytics.serializers import (
+    KPISerializer,
+    ProductDistributionSerializer,
+    SalesByCategorySerializer,
+    SalesByPeriodSerializer,
+    SalesPageSerializer,
+    TopCustomerSerializer,
+)
+from sales.changelog import latest_seq, stable_offset
+
+# Los mismos parámetros que la carga inicial de dashboard.js
+TOP_LIMIT = 10
+LIST_PER_PAGE = 15
+
+
+def build_snapshot():
+    return {
+        # Marca desde la que dashboard.js pide los cambios (?since=)
+        'watermark': stable_offset(),
+        'kpis': KPISerializer(services.kpis()).data,
+        # En columnas, como la pide dashboard.js (?format=columnar)
+        'trend': to_columnar(SalesByPeriodSerializer(services.sales_by_period(group_by='day'), many=True)),
+        'categories': SalesByCategorySerializer(services.sales_by_category(), many=True).data,
+        'products': ProductDistributionSerializer(services.product_distribution(limit=TOP_LIMIT), many=True).data,
+        'customers': TopCustomerSerializer(services.top_customers(limit=TOP_LIMIT), many=True).data,
+        'sales': SalesPageSerializer(services.sales_page(page=1, per_page=LIST_PER_PAGE)).data,
+    }
+
+
+def get_snapshot():
+    """Instantánea actual (de la caché si no ha habido cambios desde que se calculó)."""
+    return cache.get_or_set(f'dashboard:snapshot:{latest_seq()}', build_snapshot, settings.DASHBOARD_SNAPSHOT_TTL)
@@ -1,3 +1,43 @@
+import json
+import re
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from sales.models import Customer, Product
+from sales.services import ingest_sales
+
+
+class DashboardSnapshotTests(TestCase):
+    """Instantánea inicial del dashboard incrustada en la página."""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name="Cliente Inicial", email="inicial@test.com")
+        self.product = Product.objects.create(name="Lámpara", price=Decimal("20.00"), category="Hogar", in_stock=50)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 2}])
+
+    def get_snapshot(self):
+        response = self.client.get(reverse("dashboard:index"))
+        self.assertEqual(response.status_code, 200)
+        embedded = re.search(r'<script id="dashboard-snapshot" type="application/json">(.*?)</script>',
+                             response.content.decode(), re.S)
+        return response, json.loads(embedded.group(1))
+
+    def test_snapshot_matches_api_and_skips_filter_lists(self):
+        response, snapshot = self.get_snapshot()
+
+        self.assertEqual(snapshot['kpis'], self.client.get('/api/sales/kpis/').json())
+        self.assertEqual(snapshot['sales'], self.client.get('/api/sales/list/', {'per_page': 15}).json())
+        self.assertNotContains(response, 'Cliente Inicial</option>')
+
+    def test_snapshot_is_cached_until_sales_change(self):
+        self.get_snapshot()
+        with self.assertNumQueries(1):
+            self.get_snapshot()
 
-# Create your tests here.
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}])
+        _response, snapshot = self.get_snapshot()
+        self.assertEqual(snapshot['kpis']['total_orders'], 2)
@@ -1,12 +1,12 @@
 from django.shortcuts import render
-from sales.models import Product, Customer
+
+from .snapshot import get_snapshot
 
 
 def dashboard_view(request):
     """Vista principal del dashboard"""
+    # Clientes y categorías se sugieren desde la API de typeahead (dashboard.js)
     context = {
-        'products': Product.objects.all(),
-        'customers': Customer.objects.all(),
-        'categories': Product.objects.values_list('category', flat=True).distinct(),
+        'snapshot': get_snapshot(),
     }
     return render(request, 'dashboard/index.html', context)
@@ -3,12 +3,18 @@ from django.contrib import admin
 from django.db.models import Count, Sum
 from django.utils.html import format_html
 from django.utils import timezone
+from revintel.query_budget import QueryBudgetMixin
+from revintel.admin_utils import CalendarDateHierarchyMixin, sales_totals
+from sales.models import Sale
 from .models import Report
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(QueryBudgetMixin, CalendarDateHierarchyMixin, admin.ModelAdmin):
     """Administrador avanzado para reportes"""
+
+    changelist_query_budget = 7
+    changeform_query_budget = 8
     
     list_display = [
         'title',
@@ -29,7 +35,8 @@ class ReportAdmin(admin.ModelAdmin):
         'sales__product__name'
     ]
     
-    filter_horizontal = ['sales']
+    # Sólo se cargan las ventas seleccionadas (búsqueda vía SaleAdmin)
+    autocomplete_fields = ['sales']
     
     readonly_fields = [
         'generated_at',
@@ -74,7 +81,7 @@ class ReportAdmin(admin.ModelAdmin):
     
     @admin.display(description='Ventas', ordering='sales_count')
     def get_sales_count(self, obj):
-        count = obj.sales.count()
+        count = obj.sales_count
         if count == 0:
             return format_html('<span style="color: gray;">Sin ventas</span>')
         elif count < 10:
@@ -84,7 +91,7 @@ class ReportAdmin(admin.ModelAdmin):
     
     @admin.display(description='Ingresos Totales', ordering='total_revenue')
     def get_total_revenue(self, obj):
-        total = obj.sales.aggregate(total=Sum('total_price'))['total'] or 0
+        total = obj.total_revenue or 0
         # Aseguramos que el valor sea numérico y lo formateamos antes de pasarlo a format_html,
         # ya que format_html convierte los argumentos a cadenas (SafeString) y no soporta {:,.2f}.
         try:
@@ -146,10 +153,11 @@ class ReportAdmin(admin.ModelAdmin):
     @admin.display(description='Desglose de Ventas')
     def get_sales_breakdown(self, obj):
         """Muestra estadísticas detalladas de las ventas incluidas"""
-        sales = obj.sales.all()
-        
-        if not sales:
+        if not obj.pk or not obj.sales_count:
             return "No hay ventas en este reporte"
+
+        # Consultas acotadas: sólo los top 5
+        sales = obj.sales.all()
         
         # Estadísticas por producto
         products = sales.values('product__name', 'product__category').annotate(
@@ -164,7 +172,7 @@ class ReportAdmin(admin.ModelAdmin):
         ).order_by('-total')[:5]
         
         summary = []
-        summary.append(f"<strong>Total de ventas:</strong> {sales.count()}<br><br>")
+        summary.append(f"<strong>Total de ventas:</strong> {obj.sales_count}<br><br>")
         
         if products:
             summary.append("<strong>Top 5 Productos:</strong><ol style='margin-top: 5px;'>")
@@ -189,11 +197,13 @@ class ReportAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        qs = qs.annotate(
-            sales_count=Count('sales'),
-            total_revenue=Sum('sales__total_price')
-        )
-        return qs.prefetch_related('sales__product', 'sales__customer')
+        return qs.annotate(**sales_totals(Report.sales.through, 'report'))
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'sales':
+            # str(Sale) usa cliente y producto: evitamos 2 consultas por venta seleccionada
+            kwargs['queryset'] = Sale.objects.select_related('customer', 'product')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
     
     # Acciones personalizadas
     
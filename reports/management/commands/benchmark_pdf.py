@@ -0,0 +1,77 @@
+# reports/management/commands/benchmark_pdf.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from sales.models import Sale
+from reports.renderer import PDFRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia por PDF del reporte de ventas con un renderizador "
+        "en frío (nuevo en cada render) frente a uno caliente (reutilizado)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='Renders por escenario')
+        parser.add_argument('--rows', type=int, default=100, help='Ventas incluidas en cada PDF')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        context = self._build_context(options['rows'])
+
+        def cold():
+            PDFRenderer().render(context)
+
+        warm_renderer = PDFRenderer()
+        warm_renderer.render(context)  # primer render: carga de fuentes y recursos
+
+        def warm():
+            warm_renderer.render(context)
+
+        results = [
+            ('frío', self._measure(cold, iterations)),
+            ('caliente', self._measure(warm, iterations)),
+        ]
+
+        self.stdout.write(f"{'renderizador':<14}{'media':>10}{'p50':>10}{'p95':>10}  (ms, {iterations} PDFs)")
+        for label, timings in results:
+            ordered = sorted(timings)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self.stdout.write(
+                f"{label:<14}{statistics.mean(timings):>10.1f}"
+                f"{statistics.median(timings):>10.1f}{p95:>10.1f}"
+            )
+
+        cold_mean = statistics.mean(results[0][1])
+        warm_mean = statistics.mean(results[1][1])
+        if warm_mean:
+            self.stdout.write(self.style.SUCCESS(f"Aceleración caliente/frío: x{cold_mean / warm_mean:.2f}"))
+
+    def _build_context(self, rows):
+        qs = Sale.objects.select_related('customer', 'product')
+        aggregates = qs.aggregate(total_sales=Sum('total_price'), total_orders=Count('id'))
+        by_category = qs.values('product__category').annotate(
+            total=Sum('total_price'),
+            count=Count('id')
+        ).order_by('-total')[:5]
+        return {
+            'sales': list(qs.order_by('-sale_date')[:rows]),
+            'total_sales': aggregates['total_sales'] or 0,
+            'total_orders': aggregates['total_orders'] or 0,
+            'by_category': list(by_category),
+            'filters': {},
+            'show_summary': True,
+        }
+
+    @staticmethod
+    def _measure(func, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
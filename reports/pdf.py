@@ -0,0 +1,190 @@
+# reports/pdf.py
+"""
+Renderizado de reportes PDF completos por bloques (chunks).
+
+En lugar de construir un único HTML gigantesco con todas las ventas, el
+reporte se divide en bloques de ``REPORTS_PDF_CHUNK_SIZE`` filas. Cada bloque
+se renderiza como un PDF independiente (opcionalmente en un pool de procesos)
+y sus páginas se escriben en el fichero de salida en cuanto llega
+(``_StreamingPdfWriter``): sólo al final se añaden el árbol de páginas y la
+tabla xref. Así el pico de memoria, tanto de WeasyPrint como de la
+concatenación, depende del tamaño del bloque y no del tamaño del reporte.
+
+Tanto el proceso principal como los workers usan el renderizador caliente de
+``reports.renderer``, por lo que plantilla, CSS y fuentes se compilan una
+única vez por proceso.
+"""
+import logging
+from io import BytesIO
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+from .renderer import get_renderer, ordered_map
+
+logger = logging.getLogger(__name__)
+
+# Por encima de este tamaño el PDF final se vuelca a disco en lugar de RAM
+SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+# Columnas que necesita la tabla de detalle; evitamos cargar el resto
+SALE_COLUMNS = (
+    'id', 'sale_date', 'quantity', 'total_price',
+    'customer__name', 'product__name', 'product__category',
+)
+
+
+def iter_sale_chunks(queryset, chunk_size):
+    """
+    Recorre el queryset con un cursor (``iterator``) y devuelve listas de
+    como máximo ``chunk_size`` ventas, sin materializar el resultado completo.
+    """
+    sales = (
+        queryset
+        .select_related('customer', 'product')
+        .only(*SALE_COLUMNS)
+        .order_by('-sale_date', '-id')
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(sales, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def html_to_pdf(html_string):
+    """Convierte un documento HTML en bytes PDF (se ejecuta también en los workers)."""
+    return get_renderer().html_to_pdf(html_string)
+
+
+def _iter_chunk_html(queryset, context, chunk_size):
+    """Genera el HTML de cada bloque; el resumen sólo va en el primero."""
+    renderer = get_renderer()
+    first = True
+    for chunk in iter_sale_chunks(queryset, chunk_size):
+        yield renderer.render_html({
+            **context,
+            'sales': chunk,
+            'show_summary': first,
+        })
+        first = False
+
+    if first:
+        # Sin ventas: un único documento con el resumen y la tabla vacía
+        yield renderer.render_html({
+            **context,
+            'sales': [],
+            'show_summary': True,
+        })
+
+
+class _StreamingPdfWriter:
+    """
+    Concatena PDFs escribiendo en ``output`` cada página y los objetos que
+    referencia en cuanto se añade su documento. En memoria sólo quedan el
+    documento en curso y el desplazamiento de cada objeto ya escrito.
+
+    Los objetos se renumeran; el catálogo y el árbol de páginas (objetos 1 y
+    2) se escriben en ``close``. Marcadores y destinos con nombre del catálogo
+    de cada bloque no se copian (los reportes no los usan).
+    """
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, output):
+        self.output = output
+        self.offsets = [None, None]
+        self.page_ids = []
+        output.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _new_id(self):
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _write(self, object_id, obj):
+        self.offsets[object_id - 1] = self.output.tell()
+        self.output.write(f'{object_id} 0 obj\n'.encode())
+        obj.write_to_stream(self.output)
+        self.output.write(b'\nendobj\n')
+
+    def append(self, reader):
+        """Añade las páginas de ``reader`` al final del documento."""
+        ids = {}
+        pending = []
+
+        def renumber(value):
+            # Sustituye en el sitio las referencias a objetos de ``reader`` por
+            # sus números nuevos y encola los objetos aún no escritos
+            if isinstance(value, IndirectObject):
+                key = (value.idnum, value.generation)
+                if key not in ids:
+                    ids[key] = self._new_id()
+                    pending.append(value)
+                return IndirectObject(ids[key], 0, None)
+            if isinstance(value, DictionaryObject):
+                for name, item in value.items():
+                    value[name] = renumber(item)
+            elif isinstance(value, ArrayObject):
+                value[:] = [renumber(item) for item in value]
+            return value
+
+        # reader.pages ya trae copiados los atributos heredados del árbol original
+        pages = list(reader.pages)
+        for page in pages:
+            reference = page.indirect_reference
+            ids[(reference.idnum, reference.generation)] = self._new_id()
+
+        for page in pages:
+            reference = page.indirect_reference
+            page_id = ids[(reference.idnum, reference.generation)]
+            page.pop('/Parent', None)
+            renumber(page)
+            page[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            self._write(page_id, page)
+            self.page_ids.append(page_id)
+            while pending:
+                reference = pending.pop()
+                self._write(ids[(reference.idnum, reference.generation)], renumber(reference.get_object()))
+
+    def close(self):
+        """Escribe catálogo, árbol de páginas, xref y trailer."""
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self.offsets[self.PAGES - 1] = self.output.tell()
+        self.output.write(
+            f'{self.PAGES} 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>\nendobj\n'.encode()
+        )
+        self.offsets[self.CATALOG - 1] = self.output.tell()
+        self.output.write(f'{self.CATALOG} 0 obj\n<< /Type /Catalog /Pages {self.PAGES} 0 R >>\nendobj\n'.encode())
+
+        xref = self.output.tell()
+        size = len(self.offsets) + 1
+        self.output.write(f'xref\n0 {size}\n0000000000 65535 f\r\n'.encode())
+        for offset in self.offsets:
+            self.output.write(f'{offset:010d} 00000 n\r\n'.encode())
+        self.output.write(
+            f'trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+        )
+
+
+def render_chunked_pdf(queryset, context, chunk_size=None, workers=None):
+    """
+    Renderiza el reporte completo por bloques y devuelve un fichero temporal
+    (posicionado al inicio) con el PDF concatenado.
+    """
+    chunk_size = chunk_size or settings.REPORTS_PDF_CHUNK_SIZE
+    workers = settings.REPORTS_PDF_WORKERS if workers is None else workers
+
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    writer = _StreamingPdfWriter(output)
+    html_chunks = _iter_chunk_html(queryset, context, chunk_size)
+    for index, pdf_bytes in enumerate(ordered_map(html_to_pdf, html_chunks, workers), start=1):
+        writer.append(PdfReader(BytesIO(pdf_bytes)))
+        logger.debug("Bloque %s del reporte PDF renderizado", index)
+    writer.close()
+
+    output.seek(0)
+    return output
@@ -0,0 +1,152 @@
+# reports/renderer.py
+"""
+Servicio de renderizado PDF "en caliente".
+
+Cada ``PDFRenderer`` compila una sola vez la plantilla Django, la hoja de
+estilos del reporte (``static/css/pdf_report.css``) y la configuración de
+fuentes de WeasyPrint, y los reutiliza en todos los renders posteriores del
+mismo proceso. Los recursos estáticos (imágenes, CSS enlazados) se resuelven
+a través de un fetcher con caché, de modo que ``WEASYPRINT_BASEURL`` sólo se
+consulta la primera vez.
+"""
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+from weasyprint.urls import URLFetcher, URLFetcherResponse
+
+logger = logging.getLogger(__name__)
+
+REPORT_TEMPLATE = 'reports/pdf_template.html'
+REPORT_STYLESHEET = 'css/pdf_report.css'
+
+
+class CachingURLFetcher(URLFetcher):
+    """URLFetcher que guarda en memoria el contenido de cada URL ya resuelta."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, url, headers=None):
+        cached = self._cache.get(url)
+        if cached is None:
+            response = super().fetch(url, headers)
+            try:
+                body = response.read()
+            finally:
+                response.close()
+            cached = (response.url, body, dict(response.headers.items()), response.status)
+            with self._lock:
+                self._cache[url] = cached
+        final_url, body, response_headers, status = cached
+        return URLFetcherResponse(final_url, body, response_headers, status)
+
+
+class PDFRenderer:
+    """Renderizador WeasyPrint reutilizable con plantilla, CSS y fuentes precompilados."""
+
+    def __init__(self, template_name=REPORT_TEMPLATE, stylesheets=(REPORT_STYLESHEET,), base_url=None):
+        self.base_url = str(base_url or settings.WEASYPRINT_BASEURL)
+        self.template = get_template(template_name)
+        self.font_config = FontConfiguration()
+        self.url_fetcher = CachingURLFetcher()
+        # Caché de imágenes de WeasyPrint, compartida entre renders
+        self.image_cache = {}
+        self.stylesheets = [self._compile_stylesheet(name) for name in stylesheets]
+
+    def _compile_stylesheet(self, name):
+        path = finders.find(name)
+        if path is None:
+            raise FileNotFoundError(f"No se encontró la hoja de estilos estática '{name}'")
+        return CSS(
+            filename=path,
+            base_url=self.base_url,
+            url_fetcher=self.url_fetcher,
+            font_config=self.font_config,
+        )
+
+    def render_html(self, context):
+        """Renderiza la plantilla ya compilada a HTML."""
+        return self.template.render(context)
+
+    def html_to_pdf(self, html_string):
+        """Convierte HTML en bytes PDF reutilizando estilos, fuentes y recursos."""
+        return HTML(
+            string=html_string,
+            base_url=self.base_url,
+            url_fetcher=self.url_fetcher,
+        ).write_pdf(
+            stylesheets=self.stylesheets,
+            font_config=self.font_config,
+            cache=self.image_cache,
+        )
+
+    def render(self, context):
+        """Plantilla + contexto -> bytes PDF."""
+        return self.html_to_pdf(self.render_html(context))
+
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_renderer(template_name=REPORT_TEMPLATE):
+    """Devuelve el renderizador caliente del proceso actual (uno por plantilla)."""
+    renderer = _renderers.get(template_name)
+    if renderer is None:
+        with _renderers_lock:
+            renderer = _renderers.get(template_name)
+            if renderer is None:
+                logger.debug("Inicializando renderizador PDF para %s", template_name)
+                renderer = _renderers[template_name] = PDFRenderer(template_name)
+    return renderer
+
+
+def warm_renderer(template_name=REPORT_TEMPLATE):
+    """
+    Inicializador de los workers: configura Django (los procesos se lanzan con
+    ``spawn`` para no heredar conexiones abiertas a la base de datos) y precarga
+    el renderizador.
+    """
+    django.setup()
+    get_renderer(template_name)
+
+
+def ordered_map(func, items, workers, template_name=REPORT_TEMPLATE):
+    """
+    Aplica ``func`` a cada elemento y devuelve los resultados en orden.
+
+    Con ``workers`` > 1 usa un pool de procesos con renderizadores calientes y
+    una ventana acotada de tareas en vuelo, de forma que la memoria no crece
+    con el número de elementos.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_in_flight = workers * 2
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=warm_renderer,
+        initargs=(template_name,),
+    )
+    with executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,8 @@
+# reports/signals.py
+"""Calendario de reportes para la navegación por fechas del admin."""
+from sales import calendar_days
+from .models import Report
+
+
+def connect():
+    calendar_days.track(Report, 'generated_at')
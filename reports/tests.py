@@ -1,3 +1,90 @@
-from django.test import TestCase
+import zipfile
+from decimal import Decimal
+from io import BytesIO
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from pypdf import PdfReader, PdfWriter
+
+from sales.models import Customer, Product, Sale
+from .invoices import stream_invoices_zip
+from .pdf import _StreamingPdfWriter, iter_sale_chunks
+from .renderer import get_renderer
+
+
+class ChunkedPdfReportTests(TestCase):
+    """Tests del reporte PDF completo renderizado por bloques."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Cliente PDF", email="pdf@test.com")
+        product = Product.objects.create(
+            name="Producto PDF",
+            price=Decimal("5.00"),
+            category="Test",
+            in_stock=1000,
+        )
+        for _ in range(7):
+            Sale.objects.create(customer=customer, product_id=product.id, quantity=1)
+
+    def test_iter_sale_chunks_respects_chunk_size(self):
+        chunks = list(iter_sale_chunks(Sale.objects.all(), 3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        ids = [sale.id for chunk in chunks for sale in chunk]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_streaming_writer_keeps_pages_in_order(self):
+        def chunk(*widths):
+            writer = PdfWriter()
+            for width in widths:
+                writer.add_blank_page(width, 842)
+            data = BytesIO()
+            writer.write(data)
+            return PdfReader(BytesIO(data.getvalue()))
+
+        output = BytesIO()
+        writer = _StreamingPdfWriter(output)
+        writer.append(chunk(100, 200))
+        writer.append(chunk(300))
+        writer.close()
+
+        merged = PdfReader(BytesIO(output.getvalue()), strict=True)
+        self.assertEqual([page.mediabox.width for page in merged.pages], [100, 200, 300])
+
+    @override_settings(REPORTS_PDF_CHUNK_SIZE=3, REPORTS_PDF_WORKERS=0)
+    def test_full_mode_returns_single_pdf(self):
+        response = self.client.get(reverse("reports:export_pdf"), {"mode": "full"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+
+class WarmRendererTests(TestCase):
+    """El renderizador caliente se reutiliza dentro del mismo proceso."""
+
+    def test_get_renderer_is_reused(self):
+        renderer = get_renderer()
+        self.assertIs(renderer, get_renderer())
+        self.assertEqual(len(renderer.stylesheets), 1)
+
+
+class InvoiceZipTests(TestCase):
+    """Generación masiva de facturas en un ZIP emitido por trozos."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Cliente Factura", email="factura@test.com")
+        product = Product.objects.create(name="Producto Factura", price=Decimal("3.50"), in_stock=100)
+        for _ in range(3):
+            Sale.objects.create(customer=customer, product_id=product.id, quantity=2)
+
+    def test_zip_contains_one_invoice_per_sale(self):
+        progress = []
+        data = b"".join(stream_invoices_zip(
+            Sale.objects.all(),
+            workers=0,
+            progress=lambda done, total: progress.append((done, total)),
+        ))
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(name.startswith("factura_FAC-") for name in names))
+        self.assertEqual(progress[-1], (3, 3))
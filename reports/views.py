@@ -1,13 +1,12 @@
 # reports/views.py
 import csv
-from io import BytesIO
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.http import FileResponse, HttpResponse
 from django.db.models import Sum, Count
-from weasyprint import HTML
 
 from sales.models import Sale
-from analytics.views import SaleFilter
+from analytics.services import SaleFilter
+from .pdf import render_chunked_pdf
+from .renderer import get_renderer
 
 
 def export_csv(request):
@@ -38,10 +37,15 @@ def export_csv(request):
 
 
 def export_pdf(request):
-    """Exportar reporte a PDF con WeasyPrint"""
+    """
+    Exportar reporte a PDF con WeasyPrint.
+
+    Por defecto incluye sólo las 100 ventas más recientes. Con ``?mode=full``
+    se exportan todas las ventas filtradas, renderizadas por bloques.
+    """
     queryset = Sale.objects.select_related('customer', 'product').all()
     filterset = SaleFilter(request.GET, queryset=queryset)
-    sales = filterset.qs.order_by('-sale_date')[:100]  # Limitar para PDF
+    full_report = request.GET.get('mode') == 'full'
     
     # Calcular totales
     aggregates = filterset.qs.aggregate(
@@ -56,16 +60,25 @@ def export_pdf(request):
     ).order_by('-total')[:5]
     
     context = {
-        'sales': sales,
         'total_sales': aggregates['total_sales'] or 0,
         'total_orders': aggregates['total_orders'] or 0,
-        'by_category': by_category,
-        'filters': dict(request.GET),
+        'by_category': list(by_category),
+        'filters': {k: v for k, v in request.GET.lists() if k != 'mode'},
     }
+
+    if full_report:
+        pdf_file = render_chunked_pdf(filterset.qs, context)
+        return FileResponse(
+            pdf_file,
+            as_attachment=True,
+            filename='reporte_ventas_completo.pdf',
+            content_type='application/pdf',
+        )
+
+    context['sales'] = filterset.qs.order_by('-sale_date')[:100]  # Limitar para PDF
+    context['show_summary'] = True
     
-    html_string = render_to_string('reports/pdf_template.html', context)
-    html = HTML(string=html_string)
-    pdf_file = html.write_pdf()
+    pdf_file = get_renderer().render(context)
     
     response = HttpResponse(pdf_file, content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="reporte_ventas.pdf"'
@@ -0,0 +1,83 @@
+# revintel/admin_filters.py
+"""
+Filtros del admin que no cargan todas las opciones en cada listado.
+
+- ``AutocompleteListFilter``: clave foránea elegida con el autocompletado del
+  admin (select2 contra ``autocomplete_view``); sólo se consulta el objeto
+  seleccionado. El admin del modelo relacionado necesita ``search_fields``.
+- ``PrefixListFilter``: campo de texto filtrado por prefijo, sin DISTINCT
+  sobre la tabla para listar los valores.
+"""
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.utils.translation import gettext_lazy as _
+
+
+class _InputFilterMixin:
+    """Filtro con un único parámetro que se rellena desde un control de entrada."""
+    # jquery.init.js define django.jQuery, que usa admin_filters.js
+    media = forms.Media(js=['admin/js/jquery.init.js', 'js/admin_filters.js'])
+
+    def value(self):
+        values = self.used_parameters.get(self.lookup_kwarg)
+        return values[-1] if values else None
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        # Sin opciones fijas no hay recuentos por opción
+        return {}
+
+    def choices(self, changelist):
+        self.base_query_string = changelist.get_query_string(remove=[self.lookup_kwarg])
+        yield {
+            'selected': self.value() is None,
+            'query_string': self.base_query_string,
+            'display': _('All'),
+        }
+
+
+class AutocompleteListFilter(_InputFilterMixin, admin.FieldListFilter):
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={
+                'data-filter-parameter': self.lookup_kwarg,
+                'style': 'width: 100%',
+            }),
+            required=False,
+        )
+
+    def widget(self):
+        return self.form_field.widget.render(f'filter_{self.field_path}', self.value())
+
+
+class PrefixListFilter(_InputFilterMixin, admin.FieldListFilter):
+    template = 'admin/prefix_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__istartswith'
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+
+class InputFilterMediaMixin:
+    """Añade al ``ModelAdmin`` los estáticos (select2, JS de filtros) de estos filtros."""
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if not isinstance(list_filter, (list, tuple)) or not issubclass(list_filter[1], _InputFilterMixin):
+                continue
+            if issubclass(list_filter[1], AutocompleteListFilter):
+                field = get_fields_from_path(self.model, list_filter[0])[-1]
+                media += AutocompleteSelect(field, self.admin_site).media
+            media += list_filter[1].media
+        return media
@@ -0,0 +1,120 @@
+# revintel/admin_pagination.py
+"""
+Paginación del admin sin ``COUNT(*)`` completos sobre tablas grandes.
+
+Primero se cuenta con un límite (``COUNT`` sobre ``LIMIT ADMIN_EXACT_COUNT_LIMIT + 1``):
+si el filtro devuelve pocas filas, el total es exacto y barato. Por encima del
+límite se usa la estimación del planificador:
+
+- PostgreSQL: ``pg_class.reltuples`` sin filtros, ``EXPLAIN`` con filtros;
+- SQLite: ``sqlite_stat1`` (tras ``ANALYZE``) sin filtros.
+
+Si el motor no ofrece estimación se cuenta exactamente.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def _postgresql_estimate(queryset, cursor):
+    if not queryset.query.where:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+        # -1: la tabla nunca se ha analizado
+        return int(row[0]) if row and row[0] >= 0 else None
+
+    sql, params = queryset.query.sql_with_params()
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _sqlite_estimate(queryset, cursor):
+    if queryset.query.where:
+        return None
+    cursor.execute(
+        "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+        [queryset.model._meta.db_table],
+    )
+    row = cursor.fetchone()
+    # El primer número de "stat" es el número de filas de la tabla
+    return int(row[0].split()[0]) if row else None
+
+
+ESTIMATORS = {
+    'postgresql': _postgresql_estimate,
+    'sqlite': _sqlite_estimate,
+}
+
+
+def estimate_count(queryset):
+    """Número de filas estimado por el motor, o ``None`` si no hay estimación."""
+    connection = connections[queryset.db]
+    estimator = ESTIMATORS.get(connection.vendor)
+    if estimator is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            return estimator(queryset.order_by(), cursor)
+    except DatabaseError:
+        # p. ej. sqlite_stat1 no existe hasta el primer ANALYZE
+        return None
+
+
+def estimated_count(queryset, exact_limit=None):
+    """Total exacto hasta ``exact_limit`` filas y estimado por encima."""
+    if exact_limit is None:
+        exact_limit = settings.ADMIN_EXACT_COUNT_LIMIT
+    bounded = queryset.order_by()[:exact_limit + 1].count()
+    if bounded <= exact_limit:
+        return bounded
+    estimate = estimate_count(queryset)
+    if estimate is None:
+        return queryset.count()
+    return max(estimate, bounded)
+
+
+class EstimatedCountPaginator(Paginator):
+    """``Paginator`` con ``count`` estimado en resultados grandes."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class _EstimatedTotal:
+    """Sustituye a ``root_queryset`` en ``ChangeList.get_results``, que sólo lo cuenta."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def count(self):
+        return estimated_count(self.queryset)
+
+
+class EstimatedCountChangeList(ChangeList):
+    def get_results(self, request):
+        # El total sin filtros ("N en total") también se estima
+        root_queryset = self.root_queryset
+        self.root_queryset = _EstimatedTotal(root_queryset)
+        try:
+            super().get_results(request)
+        finally:
+            self.root_queryset = root_queryset
+
+
+class EstimatedCountMixin:
+    """Listado del admin con totales estimados para tablas grandes."""
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return EstimatedCountChangeList
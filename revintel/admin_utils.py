@@ -0,0 +1,124 @@
+# revintel/admin_utils.py
+"""
+Utilidades del admin compartidas por las apps: totales de ventas por
+subconsulta para modelos con M2M a ``Sale`` y navegación por fechas servida
+desde ``CalendarDay``.
+"""
+import datetime
+
+from django.contrib.admin.views.main import ERROR_FLAG, IGNORED_PARAMS, PAGE_VAR
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from sales import calendar_days
+
+
+def sales_totals(through, fk):
+    """
+    Número de ventas e ingresos de cada objeto con una relación M2M a Sale,
+    como subconsultas correlacionadas (sin JOIN + GROUP BY sobre el listado).
+    """
+    rows = through.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk)
+    count = Subquery(rows.annotate(count=Count('pk')).values('count'), output_field=IntegerField())
+    total = Subquery(
+        rows.annotate(total=Sum('sale__total_price')).values('total'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return {'sales_count': Coalesce(count, 0), 'total_revenue': total}
+
+
+def calendar_date_hierarchy(cl, source):
+    """
+    Equivalente a la etiqueta ``date_hierarchy`` del admin con los días de
+    ``CalendarDay`` en lugar de DISTINCT/MIN/MAX sobre la tabla del listado.
+    """
+    field = cl.date_hierarchy
+    year_field, month_field, day_field = (f'{field}__{part}' for part in ('year', 'month', 'day'))
+    year, month, day = (
+        int(cl.params[name]) if cl.params.get(name) else None
+        for name in (year_field, month_field, day_field)
+    )
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field}__'])
+
+    if year and month and day:
+        selected = datetime.date(year, month, day)
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year, month_field: month}),
+                'title': capfirst(formats.date_format(selected, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(selected, 'MONTH_DAY_FORMAT'))}],
+        }
+
+    known = calendar_days.days(source, year, month)
+    if not year and known and known[0].year == known[-1].year:
+        # Nivel inicial: como Django, se entra directamente en el único año/mes
+        year = known[0].year
+        if known[0].month == known[-1].month:
+            month = known[0].month
+
+    if year and month:
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year}), 'title': str(year)},
+            'choices': [
+                {
+                    'link': link({year_field: year, month_field: month, day_field: known_day.day}),
+                    'title': capfirst(formats.date_format(known_day, 'MONTH_DAY_FORMAT')),
+                }
+                for known_day in known if known_day.month == month
+            ],
+        }
+    if year:
+        months = sorted({known_day.replace(day=1) for known_day in known if known_day.year == year})
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year, month_field: first.month}),
+                    'title': capfirst(formats.date_format(first, 'YEAR_MONTH_FORMAT')),
+                }
+                for first in months
+            ],
+        }
+    return {
+        'show': True,
+        'back': None,
+        'choices': [
+            {'link': link({year_field: str(known_year)}), 'title': str(known_year)}
+            for known_year in sorted({known_day.year for known_day in known})
+        ],
+    }
+
+
+class CalendarDateHierarchyMixin:
+    """
+    Navegación por fechas servida desde ``CalendarDay``. Con otros filtros o
+    búsqueda activos se usa la de Django sobre el queryset filtrado.
+    """
+    change_list_template = 'admin/calendar_change_list.html'
+
+    def _has_other_filters(self, cl):
+        ignored = {*IGNORED_PARAMS, PAGE_VAR, ERROR_FLAG}
+        ignored.update(f'{cl.date_hierarchy}__{part}' for part in ('year', 'month', 'day'))
+        return bool(cl.query) or any(name not in ignored for name in cl.params)
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None) or {}
+        cl = context.get('cl')
+        if (
+            cl is not None and cl.date_hierarchy
+            and calendar_days.is_tracked(self.model, cl.date_hierarchy)
+            and not self._has_other_filters(cl)
+        ):
+            source = calendar_days.source_for(self.model, cl.date_hierarchy)
+            context['calendar_hierarchy'] = calendar_date_hierarchy(cl, source)
+        return response
@@ -0,0 +1,53 @@
+# revintel/compression.py
+"""
+Compresión de las respuestas: brotli o gzip según ``Accept-Encoding``.
+
+``CompressionMiddleware`` amplía ``GZipMiddleware`` de Django. Las respuestas
+JSON (la API) van en brotli si el cliente lo acepta, que comprime más que gzip
+las series largas. El resto sigue en gzip, que rellena con bytes aleatorios
+contra BREACH (las páginas HTML llevan el token CSRF). Los Server-Sent Events
+no se comprimen: el compresor retendría los eventos.
+
+Se activa con ``RESPONSE_COMPRESSION`` (por defecto sí).
+"""
+import brotli
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+# Calidad 11 (la de por defecto) es para ficheros estáticos; para respuestas
+# dinámicas 5 comprime casi igual a una fracción del coste
+BROTLI_QUALITY = 5
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "")
+        if content_type.startswith("text/event-stream"):
+            return response
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not content_type.startswith("application/json")
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        # Mismas reglas que GZipMiddleware
+        if len(response.content) < 200:
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,73 @@
+# revintel/query_budget.py
+"""
+Presupuesto de consultas SQL para las páginas del admin.
+
+Cada ``ModelAdmin`` con ``QueryBudgetMixin`` declara el número máximo de
+consultas de su listado (``changelist_query_budget``) y de su formulario
+(``changeform_query_budget``). El presupuesto no depende del número de filas:
+superarlo indica una consulta por fila (N+1).
+
+``ADMIN_QUERY_BUDGET`` controla qué pasa al superarlo: ``"warn"`` lo registra
+en el log, ``"raise"`` lanza ``QueryBudgetExceeded`` y ``"off"`` no cuenta.
+"""
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """``execute_wrapper`` que cuenta las consultas ejecutadas."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def query_budget(limit, label):
+    mode = settings.ADMIN_QUERY_BUDGET
+    if mode == 'off' or limit is None:
+        yield None
+        return
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+    if counter.count > limit:
+        message = f"{label}: {counter.count} consultas (presupuesto: {limit})"
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def _render(response):
+    # Las TemplateResponse se evalúan al renderizar: hay que contarlo dentro
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    return response
+
+
+class QueryBudgetMixin:
+    """Aplica el presupuesto de consultas al listado y al formulario del admin."""
+    changelist_query_budget = None
+    changeform_query_budget = None
+
+    def changelist_view(self, request, extra_context=None):
+        with query_budget(self.changelist_query_budget, f"{self.opts.label} (listado)"):
+            return _render(super().changelist_view(request, extra_context))
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with query_budget(self.changeform_query_budget, f"{self.opts.label} (formulario)"):
+            return _render(super().changeform_view(request, object_id, form_url, extra_context))
@@ -77,6 +77,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Compresión brotli/gzip de las respuestas (revintel.compression). Va después
+# de WhiteNoise, que ya sirve los estáticos comprimidos.
+RESPONSE_COMPRESSION = env_bool("RESPONSE_COMPRESSION", True)
+if RESPONSE_COMPRESSION:
+    MIDDLEWARE.insert(MIDDLEWARE.index("whitenoise.middleware.WhiteNoiseMiddleware") + 1, "revintel.compression.CompressionMiddleware")
+
 ROOT_URLCONF = "revintel.urls"
 
 # ----------------------------------------
@@ -190,6 +196,55 @@ AUTH_USER_MODEL = os.environ.get("DJANGO_AUTH_USER_MODEL", "users.RevUser")
 # ----------------------------------------
 WEASYPRINT_BASEURL = STATIC_ROOT
 
+# Reporte PDF completo (/reports/export/pdf/?mode=full): filas por bloque y
+# número de procesos para renderizar bloques en paralelo (0/1 = secuencial)
+REPORTS_PDF_CHUNK_SIZE = int(os.environ.get("REPORTS_PDF_CHUNK_SIZE", 500))
+REPORTS_PDF_WORKERS = int(os.environ.get("REPORTS_PDF_WORKERS", 0))
+
+# ----------------------------------------
+# Admin
+# ----------------------------------------
+# Presupuesto de consultas por página del admin (revintel.query_budget):
+# "warn" registra un aviso al superarlo, "raise" lanza una excepción, "off" no cuenta
+ADMIN_QUERY_BUDGET = os.environ.get("ADMIN_QUERY_BUDGET", "warn" if DEBUG else "off")
+
+# Por encima de este número de filas los listados grandes estiman el total
+# (revintel.admin_pagination) en lugar de hacer un COUNT(*) completo
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get("ADMIN_EXACT_COUNT_LIMIT", "10000"))
+
+# ----------------------------------------
+# Dashboard
+# ----------------------------------------
+# Segundos que se reutiliza la instantánea inicial del dashboard
+# (dashboard.snapshot); los cambios en el ChangeLog la invalidan antes
+DASHBOARD_SNAPSHOT_TTL = int(os.environ.get("DASHBOARD_SNAPSHOT_TTL", 300))
+
+# KPIs en directo (analytics.live, /api/sales/live/kpis/, requiere ASGI):
+# cada cuántos segundos se buscan cambios en el ChangeLog mientras haya
+# dashboards conectados, y cada cuántos se envía un latido a la conexión
+LIVE_KPI_POLL_INTERVAL = float(os.environ.get("LIVE_KPI_POLL_INTERVAL", 1.0))
+LIVE_KPI_HEARTBEAT = float(os.environ.get("LIVE_KPI_HEARTBEAT", 15))
+
+# ----------------------------------------
+# Inventario
+# ----------------------------------------
+# Contadores (shards) en los que se reparte el stock de cada producto para que
+# las ventas concurrentes no compitan por la misma fila (sales.inventory)
+INVENTORY_STOCK_SHARDS = int(os.environ.get("INVENTORY_STOCK_SHARDS", 8))
+
+# Escritura diferida de ventas (sales.buffer, POST /api/sales/buffered/): las
+# ventas se confirman al anotarse en el journal local y se vuelcan por lotes
+SALES_BUFFER_ENABLED = env_bool("SALES_BUFFER_ENABLED", False)
+SALES_BUFFER_JOURNAL_DIR = os.environ.get("SALES_BUFFER_JOURNAL_DIR", str(BASE_DIR / "var" / "sales_journal"))
+SALES_BUFFER_FLUSH_SIZE = int(os.environ.get("SALES_BUFFER_FLUSH_SIZE", 500))
+SALES_BUFFER_FLUSH_INTERVAL = float(os.environ.get("SALES_BUFFER_FLUSH_INTERVAL", 1.0))
+
+# ChangeLog (sales.changelog): segundos desde que se ve por primera vez un hueco
+# en la secuencia hasta darlo por transacción deshecha y saltarlo. Debe superar
+# la transacción de escritura más larga (un lote de import_sales): un cambio en
+# vuelo más tiempo se perdería; a cambio, cada rollback retrasa a los consumidores
+CHANGELOG_GAP_GRACE = float(os.environ.get("CHANGELOG_GAP_GRACE", 60))
+
 # ----------------------------------------
 # Logging
 # ----------------------------------------
@@ -1,6 +1,6 @@
 import reflex as rx
 
-from ..state import DashboardState
+from ..state import REFRESH_INTERVAL, DashboardState
 
 
 def kpi_card(title: str, value: str, subtitle: str | None = None) -> rx.Component:
@@ -189,6 +189,8 @@ def index() -> rx.Component:
                 ),
                 rx.fragment(),
             ),
+            # Refresco periódico mientras la página está abierta
+            rx.moment(interval=int(REFRESH_INTERVAL * 1000), on_change=DashboardState.refresh, display="none"),
             kpi_section(),
             rx.hstack(
                 table_by_period(),
@@ -1,57 +1,346 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
 import os
-from typing import Any, Dict, List
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping
 
+import httpx
 import reflex as rx
-import requests
 
 logger = logging.getLogger(__name__)
 
 # Se inicializa desde revreflex.__init__.py
 API_BASE: str = os.environ.get("REVINTEL_API_BASE", "http://localhost:8000").rstrip("/")
 
+# Transporte hacia el backend: "http" (API REST en API_BASE) o "inprocess"
+# (llama a analytics.services en este mismo proceso, con Django configurado)
+API_TRANSPORT: str = os.environ.get("REVINTEL_TRANSPORT", "http")
 
-class DashboardState(rx.State):
-    """Estado principal del dashboard de ventas."""
+# Segundos que se reutiliza una respuesta del backend entre todas las sesiones
+API_CACHE_TTL: float = float(os.environ.get("REVINTEL_API_CACHE_TTL", "5"))
 
-    loading: bool = False
-    error: str = ""
+# Respuestas distintas (ruta + parámetros) que se guardan como máximo en memoria
+API_CACHE_MAX_ENTRIES: int = int(os.environ.get("REVINTEL_API_CACHE_MAX_ENTRIES", "500"))
+
+# Segundos entre refrescos de los paneles en cada página abierta
+REFRESH_INTERVAL: float = float(os.environ.get("REVINTEL_REFRESH_INTERVAL", "5"))
+
+# Combinaciones de filtros distintas cuyas instantáneas se guardan en memoria
+SNAPSHOT_MAX_ENTRIES: int = int(os.environ.get("REVINTEL_SNAPSHOT_MAX_ENTRIES", "100"))
+
+# Paneles del dashboard: atributo del estado -> (ruta, parámetros)
+PANELS: Dict[str, tuple[str, Dict[str, Any]]] = {
+    "kpis": ("/api/sales/kpis/", {}),
+    # Serie temporal por día (se puede cambiar a month si quieres)
+    "by_period": ("/api/sales/by-period/", {"group_by": "day"}),
+    "by_category": ("/api/sales/by-category/", {}),
+    "top_customers": ("/api/sales/top-customers/", {"limit": 10}),
+}
+
+
+class _ApiClient:
+    """
+    Cliente HTTP compartido por todas las sesiones del proceso.
 
-    kpis: Dict[str, Any] = {}
-    by_period: List[Dict[str, Any]] = []
-    by_category: List[Dict[str, Any]] = []
-    top_customers: List[Dict[str, Any]] = []
+    Reutiliza las conexiones (keep-alive) y guarda cada respuesta
+    ``API_CACHE_TTL`` segundos; si varias sesiones piden lo mismo a la vez,
+    sólo una petición llega al backend y el resto espera su resultado. La caché
+    descarta lo caducado al escribir y, por encima de ``max_entries``, lo menos
+    usado.
+    """
 
-    def _get(self, path: str, params: Dict[str, Any] | None = None) -> Any:
-        """Helper simple para llamar al backend Django."""
-        url = f"{API_BASE}{path}"
-        resp = requests.get(url, params=params, timeout=10)
+    def __init__(self, max_entries: int = API_CACHE_MAX_ENTRIES) -> None:
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._max_entries = max_entries
+        self._pending: Dict[tuple, asyncio.Future] = {}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Las conexiones y futuros pertenecen a un event loop concreto
+            self._client = None
+            self._loop = loop
+            self._pending = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=API_BASE,
+                timeout=10,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def _fetch(self, path: str, params: Dict[str, Any]) -> Any:
+        resp = await self._get_client().get(path, params=params)
         resp.raise_for_status()
         return resp.json()
 
-    def load_data(self):
-        """Carga todos los datos iniciales del dashboard."""
-        self.loading = True
-        self.error = ""
+    async def get(self, path: str, params: Dict[str, Any] | None = None) -> Any:
+        params = params or {}
+        key = (path, tuple(sorted(params.items())))
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            return cached[1]
 
+        self._bind_loop()
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
         try:
-            # KPIs generales
-            self.kpis = self._get("/api/sales/kpis/")
+            data = await self._fetch(path, params)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Evita el aviso de excepción no recuperada si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            self._store(key, data)
+            future.set_result(data)
+            return data
+        finally:
+            self._pending.pop(key, None)
 
-            # Serie temporal por día (se puede cambiar a month si quieres)
-            self.by_period = self._get("/api/sales/by-period/", params={"group_by": "day"})
+    def _store(self, key: tuple, data: Any) -> None:
+        now = time.monotonic()
+        for expired in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[expired]
+        self._cache[key] = (now + API_CACHE_TTL, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
 
-            # Por categoría de producto
-            self.by_category = self._get("/api/sales/by-category/")
 
-            # Top clientes
-            self.top_customers = self._get("/api/sales/top-customers/", params={"limit": 10})
+class _InProcessClient(_ApiClient):
+    """
+    Cliente sin HTTP: resuelve cada ruta de ``PANELS`` con ``analytics.services``
+    y el serializer de la vista, así que los datos tienen la misma forma que los
+    de la API. Configura Django (``revintel.settings``) en la primera llamada.
+    """
 
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Error al cargar datos del dashboard")
-            self.error = str(exc)
-        finally:
+    def __init__(self) -> None:
+        super().__init__()
+        self._routes: Dict[str, Any] | None = None
+
+    def _get_routes(self) -> Dict[str, Any]:
+        if self._routes is None:
+            os.environ.setdefault("DJANGO_SETTINGS_MODULE", "revintel.settings")
+            import django
+
+            django.setup()
+
+            from analytics import services
+            from analytics.serializers import (
+                KPISerializer,
+                ProductDistributionSerializer,
+                SalesByCategorySerializer,
+                SalesByPeriodSerializer,
+                SalesPageSerializer,
+                TopCustomerSerializer,
+            )
+
+            self._routes = {
+                "/api/sales/kpis/": lambda filters, params: KPISerializer(services.kpis(filters)),
+                "/api/sales/by-period/": lambda filters, params: SalesByPeriodSerializer(
+                    services.sales_by_period(filters, params.get("group_by", "day")), many=True
+                ),
+                "/api/sales/by-category/": lambda filters, params: SalesByCategorySerializer(
+                    services.sales_by_category(filters), many=True
+                ),
+                "/api/sales/top-customers/": lambda filters, params: TopCustomerSerializer(
+                    services.top_customers(filters, int(params.get("limit", 10))), many=True
+                ),
+                "/api/sales/products/": lambda filters, params: ProductDistributionSerializer(
+                    services.product_distribution(filters, int(params.get("limit", 10))), many=True
+                ),
+                "/api/sales/list/": lambda filters, params: SalesPageSerializer(
+                    services.sales_page(filters, int(params.get("page", 1)), int(params.get("per_page", 25)))
+                ),
+            }
+        return self._routes
+
+    def _call(self, path: str, params: Dict[str, Any]) -> Any:
+        routes = self._get_routes()
+        if path not in routes:
+            raise ValueError(f"Ruta sin transporte en proceso: {path}")
+
+        from analytics.services import SalesFilters
+        from django.core.serializers.json import DjangoJSONEncoder
+
+        serializer = routes[path](SalesFilters.from_params(params), params)
+        # Ida y vuelta por JSON: los mismos tipos que devolvería la API
+        return json.loads(json.dumps(serializer.data, cls=DjangoJSONEncoder))
+
+    async def _fetch(self, path: str, params: Dict[str, Any]) -> Any:
+        from asgiref.sync import sync_to_async
+
+        return await sync_to_async(self._call)(path, params)
+
+
+api = _InProcessClient() if API_TRANSPORT == "inprocess" else _ApiClient()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Datos de los paneles para unos filtros. Inmutable: lo comparten las sesiones."""
+
+    version: int
+    panels: Mapping[str, Any]
+    # Versión en la que cambió cada panel por última vez
+    panel_versions: Mapping[str, int]
+
+
+_EMPTY_SNAPSHOT = Snapshot(0, MappingProxyType({}), MappingProxyType({}))
+
+
+class _SnapshotStore:
+    """
+    Última instantánea de cada combinación de filtros, compartida por todas las
+    sesiones del proceso. Un panel que llega igual que el guardado conserva su
+    objeto y su versión, así que las sesiones no reciben nada nuevo.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._snapshots: OrderedDict[tuple, Snapshot] = OrderedDict()
+        self._version = 0
+        self._max_entries = max_entries
+
+    @staticmethod
+    def key(filters: Dict[str, Any]) -> tuple:
+        return tuple(sorted((name, value) for name, value in filters.items() if value not in (None, "")))
+
+    def get(self, filters: Dict[str, Any]) -> Snapshot:
+        key = self.key(filters)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return _EMPTY_SNAPSHOT
+        self._snapshots.move_to_end(key)
+        return snapshot
+
+    def publish(self, filters: Dict[str, Any], name: str, data: Any) -> Snapshot:
+        """Guarda el panel ``name`` y devuelve la instantánea vigente."""
+        current = self.get(filters)
+        if name in current.panels and current.panels[name] == data:
+            return current
+
+        self._version += 1
+        snapshot = Snapshot(
+            version=self._version,
+            panels=MappingProxyType({**current.panels, name: data}),
+            panel_versions=MappingProxyType({**current.panel_versions, name: self._version}),
+        )
+        key = self.key(filters)
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self._max_entries:
+            self._snapshots.popitem(last=False)
+        return snapshot
+
+
+snapshots = _SnapshotStore(SNAPSHOT_MAX_ENTRIES)
+
+
+class DashboardState(rx.State):
+    """
+    Estado de una sesión del dashboard de ventas.
+
+    Por sesión sólo se guardan los filtros y la versión de cada panel que ya
+    tiene el cliente (variables de backend, no se envían). Los datos son
+    variables calculadas que leen la instantánea compartida: al cambiar la
+    versión de un panel, Reflex envía sólo ese panel.
+    """
+
+    loading: bool = False
+    error: str = ""
+
+    # Filtros de esta sesión (los mismos parámetros que la API)
+    filters: Dict[str, str] = {}
+
+    _kpis_version: int = 0
+    _by_period_version: int = 0
+    _by_category_version: int = 0
+    _top_customers_version: int = 0
+
+    def __getstate__(self):
+        # Los paneles calculados apuntan a la instantánea compartida: no se serializan por sesión
+        return {key: value for key, value in super().__getstate__().items() if not key.startswith("__cached_")}
+
+    def _panel(self, name: str, default: Any) -> Any:
+        return snapshots.get(self.filters).panels.get(name, default)
+
+    @rx.var(deps=["filters", "_kpis_version"], auto_deps=False)
+    def kpis(self) -> Dict[str, Any]:
+        return self._panel("kpis", {})
+
+    @rx.var(deps=["filters", "_by_period_version"], auto_deps=False)
+    def by_period(self) -> List[Dict[str, Any]]:
+        return self._panel("by_period", [])
+
+    @rx.var(deps=["filters", "_by_category_version"], auto_deps=False)
+    def by_category(self) -> List[Dict[str, Any]]:
+        return self._panel("by_category", [])
+
+    @rx.var(deps=["filters", "_top_customers_version"], auto_deps=False)
+    def top_customers(self) -> List[Dict[str, Any]]:
+        return self._panel("top_customers", [])
+
+    async def _load_panels(self) -> None:
+        """Pide los paneles en paralelo y publica cada uno en cuanto llega."""
+        async with self:
+            filters = dict(self.filters)
+
+        async def load_panel(name: str) -> tuple[str, Any]:
+            path, params = PANELS[name]
+            return name, await api.get(path, {**params, **filters})
+
+        errors = []
+        for next_panel in asyncio.as_completed([load_panel(name) for name in PANELS]):
+            try:
+                name, data = await next_panel
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Error al cargar datos del dashboard")
+                errors.append(str(exc))
+                continue
+            version = snapshots.publish(filters, name, data).panel_versions[name]
+            async with self:
+                # Sólo se marca (y se envía) el panel si el cliente tiene otra versión
+                if getattr(self, f"_{name}_version") != version:
+                    setattr(self, f"_{name}_version", version)
+
+        async with self:
+            self.error = "; ".join(errors)
+
+    @rx.event(background=True)
+    async def load_data(self):
+        """Carga inicial: muestra el aviso de carga mientras llegan los paneles."""
+        async with self:
+            self.loading = True
+            self.error = ""
+        await self._load_panels()
+        async with self:
             self.loading = False
 
+    @rx.event(background=True)
+    async def refresh(self):
+        """Refresco periódico sin aviso de carga: sólo viajan los paneles que cambian."""
+        await self._load_panels()
+
+    @rx.event
+    def apply_filters(self, filters: Dict[str, str]):
+        """Cambia los filtros de la sesión y recarga sus paneles."""
+        self.filters = {name: value for name, value in filters.items() if value}
+        return DashboardState.load_data
@@ -0,0 +1,135 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import state
+from .state import DashboardState, _ApiClient, _SnapshotStore
+
+
+class _CountingClient(_ApiClient):
+    """Cliente sin red: cuenta las peticiones que llegarían al backend."""
+
+    def __init__(self, error=None, max_entries=100):
+        super().__init__(max_entries)
+        self.calls = 0
+        self.error = error
+
+    async def _fetch(self, path, params):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return {"path": path, "call": self.calls}
+
+
+class ApiClientTests(SimpleTestCase):
+    """Caché con TTL y petición única compartida entre sesiones."""
+
+    async def test_concurrent_requests_share_one_fetch(self):
+        client = _CountingClient()
+        params = {"category": "Hogar", "search": "ana"}
+        results = await asyncio.gather(*[client.get("/api/sales/kpis/", params) for _ in range(5)])
+        self.assertEqual(client.calls, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        # Mismos parámetros en otro orden: misma entrada de caché
+        await client.get("/api/sales/kpis/", {"search": "ana", "category": "Hogar"})
+        self.assertEqual(client.calls, 1)
+        await client.get("/api/sales/kpis/", {"category": "Oficina"})
+        self.assertEqual(client.calls, 2)
+
+    async def test_expired_entries_are_fetched_again(self):
+        client = _CountingClient()
+        with mock.patch.object(state, "API_CACHE_TTL", -1):
+            await client.get("/api/sales/kpis/")
+            await client.get("/api/sales/kpis/")
+        self.assertEqual(client.calls, 2)
+
+    async def test_cache_drops_expired_and_least_recently_used_entries(self):
+        client = _CountingClient(max_entries=2)
+        with mock.patch.object(state, "API_CACHE_TTL", -1):
+            await client.get("/api/sales/kpis/", {"category": "Caducada"})
+        await client.get("/api/sales/kpis/", {"category": "A"})
+        self.assertNotIn(("/api/sales/kpis/", (("category", "Caducada"),)), client._cache)
+
+        await client.get("/api/sales/kpis/", {"category": "B"})
+        await client.get("/api/sales/kpis/", {"category": "A"})
+        await client.get("/api/sales/kpis/", {"category": "C"})
+        self.assertEqual(len(client._cache), 2)
+        self.assertEqual(client.calls, 4)
+
+        await client.get("/api/sales/kpis/", {"category": "A"})
+        self.assertEqual(client.calls, 4)
+        await client.get("/api/sales/kpis/", {"category": "B"})
+        self.assertEqual(client.calls, 5)
+
+    async def test_errors_reach_every_waiter_and_are_not_cached(self):
+        client = _CountingClient(error=RuntimeError("backend caído"))
+        results = await asyncio.gather(
+            *[client.get("/api/sales/kpis/") for _ in range(3)], return_exceptions=True
+        )
+        self.assertEqual(client.calls, 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+        client.error = None
+        self.assertEqual(await client.get("/api/sales/kpis/"), {"path": "/api/sales/kpis/", "call": 2})
+
+
+class SnapshotStoreTests(SimpleTestCase):
+    """Instantáneas versionadas por filtros, compartidas entre sesiones."""
+
+    def test_only_changed_panels_get_a_new_version(self):
+        store = _SnapshotStore(max_entries=10)
+        first = store.publish({}, "kpis", {"total_orders": 1})
+        self.assertIs(store.publish({}, "kpis", {"total_orders": 1}), first)
+
+        second = store.publish({}, "by_period", [])
+        self.assertEqual(second.panel_versions["kpis"], first.panel_versions["kpis"])
+        self.assertGreater(second.panel_versions["by_period"], first.version)
+
+        third = store.publish({}, "kpis", {"total_orders": 2})
+        self.assertGreater(third.panel_versions["kpis"], second.version)
+        self.assertEqual(third.panel_versions["by_period"], second.panel_versions["by_period"])
+
+    def test_empty_filters_share_the_same_snapshot(self):
+        store = _SnapshotStore(max_entries=10)
+        published = store.publish({"category": "Hogar", "search": ""}, "kpis", {})
+        self.assertIs(store.get({"category": "Hogar"}), published)
+        self.assertEqual(store.get({"category": "Oficina"}).version, 0)
+
+    def test_least_recently_used_filters_are_evicted(self):
+        store = _SnapshotStore(max_entries=2)
+        store.publish({"category": "A"}, "kpis", {})
+        store.publish({"category": "B"}, "kpis", {})
+        store.get({"category": "A"})
+        store.publish({"category": "C"}, "kpis", {})
+
+        self.assertEqual(store.get({"category": "B"}).version, 0)
+        self.assertNotEqual(store.get({"category": "A"}).version, 0)
+        self.assertNotEqual(store.get({"category": "C"}).version, 0)
+
+
+class DashboardStateTests(SimpleTestCase):
+    """Las sesiones leen los paneles de la instantánea y no los serializan."""
+
+    def setUp(self):
+        patcher = mock.patch.object(state, "snapshots", _SnapshotStore(max_entries=10))
+        self.snapshots = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_panels_follow_versions_and_are_not_serialized(self):
+        session = DashboardState(_reflex_internal_init=True)
+        first = self.snapshots.publish({}, "kpis", {"total_orders": 1})
+        session._kpis_version = first.panel_versions["kpis"]
+        self.assertEqual(session.kpis, {"total_orders": 1})
+
+        second = self.snapshots.publish({}, "kpis", {"total_orders": 2})
+        session._kpis_version = second.panel_versions["kpis"]
+        self.assertEqual(session.kpis, {"total_orders": 2})
+
+        self.assertTrue(any(key.startswith("__cached_") for key in vars(session)))
+        serialized = session.__getstate__()
+        self.assertFalse(any(key.startswith("__cached_") for key in serialized))
+        self.assertIn("filters", serialized)
+        self.assertEqual(serialized["_kpis_version"], second.panel_versions["kpis"])
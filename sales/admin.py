@@ -1,29 +1,127 @@
 # sales/admin.py
+from django import forms
 from django.contrib import admin
-from django.contrib.admin.utils import model_format_dict
-from django.db import models
-from django.db.models import Sum, Count, Avg, F
+from django.contrib.admin.utils import model_format_dict, unquote
+from django.db import models, transaction
+from django.db.models import Sum, Count, DecimalField, F, Q
+from django.db.models.functions import Coalesce
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import path, reverse
+from django.utils.dateparse import parse_datetime
 from django.utils.html import format_html
-from .models import Customer, Product, Sale
-from decimal import Decimal, InvalidOperation
-
-
-class SaleInline(admin.TabularInline):
-    """Inline para ventas en Customer y Product"""
-    model = Sale
-    extra = 0
-    readonly_fields = ['total_price', 'sale_date']
-    fields = ['product', 'customer', 'quantity', 'total_price', 'sale_date']
-    can_delete = False
-
-    def has_add_permission(self, request, obj=None):
-        return False
+from revintel.admin_filters import AutocompleteListFilter, InputFilterMediaMixin, PrefixListFilter
+from revintel.admin_pagination import EstimatedCountMixin
+from revintel.admin_utils import CalendarDateHierarchyMixin
+from revintel.query_budget import QueryBudgetMixin
+from . import changelog, inventory
+from .models import Customer, CustomerStats, InventoryMovement, Product, Sale
+from .search import prefix_filter
+from .signals import product_prices_updated
+from decimal import Decimal
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+class NamePrefixAutocompleteMixin:
+    """
+    El autocompletado del admin (campos y filtros ``autocomplete``) busca por
+    prefijo en ``name_normalized``, indexado; el buscador del listado no cambia.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        match = request.resolver_match
+        if match is None or match.url_name != 'autocomplete':
+            return super().get_search_results(request, queryset, search_term)
+        if search_term:
+            queryset = queryset.filter(prefix_filter('name_normalized', search_term))
+        return queryset.order_by('name_normalized', 'pk'), False
+
+
+class LazySalesMixin:
+    """
+    Ventas del objeto en su formulario de cambio sin un inline con un
+    formulario por venta: se muestra una primera página acotada y el resto se
+    pide por páginas a ``<id>/sales/`` al hacer scroll (paginación por cursor
+    sobre fecha e id, con el índice ``sale_<campo>_recent_idx``).
+    """
+    sales_field = None  # FK de Sale hacia el modelo del admin
+    sales_page_size = 25
+
+    @property
+    def media(self):
+        return super().media + forms.Media(js=['js/admin_sales_panel.js'])
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                '<path:object_id>/sales/',
+                self.admin_site.admin_view(self.sales_page_view),
+                name='%s_%s_sales' % info,
+            ),
+        ] + super().get_urls()
+
+    def sales_page(self, object_id, cursor=None):
+        """Una página de ventas y el cursor de la siguiente (``None`` si no hay más)."""
+        sales = (
+            Sale.objects.filter(**{f'{self.sales_field}_id': object_id})
+            .select_related('customer', 'product')
+            .order_by('-sale_date', '-id')
+        )
+        if cursor is not None:
+            sale_date, sale_id = cursor
+            sales = sales.filter(Q(sale_date__lt=sale_date) | Q(sale_date=sale_date, id__lt=sale_id))
+        rows = list(sales[:self.sales_page_size + 1])
+        if len(rows) <= self.sales_page_size:
+            return rows, None
+        rows = rows[:self.sales_page_size]
+        return rows, f'{rows[-1].sale_date.isoformat()}|{rows[-1].pk}'
+
+    def sales_page_view(self, request, object_id):
+        if not (self.has_view_or_change_permission(request) and request.user.has_perm('sales.view_sale')):
+            raise PermissionDenied
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404
+
+        cursor = None
+        if request.GET.get('after'):
+            sale_date, _sep, sale_id = request.GET['after'].partition('|')
+            sale_date = parse_datetime(sale_date)
+            if sale_date is None or not sale_id.isdigit():
+                return HttpResponseBadRequest("Cursor no válido.")
+            cursor = (sale_date, int(sale_id))
+
+        rows, next_cursor = self.sales_page(obj.pk, cursor)
+        return JsonResponse({
+            'html': render_to_string('admin/sales/sale_rows.html', {'sales': rows}),
+            'next': next_cursor,
+        })
+
+    @admin.display(description='Ventas')
+    def get_sales_panel(self, obj):
+        if obj is None or obj.pk is None:
+            return "Sin ventas"
+        rows, next_cursor = self.sales_page(obj.pk)
+        if not rows:
+            return "Sin ventas"
+        return render_to_string('admin/sales/sales_panel.html', {
+            'sales': rows,
+            'next': next_cursor,
+            'total': getattr(obj, 'sales_count', None),
+            'url': reverse(f'admin:{self.opts.app_label}_{self.opts.model_name}_sales', args=[obj.pk]),
+        })
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(QueryBudgetMixin, CalendarDateHierarchyMixin, NamePrefixAutocompleteMixin, LazySalesMixin, admin.ModelAdmin):
     """Administrador avanzado para clientes"""
 
+    changelist_query_budget = 7
+    changeform_query_budget = 6
+
     list_display = [
         'name',
         'email',
@@ -46,25 +144,29 @@ class CustomerAdmin(admin.ModelAdmin):
         'get_sales_count',
         'get_total_spent',
         'get_avg_purchase',
-        'get_sales_list'
+        'get_purchase_dates',
+        'get_sales_panel'
     ]
 
+    sales_field = 'customer'
+
     fieldsets = (
         ('Información del Cliente', {
             'fields': ('name', 'email', 'phone')
         }),
         ('Estadísticas de Ventas', {
-            'fields': ('get_sales_count', 'get_total_spent', 'get_avg_purchase'),
+            'fields': ('get_sales_count', 'get_total_spent', 'get_avg_purchase', 'get_purchase_dates'),
             'classes': ('collapse',)
         }),
         ('Historial', {
-            'fields': ('created_at', 'get_sales_list'),
+            'fields': ('created_at',),
             'classes': ('collapse',)
         }),
+        ('Ventas', {
+            'fields': ('get_sales_panel',)
+        }),
     )
 
-    inlines = [SaleInline]
-
     date_hierarchy = 'created_at'
 
     actions = ['export_customer_data', 'mark_as_vip']
@@ -73,14 +175,14 @@ class CustomerAdmin(admin.ModelAdmin):
 
     @admin.display(description='Ventas', ordering='sales_count')
     def get_sales_count(self, obj):
-        count = obj.sales.count()
+        count = obj.sales_count
         if count == 0:
             return format_html('<span style="color: gray;">Sin ventas</span>')
         return format_html('<strong>{}</strong> ventas', count)
 
     @admin.display(description='Total Gastado', ordering='total_spent')
     def get_total_spent(self, obj):
-        total = obj.sales.aggregate(total=Sum('total_price'))['total'] or 0
+        total = obj.total_spent
         if total > 10000:
             color = 'green'
         elif total > 5000:
@@ -90,14 +192,19 @@ class CustomerAdmin(admin.ModelAdmin):
         total_fmt = f'${total:,.2f}'
         return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, total_fmt)
 
-    @admin.display(description='Promedio por Compra')
+    @admin.display(description='Promedio por Compra', ordering='avg_purchase')
     def get_avg_purchase(self, obj):
-        avg = obj.sales.aggregate(avg=Avg('total_price'))['avg'] or 0
-        return f'${avg:,.2f}'
+        return f'${obj.avg_purchase:,.2f}'
 
-    @admin.display(description='Estado')
+    @admin.display(description='Primera / Última Compra', ordering='last_purchase')
+    def get_purchase_dates(self, obj):
+        if obj.first_purchase is None:
+            return "Sin compras"
+        return f'{obj.first_purchase:%Y-%m-%d} / {obj.last_purchase:%Y-%m-%d}'
+
+    @admin.display(description='Estado', ordering='sales_count')
     def get_status(self, obj):
-        count = obj.sales.count()
+        count = obj.sales_count
         if count == 0:
             return format_html('<span style="color: red;">⚠️ Sin actividad</span>')
         elif count >= 10:
@@ -107,32 +214,16 @@ class CustomerAdmin(admin.ModelAdmin):
         else:
             return format_html('<span style="color: blue;">👤 Regular</span>')
 
-    @admin.display(description='Historial de Compras')
-    def get_sales_list(self, obj):
-        sales = obj.sales.order_by('-sale_date')[:10]
-        if not sales:
-            return "Sin compras"
-
-        html = ['<ul style="margin: 0;">']
-        for sale in sales:
-            html.append(
-                '<li><strong>{}</strong> x{} - {} <em>({})</em></li>'.format(
-                    sale.product.name,
-                    sale.quantity,
-                    f'${sale.total_price:,.2f}',
-                    sale.sale_date.strftime("%Y-%m-%d")
-                )
-            )
-        html.append('</ul>')
-        return format_html(''.join(html))
-
     def get_queryset(self, request):
+        # Las columnas de ventas salen de CustomerStats (una fila por cliente)
         qs = super().get_queryset(request)
-        qs = qs.annotate(
-            sales_count=Count('sales'),
-            total_spent=Sum('sales__total_price')
+        return qs.annotate(
+            sales_count=Coalesce(F('stats__sales_count'), 0),
+            total_spent=Coalesce(F('stats__revenue'), Decimal('0'), output_field=MONEY),
+            avg_purchase=Coalesce(F('stats__average'), Decimal('0'), output_field=MONEY),
+            first_purchase=F('stats__first_purchase'),
+            last_purchase=F('stats__last_purchase'),
         )
-        return qs.prefetch_related('sales__product')
 
     # Acciones
 
@@ -154,9 +245,12 @@ class CustomerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(QueryBudgetMixin, NamePrefixAutocompleteMixin, LazySalesMixin, admin.ModelAdmin):
     """Administrador avanzado para productos"""
 
+    changelist_query_budget = 6
+    changeform_query_budget = 5
+
     list_display = [
         'name',
         'price',
@@ -179,12 +273,15 @@ class ProductAdmin(admin.ModelAdmin):
         'get_sales_count',
         'get_revenue',
         'get_avg_quantity',
-        'get_top_customers'
+        'get_top_customers',
+        'get_sales_panel'
     ]
 
+    sales_field = 'product'
+
     fieldsets = (
         ('Información del Producto', {
-            'fields': ('name', 'price', 'category', 'in_stock')
+            'fields': ('name', 'price', 'unit_cost', 'category', 'in_stock')
         }),
         ('Estadísticas de Ventas', {
             'fields': ('get_sales_count', 'get_revenue', 'get_avg_quantity'),
@@ -194,6 +291,9 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('get_top_customers',),
             'classes': ('collapse',)
         }),
+        ('Ventas', {
+            'fields': ('get_sales_panel',)
+        }),
     )
 
     list_editable = ['price', 'in_stock']
@@ -202,29 +302,29 @@ class ProductAdmin(admin.ModelAdmin):
 
     # Métodos personalizados
 
-    @admin.display(description='Stock', ordering='in_stock')
+    @admin.display(description='Stock', ordering='available_stock')
     def get_stock_status(self, obj):
-        if obj.in_stock == 0:
+        # Stock real según los shards de inventario (in_stock es el último consolidado)
+        available = obj.available_stock
+        if available <= 0:
             return format_html('<span style="color: red; font-weight: bold;">🔴 Agotado</span>')
-        elif obj.in_stock < 10:
-            return format_html('<span style="color: orange;">⚠️ Bajo ({} unidades)</span>', obj.in_stock)
+        elif available < 10:
+            return format_html('<span style="color: orange;">⚠️ Bajo ({} unidades)</span>', available)
         else:
-            return format_html('<span style="color: green;">✓ {} disponibles</span>', obj.in_stock)
+            return format_html('<span style="color: green;">✓ {} disponibles</span>', available)
 
     @admin.display(description='Ventas', ordering='sales_count')
     def get_sales_count(self, obj):
-        count = obj.sales.count()
-        return format_html('<strong>{}</strong> ventas', count)
+        return format_html('<strong>{}</strong> ventas', obj.sales_count)
 
     @admin.display(description='Ingresos', ordering='revenue')
     def get_revenue(self, obj):
-        total = obj.sales.aggregate(total=Sum('total_price'))['total'] or 0
-        total_fmt = f'${total:,.2f}'
+        total_fmt = f'${obj.revenue:,.2f}'
         return format_html('<strong style="color: green;">{}</strong>', total_fmt)
 
-    @admin.display(description='Popularidad')
+    @admin.display(description='Popularidad', ordering='sales_count')
     def get_popularity(self, obj):
-        count = obj.sales.count()
+        count = obj.sales_count
         if count == 0:
             return '⚪'
         elif count < 5:
@@ -238,7 +338,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.display(description='Cantidad Promedio')
     def get_avg_quantity(self, obj):
-        avg = obj.sales.aggregate(avg=Avg('quantity'))['avg'] or 0
+        avg = obj.units_sold / obj.sales_count if obj.sales_count else 0
         return f'{avg:.1f} unidades'
 
     @admin.display(description='Top Clientes')
@@ -264,12 +364,22 @@ class ProductAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
+        # Las columnas de ventas salen de ProductStats (una fila por producto)
         qs = qs.annotate(
-            sales_count=Count('sales'),
-            revenue=Sum('sales__total_price')
+            sales_count=Coalesce(F('stats__sales_count'), 0),
+            units_sold=Coalesce(F('stats__quantity'), 0),
+            revenue=Coalesce(F('stats__revenue'), Decimal('0'), output_field=MONEY),
+            available_stock=inventory.available_stock_expression(),
         )
         return qs
 
+    def save_model(self, request, obj, form, change):
+        # Los cambios manuales de stock pasan por el ledger como ajuste
+        stock_changed = change and 'in_stock' in form.changed_data
+        super().save_model(request, obj, form, change)
+        if stock_changed:
+            inventory.set_stock(obj.pk, obj.in_stock)
+
     def get_action_choices(self, request, default_choices=models.BLANK_CHOICE_DASH):
         """
         Igual que la implementación base pero tolerante a errores de formato
@@ -289,7 +399,10 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Reabastecer productos (agregar 50 unidades)')
     def restock_products(self, request, queryset):
-        updated = queryset.update(in_stock=F('in_stock') + 50)
+        updated = 0
+        for product_id in queryset.values_list('pk', flat=True):
+            inventory.restock(product_id, 50)
+            updated += 1
         self.message_user(
             request,
             f'{updated} producto(s) reabastecido(s) con 50 unidades.'
@@ -297,7 +410,11 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Aplicar 10% de descuento')
     def apply_discount(self, request, queryset):
-        updated = queryset.update(price=F('price') * 0.9)
+        product_ids = list(queryset.values_list('pk', flat=True))
+        with transaction.atomic():
+            updated = Product.objects.filter(pk__in=product_ids).update(price=F('price') * 0.9)
+            changelog.record_update(Product, product_ids)
+            product_prices_updated.send(sender=Product, queryset=Product.objects.filter(pk__in=product_ids))
         self.message_user(
             request,
             f'Descuento del 10% aplicado a {updated} producto(s).'
@@ -305,17 +422,45 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Marcar como agotado')
     def mark_out_of_stock(self, request, queryset):
-        updated = queryset.update(in_stock=0)
+        updated = 0
+        for product_id in queryset.values_list('pk', flat=True):
+            inventory.set_stock(product_id, 0)
+            updated += 1
         self.message_user(
             request,
             f'{updated} producto(s) marcado(s) como agotado(s).'
         )
 
 
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(QueryBudgetMixin, admin.ModelAdmin):
+    """Ledger de inventario (sólo lectura)"""
+
+    changelist_query_budget = 7
+
+    list_display = ['created_at', 'product', 'kind', 'quantity', 'sale']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['product__name']
+    list_select_related = ['product', 'sale']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(QueryBudgetMixin, CalendarDateHierarchyMixin, EstimatedCountMixin, InputFilterMediaMixin, admin.ModelAdmin):
     """Administrador avanzado para ventas"""
 
+    changelist_query_budget = 11
+    changeform_query_budget = 8
+
     list_display = [
         'id',
         'get_customer_name',
@@ -326,12 +471,16 @@ class SaleAdmin(admin.ModelAdmin):
         'sale_date'
     ]
 
+    # Sin listar todos los clientes/productos/categorías en cada carga del listado
     list_filter = [
         'sale_date',
-        'customer',
-        'product__category',
+        ('customer', AutocompleteListFilter),
+        ('product', AutocompleteListFilter),
+        ('product__category', PrefixListFilter),
     ]
 
+    autocomplete_fields = ['customer', 'product']
+
     search_fields = [
         'customer__name',
         'customer__email',
@@ -396,24 +545,11 @@ class SaleAdmin(admin.ModelAdmin):
     @admin.display(description='Margen')
     def get_profit_margin(self, obj):
         """
-        Calcula el margen % como:
-        margin = (profit / total_price) * 100
-        Donde profit = total_price - cost
-        cost = price * 0.6 * quantity  (0.6 usando Decimal para evitar mezclar tipos)
+        Margen % = (total_price - coste) / total_price * 100, con el coste
+        unitario del producto (o el estimado si no se conoce) en Decimal.
         """
-        # Aseguramos Decimal para price y total_price (pueden ser None)
-        price = getattr(obj.product, "price", None) or Decimal("0")
         total_price = getattr(obj, "total_price", None) or Decimal("0")
-
-        # quantity normalmente es int; convertimos a Decimal de forma segura
-        try:
-            quantity_dec = Decimal(obj.quantity)
-        except (InvalidOperation, TypeError):
-            # fallback: convertir a string y luego a Decimal
-            quantity_dec = Decimal(str(obj.quantity))
-
-        # Usar Decimal para la constante del coste (60% -> 0.6)
-        cost = price * Decimal("0.6") * quantity_dec
+        cost = obj.product.effective_unit_cost * Decimal(obj.quantity)
         profit = total_price - cost
 
         # Calculamos margen en porcentaje; protegemos división por cero
@@ -436,8 +572,9 @@ class SaleAdmin(admin.ModelAdmin):
 
     @admin.display(description='Info del Cliente')
     def get_customer_info(self, obj):
-        total_sales = obj.customer.sales.count()
-        total_spent = obj.customer.sales.aggregate(total=Sum('total_price'))['total'] or 0
+        stats = CustomerStats.objects.filter(customer_id=obj.customer_id).first()
+        total_sales = stats.sales_count if stats else 0
+        total_spent = stats.revenue if stats else 0
         total_spent_fmt = f'${total_spent:,.2f}'
 
         return format_html(
@@ -457,7 +594,7 @@ class SaleAdmin(admin.ModelAdmin):
     def get_product_info(self, obj):
         price_fmt = f'${obj.product.price:,.2f}'
         category = obj.product.category or 'Sin categoría'
-        in_stock = obj.product.in_stock
+        in_stock = inventory.available_stock(obj.product_id)
 
         return format_html(
             '<div style="padding: 10px; background: #f5f5f5; border-radius: 5px;">'
@@ -478,11 +615,17 @@ class SaleAdmin(admin.ModelAdmin):
 
     @admin.action(description='Generar factura')
     def generate_invoice(self, request, queryset):
-        count = queryset.count()
-        self.message_user(
-            request,
-            f'Generando facturas para {count} venta(s)... (implementar con WeasyPrint)'
+        """Descarga un ZIP con la factura PDF de cada venta seleccionada"""
+        # WeasyPrint necesita pango: importarlo al cargar el admin rompería
+        # el admin y manage.py en hosts sin él
+        from reports.invoices import stream_invoices_zip
+
+        response = StreamingHttpResponse(
+            stream_invoices_zip(queryset),
+            content_type='application/zip'
         )
+        response['Content-Disposition'] = 'attachment; filename="facturas.zip"'
+        return response
 
     @admin.action(description='Exportar a CSV')
     def export_to_csv(self, request, queryset):
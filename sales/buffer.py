@@ -0,0 +1,316 @@
+# sales/buffer.py
+"""
+Escritura diferida (write-behind) de ventas para picos de checkout.
+
+``SaleWriteBuffer.submit`` valida la venta contra una reserva de stock en
+memoria, la anota en un journal local (una línea JSON + fsync) y la confirma
+al instante con un ticket, sin esperar a la base de datos. Un hilo en segundo
+plano vuelca las ventas pendientes en lotes con ``ingest_sales`` cuando se
+alcanza ``SALES_BUFFER_FLUSH_SIZE`` o pasan ``SALES_BUFFER_FLUSH_INTERVAL``
+segundos.
+
+Cada lote es un fichero de journal (segmento) y se ingiere con la clave de
+idempotencia ``buffer:<segmento>``; el fichero sólo se borra después de
+confirmar la transacción. Si el proceso muere, los segmentos que quedan en
+disco se vuelven a ingerir al arrancar (``recover``) o con
+``manage.py replay_sale_journal``, sin duplicar ventas.
+
+Cada proceso escribe en sus propios segmentos y los mantiene bloqueados
+(``flock``) mientras están vivos, así que la recuperación nunca toca los de
+otro proceso en marcha.
+
+La reserva en memoria relee el stock de la BD en cada ventana de volcado, pero
+otra escritura puede agotarlo antes del volcado: la venta se rechaza entonces
+al ingerirla. El resultado de cada ticket (venta creada o errores) queda en
+``BufferedSaleOutcome`` para que el cliente lo consulte.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import inventory
+from .models import BufferedSaleOutcome, Customer
+from .services import ingest_sales
+
+try:
+    import fcntl
+except ImportError:  # Windows: un único proceso de desarrollo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'buffer:'
+SEGMENT_SUFFIX = '.jsonl'
+
+
+def _lock_segment(handle, blocking=True):
+    """Bloqueo exclusivo del segmento. Devuelve False si lo tiene otro proceso."""
+    if fcntl is None:
+        return True
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    try:
+        fcntl.flock(handle.fileno(), flags)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _read_segment(handle):
+    rows = []
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            # Última línea a medio escribir cuando el proceso murió: nunca se confirmó
+            logger.warning("Línea de journal incompleta descartada en %s", handle.name)
+    return rows
+
+
+def ingest_segment(path, rows):
+    """Ingiere las ventas de un segmento de forma idempotente y registra los rechazos."""
+    # La venta conserva la hora en que se confirmó al cliente, no la del volcado
+    # (que tras una caída puede ser horas después, o de otro día)
+    dated = [{**row, 'sale_date': row.get('at')} for row in rows]
+    result = ingest_sales(dated, idempotency_key=f"{KEY_PREFIX}{Path(path).stem}", keep_dates=True)
+    for error in result['errors']:
+        ticket = rows[error['index']].get('ticket')
+        logger.error("Venta diferida %s rechazada al volcarla: %s", ticket, error['errors'])
+    _record_outcomes(rows, result)
+    return result
+
+
+def _record_outcomes(rows, result):
+    """
+    Guarda el resultado de cada ticket del lote. Idempotente: un segmento
+    reingerido devuelve el resultado original y no duplica filas.
+    """
+    rejected = {error['index']: error['errors'] for error in result['errors']}
+    # sale_ids sigue el orden de las filas aceptadas
+    sale_ids = iter(result['sale_ids'])
+    outcomes = []
+    for index, row in enumerate(rows):
+        outcome = BufferedSaleOutcome(ticket=row.get('ticket'))
+        if index in rejected:
+            outcome.errors = rejected[index]
+        else:
+            outcome.sale_id = next(sale_ids)
+        if outcome.ticket:
+            outcomes.append(outcome)
+    BufferedSaleOutcome.objects.bulk_create(outcomes, ignore_conflicts=True)
+
+
+def recover(journal_dir):
+    """
+    Vuelve a ingerir los segmentos huérfanos (de procesos que ya no existen).
+    Devuelve el número de segmentos recuperados.
+    """
+    journal_dir = Path(journal_dir)
+    if not journal_dir.is_dir():
+        return 0
+    recovered = 0
+    for path in sorted(journal_dir.glob(f'*{SEGMENT_SUFFIX}')):
+        with open(path, 'r+', encoding='utf-8') as handle:
+            if not _lock_segment(handle, blocking=False):
+                continue
+            rows = _read_segment(handle)
+            if rows:
+                result = ingest_segment(path, rows)
+                logger.info(
+                    "Journal %s recuperado: %s ventas (%s rechazadas)",
+                    path.name, result['created'], len(result['errors']),
+                )
+            path.unlink()
+        recovered += 1
+    return recovered
+
+
+class SaleWriteBuffer:
+    """Buffer de ventas con journal local y volcado por lotes en segundo plano."""
+
+    def __init__(self, journal_dir, flush_size=500, flush_interval=1.0, autostart=True):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self._pending = []
+        self._segment = None
+        # Segmentos cuyo volcado falló (p. ej. BD caída): se reintentan con la misma clave
+        self._failed = []
+        # Stock leído de la BD (en esta ventana de volcado) y unidades aceptadas
+        # aún sin confirmar, por producto
+        self._db_available = {}
+        self._reserved = defaultdict(int)
+        self._known_customers = set()
+
+        recover(self.journal_dir)
+        if autostart:
+            self.start()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def submit(self, customer_id, product_id, quantity):
+        """
+        Acepta una venta y devuelve su ticket. Lanza ``ValidationError`` si el
+        cliente o el producto no existen o no queda stock.
+        """
+        if quantity < 1:
+            raise ValidationError("La cantidad debe ser un entero mayor o igual que 1.")
+        self._check_customer(customer_id)
+
+        with self._lock:
+            available = self._available(product_id)
+            if available is None:
+                raise ValidationError("El producto no existe.")
+            if quantity > available:
+                raise ValidationError(inventory.INSUFFICIENT_STOCK)
+
+            ticket = uuid.uuid4().hex
+            row = {
+                'ticket': ticket,
+                'customer': customer_id,
+                'product': product_id,
+                'quantity': quantity,
+                'at': timezone.now().isoformat(),
+            }
+            self._append(row)
+            self._reserved[product_id] += quantity
+            self._pending.append(row)
+            full = len(self._pending) >= self.flush_size
+
+        if full:
+            self._wake.set()
+        return ticket
+
+    def _check_customer(self, customer_id):
+        if customer_id in self._known_customers:
+            return
+        if not Customer.objects.filter(pk=customer_id).exists():
+            raise ValidationError("El cliente no existe.")
+        self._known_customers.add(customer_id)
+
+    def _available(self, product_id):
+        """Stock disponible descontando lo aceptado y aún no volcado (con el lock tomado)."""
+        if product_id not in self._db_available:
+            stock = inventory.available_stock_map([product_id])
+            if product_id not in stock:
+                return None
+            self._db_available[product_id] = stock[product_id]
+        return self._db_available[product_id] - self._reserved[product_id]
+
+    def _append(self, row):
+        if self._segment is None:
+            path = self.journal_dir / f"{uuid.uuid4().hex}{SEGMENT_SUFFIX}"
+            handle = open(path, 'a', encoding='utf-8')
+            _lock_segment(handle)
+            self._segment = (path, handle)
+        handle = self._segment[1]
+        handle.write(json.dumps(row) + '\n')
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    # ------------------------------------------------------------------
+    # Volcado
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """Vuelca a la BD las ventas pendientes. Devuelve el número de ventas creadas."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pending:
+                    path, handle = self._segment
+                    self._failed.append((path, handle, self._pending))
+                    self._segment = None
+                    self._pending = []
+                segments, self._failed = self._failed, []
+                # Cada ventana vuelve a leer el stock: otras escrituras (otros
+                # procesos, ingest_sales, el admin) también lo consumen
+                self._db_available.clear()
+
+            created = 0
+            for index, (path, handle, rows) in enumerate(segments):
+                try:
+                    result = ingest_segment(path, rows)
+                except Exception:
+                    with self._lock:
+                        self._failed = segments[index:] + self._failed
+                    raise
+                created += result['created']
+                self._settle(rows)
+                path.unlink()
+                handle.close()
+            return created
+
+    def _settle(self, rows):
+        """Libera las reservas en memoria de un lote ya confirmado en la BD."""
+        with self._lock:
+            for row in rows:
+                self._reserved[row['product']] -= row['quantity']
+                # El próximo submit vuelve a leer el stock real (ya descontado)
+                self._db_available.pop(row['product'], None)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sale-write-buffer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error volcando ventas diferidas; se reintentará")
+            finally:
+                close_old_connections()
+
+    def close(self):
+        """Detiene el hilo de volcado y vuelca lo pendiente."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Buffer del proceso actual, o ``None`` si la escritura diferida está desactivada."""
+    global _buffer
+    if not settings.SALES_BUFFER_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SaleWriteBuffer(
+                settings.SALES_BUFFER_JOURNAL_DIR,
+                flush_size=settings.SALES_BUFFER_FLUSH_SIZE,
+                flush_interval=settings.SALES_BUFFER_FLUSH_INTERVAL,
+            )
+        return _buffer
@@ -0,0 +1,116 @@
+# sales/calendar_days.py
+"""
+Calendario de días con registros para la navegación por fechas del admin.
+
+``track(Modelo, 'campo')`` registra un campo de fecha: cada alta suma uno al
+día correspondiente en ``CalendarDay`` y cada baja lo resta. Las inserciones en
+bloque se suman con ``add_queryset``. Los campos registrados son
+``auto_now_add``, así que la fecha de un registro no cambia al modificarlo.
+
+``rebuild`` (``manage.py rebuild_calendar``) recalcula el calendario desde las
+tablas de origen.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import CalendarDay
+
+# modelo -> campo de fecha registrado
+TRACKED = {}
+
+
+def source_for(model, field):
+    return f"{model._meta.label}.{field}"
+
+
+def is_tracked(model, field):
+    return TRACKED.get(model) == field
+
+
+def to_day(value):
+    """Día (en la zona horaria actual) de una fecha o fecha y hora."""
+    if hasattr(value, 'date'):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def add(source, day, count=1):
+    """Suma ``count`` registros al día ``day`` de ``source`` (un solo upsert)."""
+    opts = CalendarDay._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    source_col, day_col, count_col = (qn(opts.get_field(name).column) for name in ('source', 'day', 'count'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({source_col}, {day_col}, {count_col}) VALUES (%s, %s, %s) "
+            f"ON CONFLICT ({source_col}, {day_col}) "
+            f"DO UPDATE SET {count_col} = {table}.{count_col} + excluded.{count_col}",
+            [source, opts.get_field('day').get_db_prep_value(day, connection), count],
+        )
+
+
+def remove(source, day, count=1):
+    """Resta ``count`` registros al día ``day`` y lo borra si se queda vacío."""
+    days = CalendarDay.objects.filter(source=source, day=day)
+    days.filter(count__lte=count).delete()
+    days.filter(count__gt=count).update(count=F('count') - count)
+
+
+def _count_by_day(queryset, field):
+    return (
+        queryset.order_by()
+        .annotate(calendar_day=TruncDate(field))
+        .values('calendar_day')
+        .annotate(calendar_count=Count('pk'))
+        .values_list('calendar_day', 'calendar_count')
+    )
+
+
+def add_queryset(queryset, field):
+    """Suma al calendario los registros de ``queryset`` (p. ej. una inserción en bloque)."""
+    source = source_for(queryset.model, field)
+    for day, count in _count_by_day(queryset, field):
+        add(source, day, count)
+
+
+def rebuild(model, field):
+    """Recalcula el calendario de ``model.field``. Devuelve el número de días."""
+    source = source_for(model, field)
+    with transaction.atomic():
+        CalendarDay.objects.filter(source=source).delete()
+        days = CalendarDay.objects.bulk_create(
+            CalendarDay(source=source, day=day, count=count)
+            for day, count in _count_by_day(model._default_manager.all(), field)
+        )
+    return len(days)
+
+
+def days(source, year=None, month=None):
+    """Días con registros de ``source``, opcionalmente de un año o mes."""
+    queryset = CalendarDay.objects.filter(source=source)
+    if year:
+        queryset = queryset.filter(day__year=year)
+    if month:
+        queryset = queryset.filter(day__month=month)
+    return list(queryset.order_by('day').values_list('day', flat=True))
+
+
+def _record_save(sender, instance, created, **kwargs):
+    if created:
+        field = TRACKED[sender]
+        add(source_for(sender, field), to_day(getattr(instance, field)))
+
+
+def _record_delete(sender, instance, **kwargs):
+    field = TRACKED[sender]
+    remove(source_for(sender, field), to_day(getattr(instance, field)))
+
+
+def track(model, field):
+    """Mantiene el calendario de ``model.field`` en cada alta y baja."""
+    TRACKED[model] = field
+    post_save.connect(_record_save, sender=model, dispatch_uid=f'calendar_save_{model._meta.label}')
+    post_delete.connect(_record_delete, sender=model, dispatch_uid=f'calendar_delete_{model._meta.label}')
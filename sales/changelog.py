@@ -0,0 +1,201 @@
+# sales/changelog.py
+"""
+Registro de cambios (outbox transaccional) y lectura incremental.
+
+Cada alta, modificación o baja de ``Sale``, ``Product`` o ``Customer`` añade
+una fila a ``ChangeLog`` dentro de la misma transacción que el cambio: por
+señales (``sales.signals``) en ``save()``/``delete()`` y de forma explícita en
+los caminos en bloque que no pasan por el modelo (``ingest_sales``,
+``import_sales``, acciones de admin con ``update()``). Los movimientos de
+stock no se anotan aquí: su fuente es el ledger ``InventoryMovement``.
+
+Los consumidores (cachés, agregados, índices, exportaciones) leen por lotes
+los cambios posteriores a su offset con ``read_changes`` / ``consume`` y lo
+avanzan al terminar. La entrega es "al menos una vez": un consumidor debe
+tolerar ver dos veces el mismo cambio.
+
+Huecos en ``seq``: los números se asignan al insertar y las transacciones se
+confirman en otro orden, así que un hueco puede ser un cambio aún en vuelo o
+una transacción deshecha (que nunca se llenará). La lectura se detiene ante un
+hueco hasta que lleva ``CHANGELOG_GAP_GRACE`` segundos visto por este proceso
+(no desde la fecha de la fila siguiente, que puede ser antigua si el hueco
+tarda en aparecer). Compromiso: una transacción que retenga su ``seq`` más
+tiempo que ese margen se salta; el margen debe superar la transacción de
+escritura más larga (un lote de ``import_sales`` o de ``ingest_sales``). A
+cambio, cada transacción deshecha retrasa a los consumidores ese tiempo.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import ChangeLog, ChangeLogConsumer, Customer, Product, Sale
+
+ENTITIES = {
+    Sale: ChangeLog.ENTITY_SALE,
+    Product: ChangeLog.ENTITY_PRODUCT,
+    Customer: ChangeLog.ENTITY_CUSTOMER,
+}
+
+CHANGE_FIELDS = ('seq', 'entity', 'object_id', 'action', 'payload', 'created_at')
+
+
+def snapshot(instance):
+    """Valores de los campos del objeto, listos para guardarse en JSON."""
+    data = {}
+    for field in instance._meta.concrete_fields:
+        value = getattr(instance, field.attname)
+        if hasattr(value, 'resolve_expression'):
+            # Expresión F() aún sin refrescar: el valor real está en la BD
+            continue
+        data[field.attname] = value
+    return data
+
+
+def _entry(instance, action):
+    return ChangeLog(
+        entity=ENTITIES[type(instance)],
+        object_id=instance.pk,
+        action=action,
+        payload=snapshot(instance),
+    )
+
+
+def record(instance, action):
+    """Anota un cambio de un objeto (dentro de la transacción en curso)."""
+    entry = _entry(instance, action)
+    entry.save()
+    return entry
+
+
+def record_many(instances, action):
+    """Anota en bloque los cambios de varios objetos (caminos ``bulk_create``/``update``)."""
+    ChangeLog.objects.bulk_create([_entry(instance, action) for instance in instances], batch_size=1000)
+
+
+def record_update(model, pks):
+    """Anota el estado actual de objetos modificados con ``QuerySet.update()``."""
+    record_many(model.objects.filter(pk__in=list(pks)).order_by('pk'), ChangeLog.ACTION_UPDATE)
+
+
+def latest_seq(entities=None):
+    """Último ``seq`` anotado (de las entidades ``entities`` si se indican), o 0."""
+    queryset = ChangeLog.objects.all()
+    if entities:
+        queryset = queryset.filter(entity__in=entities)
+    return queryset.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+# Primera vez que este proceso vio cada hueco: primer seq que falta -> instante
+# (monotónico). Otro proceso, o este tras reiniciar, empieza a contar de nuevo:
+# sólo puede esperar de más, nunca saltarse un hueco antes de tiempo.
+_gaps_seen = {}
+_gaps_lock = threading.Lock()
+GAPS_SEEN_MAX = 10000
+
+# stable_offset da por estables, sin recorrerlas, las filas de más de esta
+# antigüedad; desde ahí avanza con la misma regla de huecos que read_changes
+STABLE_BOOTSTRAP_AGE = timedelta(hours=1)
+
+
+def _gap_expired(missing_seq):
+    """True si el hueco que empieza en ``missing_seq`` lleva visto más que el margen."""
+    now = time.monotonic()
+    with _gaps_lock:
+        first_seen = _gaps_seen.setdefault(missing_seq, now)
+        if len(_gaps_seen) > GAPS_SEEN_MAX:
+            # El más antiguo: si sigue abierto, vuelve a contar desde cero
+            _gaps_seen.pop(next(iter(_gaps_seen)))
+    return now - first_seen > settings.CHANGELOG_GAP_GRACE
+
+
+def _can_advance(offset, seq):
+    return seq == offset + 1 or _gap_expired(offset + 1)
+
+
+def stable_offset():
+    """
+    Mayor ``seq`` sin huecos recientes por detrás: todo cambio anterior ya está
+    confirmado (o deshecho). Es la marca segura para leer después con
+    ``read_changes``; ``latest_seq`` podría saltarse un cambio aún en vuelo.
+    """
+    offset = (
+        ChangeLog.objects.filter(created_at__lt=timezone.now() - STABLE_BOOTSTRAP_AGE)
+        .order_by('-seq').values_list('seq', flat=True).first() or 0
+    )
+    for seq in ChangeLog.objects.filter(seq__gt=offset).order_by('seq').values_list('seq', flat=True):
+        if not _can_advance(offset, seq):
+            break
+        offset = seq
+    return offset
+
+
+def read_changes(after=0, limit=500, entities=None):
+    """
+    Cambios con ``seq > after`` en orden. Devuelve ``(cambios, siguiente_offset)``.
+
+    La lectura se detiene ante un hueco reciente (un cambio que puede estar aún
+    en vuelo) y lo salta cuando lleva más de ``CHANGELOG_GAP_GRACE`` segundos
+    visto (ver el docstring del módulo).
+    """
+    rows = ChangeLog.objects.filter(seq__gt=after).order_by('seq').values(*CHANGE_FIELDS)[:limit]
+
+    changes = []
+    offset = after
+    for row in rows:
+        if not _can_advance(offset, row['seq']):
+            break
+        offset = row['seq']
+        if entities and row['entity'] not in entities:
+            continue
+        changes.append(row)
+    return changes, offset
+
+
+def consume(name, limit=500, entities=None, handler=None):
+    """
+    Lee el siguiente lote de cambios del consumidor ``name`` desde su offset
+    guardado, lo pasa a ``handler`` y avanza el offset en la misma transacción
+    (si ``handler`` falla, el offset no se mueve). Devuelve los cambios leídos.
+    """
+    with transaction.atomic():
+        consumer, _ = ChangeLogConsumer.objects.select_for_update().get_or_create(name=name)
+        changes, offset = read_changes(consumer.offset, limit, entities)
+        if handler is not None and changes:
+            handler(changes)
+        if offset != consumer.offset:
+            consumer.offset = offset
+            consumer.save(update_fields=['offset', 'updated_at'])
+    return changes
+
+
+def get_offset(name):
+    return ChangeLogConsumer.objects.filter(name=name).values_list('offset', flat=True).first() or 0
+
+
+def commit_offset(name, seq):
+    """Avanza el offset de un consumidor (nunca lo retrocede). Devuelve el offset vigente."""
+    consumer, _ = ChangeLogConsumer.objects.get_or_create(name=name)
+    ChangeLogConsumer.objects.filter(pk=consumer.pk, offset__lt=seq).update(offset=seq, updated_at=timezone.now())
+    return max(consumer.offset, seq)
+
+
+def reset_offset(name, seq=0):
+    ChangeLogConsumer.objects.update_or_create(name=name, defaults={'offset': seq})
+
+
+def prune(older_than_days):
+    """
+    Borra los cambios ya procesados por todos los consumidores y con más de
+    ``older_than_days`` días. Devuelve el número de filas borradas.
+    """
+    queryset = ChangeLog.objects.filter(created_at__lt=timezone.now() - timedelta(days=older_than_days))
+    min_offset = ChangeLogConsumer.objects.aggregate(min_offset=Min('offset'))['min_offset']
+    if min_offset is not None:
+        queryset = queryset.filter(seq__lte=min_offset)
+    deleted, _ = queryset.delete()
+    return deleted
@@ -0,0 +1,203 @@
+# sales/inventory.py
+"""
+Inventario con ledger de movimientos y contadores de stock repartidos.
+
+- Cada entrada o salida de stock (venta, reabastecimiento, ajuste manual) se
+  anota en ``InventoryMovement``, una tabla en la que sólo se inserta.
+- El stock disponible de cada producto se reparte en ``StockShard``. Una venta
+  descuenta de un único shard elegido al azar con un UPDATE condicional
+  (``available >= cantidad``), así que las ventas concurrentes de un mismo
+  producto rara vez esperan por la misma fila y nunca dejan stock negativo.
+- ``compact`` consolida periódicamente los shards en ``Product.in_stock`` y
+  los vuelve a equilibrar (comando ``manage.py compact_stock``).
+
+La lectura consistente del stock disponible es ``available_stock`` (una sola
+consulta de agregación sobre los shards).
+"""
+import random
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import InventoryMovement, Product, StockShard
+
+INSUFFICIENT_STOCK = "No hay stock suficiente para este producto."
+
+# Reintentos del camino lento de reserva ante escrituras concurrentes
+SLOW_PATH_ATTEMPTS = 3
+
+
+class _ShardChanged(Exception):
+    """Un shard cambió entre la lectura y el UPDATE condicional."""
+
+
+def _split(total, parts):
+    """Reparte ``total`` en ``parts`` enteros lo más iguales posible."""
+    base, extra = divmod(max(total, 0), parts)
+    return [base + (1 if index < extra else 0) for index in range(parts)]
+
+
+def ensure_shards(product_id):
+    """Crea los shards de un producto a partir de ``in_stock`` (sólo la primera vez)."""
+    if StockShard.objects.filter(product_id=product_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            product = Product.objects.select_for_update().only('id', 'in_stock').get(pk=product_id)
+            if StockShard.objects.filter(product_id=product_id).exists():
+                return
+            StockShard.objects.bulk_create([
+                StockShard(product_id=product_id, index=index, available=amount)
+                for index, amount in enumerate(_split(product.in_stock, settings.INVENTORY_STOCK_SHARDS))
+            ])
+    except IntegrityError:
+        # Otro proceso creó los shards a la vez
+        pass
+
+
+def record_movement(product_id, quantity, kind, sale=None):
+    """Añade un movimiento al ledger."""
+    return InventoryMovement.objects.create(product_id=product_id, quantity=quantity, kind=kind, sale=sale)
+
+
+def reserve(product_id, quantity, message=INSUFFICIENT_STOCK):
+    """
+    Descuenta ``quantity`` unidades del stock disponible.
+
+    Camino rápido: un UPDATE condicional sobre un shard al azar. Si ese shard
+    no tiene suficiente, se bloquean los shards del producto y se descuenta
+    repartiendo entre varios. Lanza ``ValidationError`` si no hay stock.
+    """
+    index = random.randrange(settings.INVENTORY_STOCK_SHARDS)
+    updated = StockShard.objects.filter(
+        product_id=product_id, index=index, available__gte=quantity
+    ).update(available=F('available') - quantity)
+    if updated:
+        return
+
+    ensure_shards(product_id)
+    for _ in range(SLOW_PATH_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                _reserve_across_shards(product_id, quantity, message)
+            return
+        except _ShardChanged:
+            continue
+    raise ValidationError(message)
+
+
+def _reserve_across_shards(product_id, quantity, message):
+    shards = list(
+        StockShard.objects.select_for_update()
+        .filter(product_id=product_id)
+        .order_by('index')
+        .values_list('pk', 'available')
+    )
+    if sum(available for _, available in shards) < quantity:
+        raise ValidationError(message)
+
+    pending = quantity
+    for pk, available in sorted(shards, key=lambda shard: -shard[1]):
+        if pending == 0:
+            break
+        take = min(available, pending)
+        if take <= 0:
+            continue
+        updated = StockShard.objects.filter(pk=pk, available__gte=take).update(
+            available=F('available') - take
+        )
+        if not updated:
+            raise _ShardChanged()
+        pending -= take
+
+
+def release(product_id, quantity):
+    """Devuelve ``quantity`` unidades al stock disponible (un UPDATE sobre un shard)."""
+    index = random.randrange(settings.INVENTORY_STOCK_SHARDS)
+    if StockShard.objects.filter(product_id=product_id, index=index).update(
+        available=F('available') + quantity
+    ):
+        return
+    ensure_shards(product_id)
+    shard_pk = (
+        StockShard.objects.filter(product_id=product_id)
+        .order_by('index')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    StockShard.objects.filter(pk=shard_pk).update(available=F('available') + quantity)
+
+
+def restock(product_id, quantity):
+    """Entrada de stock (reabastecimiento) registrada en el ledger."""
+    with transaction.atomic():
+        release(product_id, quantity)
+        record_movement(product_id, quantity, InventoryMovement.KIND_RESTOCK)
+
+
+def _rebalance(product_id, total):
+    """Reparte ``total`` entre los shards (ya bloqueados) y lo consolida en in_stock."""
+    shard_pks = list(
+        StockShard.objects.filter(product_id=product_id).order_by('index').values_list('pk', flat=True)
+    )
+    for pk, amount in zip(shard_pks, _split(total, len(shard_pks))):
+        StockShard.objects.filter(pk=pk).update(available=amount)
+    Product.objects.filter(pk=product_id).update(in_stock=total)
+
+
+def set_stock(product_id, value):
+    """Ajuste manual: fija el stock disponible a ``value`` y anota la diferencia."""
+    ensure_shards(product_id)
+    with transaction.atomic():
+        shards = StockShard.objects.select_for_update().filter(product_id=product_id)
+        current = sum(shards.values_list('available', flat=True))
+        _rebalance(product_id, value)
+        if value != current:
+            record_movement(product_id, value - current, InventoryMovement.KIND_ADJUSTMENT)
+
+
+def compact(product_ids=None):
+    """
+    Consolida los shards en ``Product.in_stock`` y los reequilibra.
+    Devuelve el número de productos compactados.
+    """
+    if product_ids is None:
+        product_ids = StockShard.objects.values_list('product_id', flat=True).distinct()
+    compacted = 0
+    for product_id in list(product_ids):
+        with transaction.atomic():
+            shards = StockShard.objects.select_for_update().filter(product_id=product_id)
+            available = list(shards.values_list('available', flat=True))
+            if not available:
+                continue
+            _rebalance(product_id, sum(available))
+        compacted += 1
+    return compacted
+
+
+def available_stock_expression():
+    """Expresión para anotar el stock disponible en un queryset de productos."""
+    shards_total = (
+        StockShard.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('available'))
+        .values('total')
+    )
+    return Coalesce(Subquery(shards_total), F('in_stock'), output_field=IntegerField())
+
+
+def available_stock(product_id):
+    """Stock disponible en este momento (lectura consistente en una consulta)."""
+    return available_stock_map([product_id]).get(product_id, 0)
+
+
+def available_stock_map(product_ids):
+    """Stock disponible de varios productos: ``{product_id: unidades}``."""
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(available=available_stock_expression())
+        .values_list('pk', 'available')
+    )
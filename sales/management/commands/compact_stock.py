@@ -0,0 +1,21 @@
+# sales/management/commands/compact_stock.py
+"""
+Consolida los contadores de stock repartidos (``StockShard``) en
+``Product.in_stock`` y los vuelve a equilibrar. Pensado para ejecutarse
+periódicamente (cron) o tras una carga grande de ventas.
+"""
+from django.core.management.base import BaseCommand
+
+from sales import inventory
+
+
+class Command(BaseCommand):
+    help = "Consolida los shards de stock en Product.in_stock y los reequilibra."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products',
+                            help='ID de producto a compactar (se puede repetir)')
+
+    def handle(self, *args, **options):
+        compacted = inventory.compact(options['products'])
+        self.stdout.write(self.style.SUCCESS(f"{compacted} producto(s) compactado(s)."))
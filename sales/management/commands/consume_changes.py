@@ -0,0 +1,61 @@
+# sales/management/commands/consume_changes.py
+"""
+Consumidor del ChangeLog: emite como JSON Lines los cambios posteriores al
+offset guardado del consumidor y lo avanza tras cada lote. Con ``--follow``
+queda esperando cambios nuevos.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from sales import changelog
+from sales.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = "Lee por lotes los cambios de ventas/productos/clientes desde el offset de un consumidor."
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumer', help='Nombre del consumidor (su offset se guarda en la BD)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Cambios por lote')
+        parser.add_argument('--entity', action='append', dest='entities',
+                            choices=[value for value, _ in ChangeLog.ENTITY_CHOICES],
+                            help='Filtra por entidad (se puede repetir)')
+        parser.add_argument('--follow', action='store_true', help='Sigue esperando cambios nuevos')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos entre sondeos con --follow')
+        parser.add_argument('--reset', type=int, metavar='SEQ', help='Reinicia el offset del consumidor a SEQ')
+        parser.add_argument('--prune-days', type=int,
+                            help='Borra los cambios ya consumidos por todos y con más de N días')
+
+    def handle(self, *args, **options):
+        name = options['consumer']
+        if options['reset'] is not None:
+            changelog.reset_offset(name, options['reset'])
+        if options['prune_days'] is not None:
+            deleted = changelog.prune(options['prune_days'])
+            self.stderr.write(f"{deleted} cambio(s) antiguos borrados")
+
+        total = 0
+        offset = changelog.get_offset(name)
+        while True:
+            changes = changelog.consume(
+                name,
+                limit=options['batch_size'],
+                entities=options['entities'],
+                handler=self._emit,
+            )
+            total += len(changes)
+            previous, offset = offset, changelog.get_offset(name)
+            if offset != previous:
+                continue
+            if not options['follow']:
+                break
+            time.sleep(options['interval'])
+
+        self.stderr.write(f"{total} cambio(s) consumidos; offset de '{name}': {offset}")
+
+    def _emit(self, changes):
+        for change in changes:
+            self.stdout.write(json.dumps(change, cls=DjangoJSONEncoder, ensure_ascii=False))
@@ -0,0 +1,337 @@
+# sales/management/commands/import_sales.py
+"""
+Importación masiva de ventas históricas desde CSV o JSON Lines.
+
+El fichero se lee en streaming y se procesa por lotes: en cada lote se hace
+alta de los clientes (por ``email``) y productos (por nombre) que faltan, sin
+tocar los que ya existen (son datos maestros vigentes), y las ventas se
+insertan directamente con COPY (PostgreSQL) o ``executemany`` (resto de
+motores), conservando la fecha original de cada venta. El stock de los
+productos no se modifica: son ventas pasadas.
+
+Cada lote se confirma en su propia transacción junto con un registro
+``SaleIngestion`` que actúa de checkpoint; si la importación se interrumpe,
+al relanzar el comando se continúa tras el último lote confirmado.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from datetime import datetime, time as dt_time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from sales import calendar_days, changelog
+from sales.models import ChangeLog, Customer, Product, Sale, SaleIngestion
+from sales.signals import sales_bulk_created
+
+CHECKPOINT_PREFIX = 'import_sales'
+
+# Columnas insertadas en sales_sale, en este orden
+SALE_COLUMNS = ('customer', 'product', 'quantity', 'total_price', 'sale_date')
+
+
+class RowError(ValueError):
+    pass
+
+
+def _parse_decimal(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f"{field}: importe no válido ({value!r})")
+
+
+def _parse_sale_date(value):
+    if not value:
+        raise RowError("sale_date: fecha obligatoria")
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise RowError(f"sale_date: fecha no válida ({value!r})")
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_row(raw):
+    """Normaliza una fila de entrada. Lanza ``RowError`` si no es válida."""
+    if not isinstance(raw, dict):
+        raise RowError("fila con formato no válido")
+    email = (raw.get('customer_email') or '').strip()
+    product_name = (raw.get('product_name') or '').strip()
+    if not email:
+        raise RowError("customer_email: obligatorio")
+    if not product_name:
+        raise RowError("product_name: obligatorio")
+
+    try:
+        quantity = int(raw.get('quantity'))
+    except (TypeError, ValueError):
+        raise RowError(f"quantity: entero no válido ({raw.get('quantity')!r})")
+    if quantity < 1:
+        raise RowError("quantity: debe ser mayor o igual que 1")
+
+    unit_price = _parse_decimal(raw.get('product_price'), 'product_price')
+    total_price = _parse_decimal(raw.get('total_price'), 'total_price')
+    if total_price is None:
+        if unit_price is None:
+            raise RowError("total_price o product_price: se necesita al menos uno")
+        total_price = Sale.line_total(unit_price, quantity)
+    elif unit_price is None:
+        unit_price = (total_price / quantity).quantize(Decimal("0.01"))
+
+    return {
+        'customer_email': email,
+        'customer_name': (raw.get('customer_name') or '').strip() or email,
+        'customer_phone': (raw.get('customer_phone') or '').strip(),
+        'product_name': product_name,
+        'product_category': (raw.get('product_category') or '').strip(),
+        'product_price': unit_price,
+        'quantity': quantity,
+        'total_price': total_price.quantize(Decimal("0.01")),
+        'sale_date': _parse_sale_date(raw.get('sale_date')),
+    }
+
+
+def iter_raw_rows(handle, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(handle)
+    else:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def file_fingerprint(path):
+    """Identifica el fichero (nombre, tamaño y primer bloque) para los checkpoints."""
+    digest = hashlib.sha1()
+    digest.update(os.path.basename(path).encode())
+    digest.update(str(os.path.getsize(path)).encode())
+    with open(path, 'rb') as handle:
+        digest.update(handle.read(64 * 1024))
+    return digest.hexdigest()[:16]
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa ventas históricas desde un fichero CSV o JSON Lines por lotes, "
+        "conservando la fecha original de cada venta y con reanudación automática."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichero .csv o .jsonl a importar')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Formato (por defecto, según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por lote/transacción')
+        parser.add_argument('--restart', action='store_true', help='Ignora el checkpoint y empieza desde el principio')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"No existe el fichero {path}")
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+
+        checkpoint_prefix = f"{CHECKPOINT_PREFIX}:{file_fingerprint(path)}:"
+        if options['restart']:
+            SaleIngestion.objects.filter(idempotency_key__startswith=checkpoint_prefix).delete()
+        start_row = self._last_checkpoint(checkpoint_prefix)
+        if start_row:
+            self.stdout.write(f"Reanudando desde la fila {start_row} (checkpoint)")
+
+        self._product_ids = {}
+        imported = skipped = 0
+        started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            rows = iter_raw_rows(handle, fmt)
+            position = start_row
+            # Saltamos lo ya importado sin parsear las filas
+            for _ in islice(rows, start_row):
+                pass
+
+            while True:
+                raw_batch = list(islice(rows, batch_size))
+                if not raw_batch:
+                    break
+
+                batch, errors = [], []
+                for offset, raw in enumerate(raw_batch):
+                    try:
+                        batch.append(parse_row(raw))
+                    except RowError as exc:
+                        errors.append({'row': position + offset + 1, 'error': str(exc)})
+
+                end = position + len(raw_batch)
+                with transaction.atomic():
+                    if batch:
+                        self._import_batch(batch)
+                    SaleIngestion.objects.create(
+                        idempotency_key=f"{checkpoint_prefix}{end}",
+                        created_count=len(batch),
+                        error_count=len(errors),
+                        result={'rows_end': end, 'errors': errors[:100]},
+                    )
+
+                for error in errors[:5]:
+                    self.stderr.write(f"Fila {error['row']} descartada: {error['error']}")
+
+                position = end
+                imported += len(batch)
+                skipped += len(errors)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{position} filas leídas, {imported} ventas importadas "
+                    f"({imported / elapsed if elapsed else 0:,.0f} filas/s)"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación completada: {imported} ventas, {skipped} filas descartadas "
+            f"en {elapsed:.1f}s ({imported / elapsed if elapsed else 0:,.0f} filas/s)"
+        ))
+
+    def _last_checkpoint(self, prefix):
+        keys = SaleIngestion.objects.filter(
+            idempotency_key__startswith=prefix
+        ).values_list('idempotency_key', flat=True)
+        return max((int(key[len(prefix):]) for key in keys), default=0)
+
+    # ------------------------------------------------------------------
+    # Lotes
+    # ------------------------------------------------------------------
+
+    def _import_batch(self, batch):
+        customer_ids = self._ensure_customers(batch)
+        product_ids = self._ensure_products(batch)
+        values = [
+            (
+                customer_ids[row['customer_email']],
+                product_ids[row['product_name']],
+                row['quantity'],
+                row['total_price'],
+                row['sale_date'],
+            )
+            for row in batch
+        ]
+        last_id = Sale.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        self._insert_sales(values)
+        # COPY/executemany no devuelven los ids: anotamos en el ChangeLog las
+        # ventas posteriores al último id previo (con escrituras concurrentes
+        # puede incluir alguna ajena; los consumidores toleran duplicados)
+        imported = Sale.objects.filter(pk__gt=last_id)
+        changelog.record_many(imported.order_by('pk'), ChangeLog.ACTION_CREATE)
+        sales_bulk_created.send(sender=Sale, queryset=imported)
+
+    def _ensure_customers(self, batch):
+        customers = {}
+        for row in batch:
+            customers[row['customer_email']] = Customer(
+                email=row['customer_email'],
+                name=row['customer_name'],
+                phone=row['customer_phone'],
+            )
+        existing = set(
+            Customer.objects.filter(email__in=customers.keys()).values_list('email', flat=True)
+        )
+        new_emails = customers.keys() - existing
+        if new_emails:
+            # Los clientes existentes conservan su nombre: un histórico no
+            # reescribe los datos maestros actuales
+            Customer.objects.bulk_create(
+                [customers[email] for email in new_emails], ignore_conflicts=True
+            )
+            new_customers = Customer.objects.filter(email__in=new_emails)
+            changelog.record_many(new_customers.order_by('pk'), ChangeLog.ACTION_CREATE)
+            calendar_days.add_queryset(new_customers, 'created_at')
+        return dict(
+            Customer.objects.filter(email__in=customers.keys()).values_list('email', 'pk')
+        )
+
+    def _ensure_products(self, batch):
+        # Los productos suelen repetirse mucho: cacheamos nombre -> id entre lotes
+        missing = {row['product_name']: row for row in batch if row['product_name'] not in self._product_ids}
+        if missing:
+            existing = (
+                Product.objects.filter(name__in=missing.keys())
+                .order_by('pk')
+                .values_list('name', 'pk')
+            )
+            for name, pk in existing:
+                self._product_ids.setdefault(name, pk)
+
+            to_create = [
+                Product(
+                    name=name,
+                    price=row['product_price'],
+                    category=row['product_category'],
+                    in_stock=0,
+                )
+                for name, row in missing.items()
+                if name not in self._product_ids
+            ]
+            if to_create:
+                Product.objects.bulk_create(to_create)
+                created = list(
+                    Product.objects.filter(name__in=[product.name for product in to_create])
+                    .order_by('pk')
+                )
+                changelog.record_many(created, ChangeLog.ACTION_CREATE)
+                for product in created:
+                    self._product_ids.setdefault(product.name, product.pk)
+        return self._product_ids
+
+    def _insert_sales(self, values):
+        """Inserta las ventas sin pasar por Sale.save (conserva ``sale_date``)."""
+        opts = Sale._meta
+        qn = connection.ops.quote_name
+        total_field = opts.get_field('total_price')
+        columns = [opts.get_field(name).column for name in SALE_COLUMNS]
+        table = qn(opts.db_table)
+        column_sql = ', '.join(qn(column) for column in columns)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql' and hasattr(cursor.cursor, 'copy_expert'):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for customer_id, product_id, quantity, total_price, sale_date in values:
+                    writer.writerow([customer_id, product_id, quantity, total_price, sale_date.isoformat()])
+                buffer.seek(0)
+                cursor.cursor.copy_expert(
+                    f"COPY {table} ({column_sql}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({column_sql}) VALUES ({placeholders})",
+                    [
+                        (
+                            customer_id,
+                            product_id,
+                            quantity,
+                            connection.ops.adapt_decimalfield_value(
+                                total_price, total_field.max_digits, total_field.decimal_places
+                            ),
+                            connection.ops.adapt_datetimefield_value(sale_date),
+                        )
+                        for customer_id, product_id, quantity, total_price, sale_date in values
+                    ],
+                )
@@ -0,0 +1,18 @@
+# sales/management/commands/rebuild_calendar.py
+"""
+Recalcula desde cero el calendario de días con registros (``CalendarDay``) que
+usa la navegación por fechas del admin, para todos los campos registrados.
+"""
+from django.core.management.base import BaseCommand
+
+from sales import calendar_days
+
+
+class Command(BaseCommand):
+    help = "Recalcula el calendario de la navegación por fechas del admin."
+
+    def handle(self, *args, **options):
+        for model, field in calendar_days.TRACKED.items():
+            count = calendar_days.rebuild(model, field)
+            self.stdout.write(f"{calendar_days.source_for(model, field)}: {count} día(s)")
+        self.stdout.write(self.style.SUCCESS("Calendario recalculado."))
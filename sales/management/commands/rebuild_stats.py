@@ -0,0 +1,18 @@
+# sales/management/commands/rebuild_stats.py
+"""
+Recalcula desde cero las estadísticas precalculadas por cliente y producto
+(``CustomerStats`` / ``ProductStats``) con dos sentencias sobre conjuntos.
+"""
+from django.core.management.base import BaseCommand
+
+from sales import stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula las estadísticas de ventas por cliente y por producto."
+
+    def handle(self, *args, **options):
+        customers, products = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas recalculadas: {customers} cliente(s), {products} producto(s)."
+        ))
@@ -0,0 +1,22 @@
+# sales/management/commands/replay_sale_journal.py
+"""
+Vuelve a ingerir los segmentos del journal de escritura diferida que dejó un
+proceso caído (``sales.buffer``). Es idempotente: un segmento ya volcado no
+duplica ventas. Los segmentos de procesos en marcha se ignoran.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sales.buffer import recover
+
+
+class Command(BaseCommand):
+    help = "Recupera las ventas diferidas pendientes en el journal local."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal-dir', default=settings.SALES_BUFFER_JOURNAL_DIR,
+                            help='Directorio del journal (por defecto, SALES_BUFFER_JOURNAL_DIR)')
+
+    def handle(self, *args, **options):
+        recovered = recover(options['journal_dir'])
+        self.stdout.write(self.style.SUCCESS(f"{recovered} segmento(s) de journal recuperado(s)."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:07
+
+import django.db.models.deletion
+import django.db.models.expressions
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def fill_stats(apps, schema_editor):
+    # Carga inicial de las estadísticas a partir de las ventas existentes
+    Sale = apps.get_model('sales', 'Sale')
+    for model_name, key in (('CustomerStats', 'customer'), ('ProductStats', 'product')):
+        model = apps.get_model('sales', model_name)
+        rows = (
+            Sale.objects.order_by()
+            .values(f'{key}_id')
+            .annotate(
+                count=models.Count('pk'),
+                units=models.Sum('quantity'),
+                total=models.Sum('total_price'),
+                first=models.Min('sale_date'),
+                last=models.Max('sale_date'),
+            )
+        )
+        model.objects.bulk_create(
+            (
+                model(**{
+                    f'{key}_id': row[f'{key}_id'],
+                    'sales_count': row['count'],
+                    'quantity': row['units'],
+                    'revenue': row['total'],
+                    'first_purchase': row['first'],
+                    'last_purchase': row['last'],
+                })
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_product_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('average', models.GeneratedField(db_persist=True, expression=models.Case(models.When(sales_count=0, then=models.Value(Decimal('0'))), default=django.db.models.expressions.CombinedExpression(models.F('revenue'), '/', models.F('sales_count'))), output_field=models.DecimalField(decimal_places=2, max_digits=14))),
+                ('first_purchase', models.DateTimeField(blank=True, null=True)),
+                ('last_purchase', models.DateTimeField(blank=True, null=True)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sales.customer')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('average', models.GeneratedField(db_persist=True, expression=models.Case(models.When(sales_count=0, then=models.Value(Decimal('0'))), default=django.db.models.expressions.CombinedExpression(models.F('revenue'), '/', models.F('sales_count'))), output_field=models.DecimalField(decimal_places=2, max_digits=14))),
+                ('first_purchase', models.DateTimeField(blank=True, null=True)),
+                ('last_purchase', models.DateTimeField(blank=True, null=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sales.product')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
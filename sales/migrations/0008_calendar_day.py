@@ -0,0 +1,45 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:19
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def fill_calendar(apps, schema_editor):
+    # Carga inicial del calendario de ventas y clientes
+    CalendarDay = apps.get_model('sales', 'CalendarDay')
+    for model_name, field in (('Sale', 'sale_date'), ('Customer', 'created_at')):
+        model = apps.get_model('sales', model_name)
+        rows = (
+            model.objects.order_by()
+            .annotate(calendar_day=TruncDate(field))
+            .values('calendar_day')
+            .annotate(calendar_count=models.Count('pk'))
+        )
+        CalendarDay.objects.bulk_create(
+            CalendarDay(source=f'sales.{model_name}.{field}', day=row['calendar_day'], count=row['calendar_count'])
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_entity_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['source', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('source', 'day'), name='unique_calendar_source_day')],
+            },
+        ),
+        migrations.RunPython(fill_calendar, migrations.RunPython.noop),
+    ]
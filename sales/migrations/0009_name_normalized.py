@@ -0,0 +1,47 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+import sales.search
+
+
+def fill_normalized_names(apps, schema_editor):
+    # Normaliza en Python (igual que NormalizedNameField.pre_save)
+    for model_name in ('Customer', 'Product'):
+        model = apps.get_model('sales', model_name)
+        batch = []
+        for obj in model.objects.only('pk', 'name').iterator(chunk_size=2000):
+            obj.name_normalized = sales.search.normalize_name(obj.name)
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['name_normalized'])
+                batch = []
+        model.objects.bulk_update(batch, ['name_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_calendar_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_normalized',
+            field=sales.search.NormalizedNameField(db_index=True, default='', editable=False, max_length=150, source='name'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='name_normalized',
+            field=sales.search.NormalizedNameField(db_index=True, default='', editable=False, max_length=200, source='name'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+    ]
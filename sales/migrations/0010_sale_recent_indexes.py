@@ -0,0 +1,21 @@
+# Generated by Django 5.2.11 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_name_normalized'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer', '-sale_date', '-id'], name='sale_customer_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['product', '-sale_date', '-id'], name='sale_product_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.11 on 2026-10-19 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_sale_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BufferedSaleOutcome',
+            fields=[
+                ('ticket', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('errors', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sales.sale')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
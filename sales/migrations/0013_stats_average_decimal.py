@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 11:24
+
+import django.db.models.expressions
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_buffered_sale_outcome'),
+    ]
+
+    operations = [
+        # Las columnas generadas no se pueden modificar: se recrean
+        migrations.RemoveField(
+            model_name='customerstats',
+            name='average',
+        ),
+        migrations.AddField(
+            model_name='customerstats',
+            name='average',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(sales_count=0, then=models.Value(Decimal('0'))), default=models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('revenue'), '*', models.Value(1.0)), '/', models.F('sales_count')), output_field=models.DecimalField(decimal_places=2, max_digits=14))), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        # Las columnas generadas no se pueden modificar: se recrean
+        migrations.RemoveField(
+            model_name='productstats',
+            name='average',
+        ),
+        migrations.AddField(
+            model_name='productstats',
+            name='average',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(sales_count=0, then=models.Value(Decimal('0'))), default=models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('revenue'), '*', models.Value(1.0)), '/', models.F('sales_count')), output_field=models.DecimalField(decimal_places=2, max_digits=14))), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+    ]
@@ -1,14 +1,24 @@
 from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .search import NormalizedNameField
+
 class Customer(models.Model):
     name = models.CharField(max_length=150)
+    # Nombre en minúsculas y sin acentos para la búsqueda por prefijo (sales.search)
+    name_normalized = NormalizedNameField(max_length=150, source="name")
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # El ChangeLog (señal post_save) se escribe en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -17,10 +27,27 @@ class Customer(models.Model):
 
 
 class Product(models.Model):
+    # Coste estimado (fracción del precio) cuando no se indica unit_cost
+    DEFAULT_COST_RATIO = Decimal("0.6")
+
     name = models.CharField(max_length=200)
+    name_normalized = NormalizedNameField(max_length=200, source="name")
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=100, blank=True, db_index=True)
     in_stock = models.PositiveIntegerField(default=0)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    @property
+    def effective_unit_cost(self):
+        """Coste unitario real o, si no se conoce, estimado a partir del precio."""
+        if self.unit_cost is not None:
+            return self.unit_cost
+        return (Decimal(self.price) * self.DEFAULT_COST_RATIO).quantize(Decimal("0.01"))
+
+    def save(self, *args, **kwargs):
+        # El ChangeLog (señal post_save) se escribe en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -34,41 +61,272 @@ class Sale(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="sales")
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     total_price = models.DecimalField(max_digits=12, decimal_places=2, editable=False, blank=True)
-    sale_date = models.DateTimeField(auto_now_add=True)
+    # default (no auto_now_add) para que las inserciones en bloque puedan fijar
+    # la fecha original (importaciones, ventas diferidas del journal)
+    sale_date = models.DateTimeField(default=timezone.now, editable=False)
+
+    @staticmethod
+    def line_total(price, quantity):
+        """Importe de una línea: precio x cantidad, en Decimal y con dos decimales."""
+        return (Decimal(price) * Decimal(quantity)).quantize(Decimal("0.01"))
 
     def calculate_total(self):
         # Aseguramos Decimal y dos decimales
-        return (self.product.price * Decimal(self.quantity)).quantize(Decimal("0.01"))
+        return self.line_total(self.product.price, self.quantity)
 
     def save(self, *args, **kwargs):
+        from . import inventory
+
         # Calcula total_price
         self.total_price = self.calculate_total()
 
-        # Manejo de stock: ajusta solo en creación / actualización con diferencia
+        # Manejo de stock a través del ledger de inventario (sales.inventory):
+        # las reservas se hacen sobre contadores repartidos (shards) para no
+        # serializar todas las ventas de un producto en la fila sales_product.
         with transaction.atomic():
             if self.pk is None:
-                # nueva venta -> verificar stock y descontar
-                if self.quantity > self.product.in_stock:
-                    from django.core.exceptions import ValidationError
-                    raise ValidationError("No hay stock suficiente para este producto.")
-                self.product.in_stock = models.F('in_stock') - self.quantity
-                self.product.save(update_fields=['in_stock'])
+                # nueva venta -> reservar stock (lanza ValidationError si no hay)
+                inventory.reserve(self.product_id, self.quantity)
+                super().save(*args, **kwargs)
+                inventory.record_movement(self.product_id, -self.quantity, InventoryMovement.KIND_SALE, sale=self)
             else:
                 # actualización: ajustar diferencia
                 old = Sale.objects.select_for_update().get(pk=self.pk)
-                diff = self.quantity - old.quantity
-                if diff != 0:
-                    if diff > 0 and diff > self.product.in_stock:
-                        from django.core.exceptions import ValidationError
-                        raise ValidationError("No hay stock suficiente para aumentar la cantidad.")
-                    # usar F() para concurrencia segura
-                    self.product.in_stock = models.F('in_stock') - diff
-                    self.product.save(update_fields=['in_stock'])
+                if old.product_id != self.product_id:
+                    # cambio de producto: se devuelve todo al antiguo y se reserva en el nuevo
+                    inventory.reserve(self.product_id, self.quantity)
+                    inventory.release(old.product_id, old.quantity)
+                    movements = [(old.product_id, old.quantity), (self.product_id, -self.quantity)]
+                else:
+                    diff = self.quantity - old.quantity
+                    if diff > 0:
+                        inventory.reserve(
+                            self.product_id, diff,
+                            message="No hay stock suficiente para aumentar la cantidad."
+                        )
+                    elif diff < 0:
+                        inventory.release(self.product_id, -diff)
+                    movements = [(self.product_id, -diff)] if diff else []
 
-            super().save(*args, **kwargs)
+                super().save(*args, **kwargs)
+                for product_id, quantity in movements:
+                    inventory.record_movement(product_id, quantity, InventoryMovement.KIND_SALE, sale=self)
 
     def __str__(self):
         return f"{self.customer.name} - {self.product.name} x {self.quantity}"
 
     class Meta:
         ordering = ["-sale_date"]
+        indexes = [
+            # Ventas de un cliente/producto, más recientes primero (panel de ventas del admin)
+            models.Index(fields=["customer", "-sale_date", "-id"], name="sale_customer_recent_idx"),
+            models.Index(fields=["product", "-sale_date", "-id"], name="sale_product_recent_idx"),
+        ]
+
+
+class SaleIngestion(models.Model):
+    """
+    Registro de cada lote de ventas ingerido en bloque.
+
+    Guarda la clave de idempotencia enviada por el cliente junto con el
+    resultado, de forma que un reintento del mismo lote devuelve la respuesta
+    original sin volver a contabilizar las ventas.
+    """
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.idempotency_key
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class BufferedSaleOutcome(models.Model):
+    """
+    Resultado del volcado de cada venta diferida (``sales.buffer``), por
+    ticket: la venta creada o los errores por los que se rechazó. El cliente
+    consulta aquí un ticket que ya no está pendiente.
+    """
+    ticket = models.CharField(max_length=32, primary_key=True)
+    sale = models.ForeignKey(Sale, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    errors = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def rejected(self):
+        return self.errors is not None
+
+    def __str__(self):
+        return self.ticket
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class StockShard(models.Model):
+    """
+    Porción del stock disponible de un producto.
+
+    El stock de cada producto se reparte entre varios shards; cada venta
+    descuenta de uno solo con un UPDATE condicional, de modo que las ventas
+    concurrentes de un mismo producto no compiten por la misma fila.
+    ``Product.in_stock`` guarda el total consolidado en la última compactación.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_shards")
+    index = models.PositiveSmallIntegerField()
+    available = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product_id}#{self.index}: {self.available}"
+
+    class Meta:
+        ordering = ["product", "index"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "index"], name="unique_stock_shard"),
+        ]
+
+
+class InventoryMovement(models.Model):
+    """Ledger de movimientos de inventario (sólo inserciones)."""
+    KIND_SALE = "sale"
+    KIND_RESTOCK = "restock"
+    KIND_ADJUSTMENT = "adjustment"
+    KIND_CHOICES = (
+        (KIND_SALE, "Venta"),
+        (KIND_RESTOCK, "Reabastecimiento"),
+        (KIND_ADJUSTMENT, "Ajuste manual"),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Positivo: entrada de stock; negativo: salida
+    quantity = models.IntegerField()
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name="movements")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} ({self.product_id})"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class ChangeLog(models.Model):
+    """
+    Registro de cambios (outbox transaccional) de ventas, productos y clientes.
+
+    Se escribe en la misma transacción que el cambio y ``seq`` es creciente,
+    así que un consumidor puede procesar sólo lo nuevo desde su último offset
+    (``sales.changelog``) en lugar de volver a recorrer las tablas.
+    """
+    ENTITY_SALE = "sale"
+    ENTITY_PRODUCT = "product"
+    ENTITY_CUSTOMER = "customer"
+    ENTITY_CHOICES = (
+        (ENTITY_SALE, "Venta"),
+        (ENTITY_PRODUCT, "Producto"),
+        (ENTITY_CUSTOMER, "Cliente"),
+    )
+    ACTION_CREATE = "create"
+    ACTION_UPDATE = "update"
+    ACTION_DELETE = "delete"
+    ACTION_CHOICES = (
+        (ACTION_CREATE, "Alta"),
+        (ACTION_UPDATE, "Modificación"),
+        (ACTION_DELETE, "Baja"),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Valores del objeto tras el cambio (antes del borrado en las bajas)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.entity}:{self.object_id} {self.action}"
+
+    class Meta:
+        ordering = ["seq"]
+        indexes = [
+            models.Index(fields=["entity", "seq"], name="changelog_entity_seq"),
+        ]
+
+
+class ChangeLogConsumer(models.Model):
+    """Offset (último ``seq`` procesado) de cada consumidor del ChangeLog."""
+    name = models.CharField(max_length=100, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.offset}"
+
+    class Meta:
+        ordering = ["name"]
+
+
+class _EntityStats(models.Model):
+    """Campos comunes de las estadísticas precalculadas de ventas."""
+    sales_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    average = models.GeneratedField(
+        expression=models.Case(
+            models.When(sales_count=0, then=models.Value(Decimal("0"))),
+            # * 1.0: en SQLite revenue se guarda como entero si no tiene
+            # decimales y la división sería entera (40 / 3 = 13)
+            default=models.ExpressionWrapper(
+                models.F("revenue") * models.Value(1.0) / models.F("sales_count"),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        ),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=True,
+    )
+    first_purchase = models.DateTimeField(null=True, blank=True)
+    last_purchase = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class CustomerStats(_EntityStats):
+    """Totales de compras de cada cliente, mantenidos por ``sales.stats``."""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+
+    def __str__(self):
+        return f"Estadísticas de {self.customer_id}"
+
+
+class ProductStats(_EntityStats):
+    """Totales de ventas de cada producto, mantenidos por ``sales.stats``."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+
+    def __str__(self):
+        return f"Estadísticas de {self.product_id}"
+
+
+class CalendarDay(models.Model):
+    """
+    Días con registros de un campo de fecha (``source``: "app.Modelo.campo") y
+    cuántos hay en cada uno. Lo mantiene ``sales.calendar_days`` y sirve la
+    navegación por fechas (``date_hierarchy``) del admin sin DISTINCT sobre la tabla.
+    """
+    source = models.CharField(max_length=100)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source} {self.day}: {self.count}"
+
+    class Meta:
+        ordering = ["source", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["source", "day"], name="unique_calendar_source_day"),
+        ]
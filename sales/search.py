@@ -0,0 +1,103 @@
+# sales/search.py
+"""
+Búsqueda por prefijo de nombres sobre una columna normalizada e indexada.
+
+``NormalizedNameField`` guarda el nombre en minúsculas y sin acentos
+("Ávila Pérez" -> "avila perez"); se calcula en Python al guardar (también en
+``bulk_create``), porque ``LOWER()`` de SQLite sólo convierte ASCII.
+
+``prefix_filter`` construye la condición de prefijo de forma que use el índice:
+en PostgreSQL ``LIKE 'x%'`` usa el índice ``varchar_pattern_ops`` que Django
+crea para los ``CharField`` con ``db_index``; en el resto de motores se añade
+el rango equivalente (``>= 'x' AND < 'y'``).
+
+Para valores repetidos y pocos distintos (categorías) ``PrefixIndex`` guarda
+en memoria la lista ordenada de valores normalizados y busca con ``bisect``.
+"""
+import bisect
+import threading
+import unicodedata
+
+from django.db import connection, models
+from django.db.models import Q
+
+
+def normalize_name(value):
+    """Minúsculas (casefold) y sin marcas diacríticas."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
+
+
+class NormalizedNameField(models.CharField):
+    """Copia normalizada de otro campo de texto del modelo (``source``)."""
+
+    def __init__(self, *args, source='name', **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = normalize_name(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def prefix_filter(field, term):
+    """``Q`` de los registros cuyo ``field`` (normalizado) empieza por ``term``."""
+    prefix = normalize_name(term)
+    condition = Q(**{f'{field}__startswith': prefix})
+    if prefix and connection.vendor != 'postgresql':
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        condition &= Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+    return condition
+
+
+class PrefixIndex:
+    """Valores ordenados por su forma normalizada, con búsqueda por prefijo."""
+
+    def __init__(self, values):
+        entries = sorted({(normalize_name(value), value) for value in values if value})
+        self.keys = [key for key, _value in entries]
+        self.values = [value for _key, value in entries]
+
+    def search(self, term, limit=10):
+        prefix = normalize_name(term)
+        start = bisect.bisect_left(self.keys, prefix)
+        matches = []
+        for key, value in zip(self.keys[start:start + limit], self.values[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            matches.append(value)
+        return matches
+
+
+_category_index = (None, None)
+_category_lock = threading.Lock()
+
+
+def category_index():
+    """
+    ``PrefixIndex`` de las categorías de producto, en memoria del proceso.
+
+    Se reconstruye cuando el ``ChangeLog`` tiene cambios de productos posteriores
+    a la última construcción.
+    """
+    global _category_index
+    from .changelog import latest_seq
+    from .models import ChangeLog, Product
+
+    seq = latest_seq([ChangeLog.ENTITY_PRODUCT])
+    built_seq, index = _category_index
+    if built_seq != seq:
+        with _category_lock:
+            built_seq, index = _category_index
+            if built_seq != seq:
+                index = PrefixIndex(Product.objects.values_list('category', flat=True).distinct())
+                _category_index = (seq, index)
+    return index
@@ -0,0 +1,229 @@
+# sales/services.py
+"""
+Servicios de escritura de ventas en bloque.
+
+``ingest_sales`` es la alternativa a ``Sale.save`` para lotes grandes (por
+ejemplo, las subidas de los TPV): valida el stock agregado por producto,
+reserva el stock con una única operación de inventario por producto e inserta
+las ventas con ``bulk_create``, todo en una sola transacción.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import changelog, inventory
+from .models import ChangeLog, Customer, InventoryMovement, Product, Sale, SaleIngestion
+from .signals import sales_bulk_created
+
+BULK_BATCH_SIZE = 1000
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _validate_rows(rows):
+    """Valida la forma de cada fila. Devuelve (filas_válidas, errores)."""
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        row_errors = {}
+        if not isinstance(row, dict):
+            errors.append({'index': index, 'errors': {'non_field_errors': 'Formato de fila no válido.'}})
+            continue
+
+        customer_id = _to_int(row.get('customer'))
+        product_id = _to_int(row.get('product'))
+        quantity = _to_int(row.get('quantity'))
+
+        if customer_id is None:
+            row_errors['customer'] = 'Cliente obligatorio (ID numérico).'
+        if product_id is None:
+            row_errors['product'] = 'Producto obligatorio (ID numérico).'
+        if quantity is None or quantity < 1:
+            row_errors['quantity'] = 'La cantidad debe ser un entero mayor o igual que 1.'
+
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            valid.append((index, customer_id, product_id, quantity))
+    return valid, errors
+
+
+def _parse_sale_dates(rows, valid_rows, errors):
+    """
+    Fechas ``sale_date`` (ISO 8601) de las filas que la traen, por índice. Las
+    filas con una fecha no válida pasan a ``errors``. Devuelve (filas_válidas, fechas).
+    """
+    dates = {}
+    valid = []
+    for row in valid_rows:
+        value = rows[row[0]].get('sale_date')
+        if value is None:
+            valid.append(row)
+            continue
+        try:
+            sale_date = parse_datetime(value)
+        except (TypeError, ValueError):
+            sale_date = None
+        if sale_date is None:
+            errors.append({'index': row[0], 'errors': {'sale_date': 'Fecha no válida (ISO 8601).'}})
+            continue
+        if timezone.is_naive(sale_date):
+            sale_date = timezone.make_aware(sale_date)
+        dates[row[0]] = sale_date
+        valid.append(row)
+    return valid, dates
+
+
+def _reserve_product_rows(product_id, rows, available, errors):
+    """
+    Acepta las filas de un producto en orden mientras quede stock y reserva la
+    cantidad agregada de una vez. Si otra escritura concurrente consumió stock
+    entre la lectura y la reserva, se recalcula con el disponible actualizado.
+    Devuelve las filas aceptadas.
+    """
+    for _ in range(inventory.SLOW_PATH_ATTEMPTS):
+        accepted, rejected, remaining = [], [], available
+        for row in rows:
+            quantity = row[3]
+            if quantity > remaining:
+                rejected.append(row)
+            else:
+                remaining -= quantity
+                accepted.append(row)
+
+        total = sum(row[3] for row in accepted)
+        try:
+            if total:
+                with transaction.atomic():
+                    inventory.reserve(product_id, total)
+        except ValidationError:
+            available = inventory.available_stock(product_id)
+            continue
+
+        for row in rejected:
+            errors.append({'index': row[0], 'errors': {'quantity': inventory.INSUFFICIENT_STOCK}})
+        return accepted
+
+    for row in rows:
+        errors.append({'index': row[0], 'errors': {'quantity': inventory.INSUFFICIENT_STOCK}})
+    return []
+
+
+def _apply_batch(valid_rows, errors, dates=None):
+    """
+    Reserva stock e inserta las ventas dentro de la transacción actual (con la
+    fecha de ``dates`` si la tienen). Devuelve la lista de ventas creadas.
+    """
+    dates = dates or {}
+    product_ids = {product_id for _, _, product_id, _ in valid_rows}
+    customer_ids = {customer_id for _, customer_id, _, _ in valid_rows}
+
+    existing_customers = set(
+        Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True)
+    )
+    prices = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'price'))
+    available = inventory.available_stock_map(prices.keys())
+
+    rows_by_product = defaultdict(list)
+    for row in valid_rows:
+        index, customer_id, product_id, _ = row
+        if customer_id not in existing_customers:
+            errors.append({'index': index, 'errors': {'customer': 'El cliente no existe.'}})
+        elif product_id not in prices:
+            errors.append({'index': index, 'errors': {'product': 'El producto no existe.'}})
+        else:
+            rows_by_product[product_id].append(row)
+
+    to_create = []
+    movements = []
+    # Una única reserva de inventario por producto con la cantidad agregada del lote
+    for product_id, rows in rows_by_product.items():
+        accepted = _reserve_product_rows(product_id, rows, available[product_id], errors)
+        if not accepted:
+            continue
+        movements.append(InventoryMovement(
+            product_id=product_id,
+            kind=InventoryMovement.KIND_SALE,
+            quantity=-sum(row[3] for row in accepted),
+        ))
+        for index, customer_id, _, quantity in accepted:
+            sale = Sale(
+                customer_id=customer_id,
+                product_id=product_id,
+                quantity=quantity,
+                total_price=Sale.line_total(prices[product_id], quantity),
+            )
+            if index in dates:
+                sale.sale_date = dates[index]
+            to_create.append((index, sale))
+
+    # Mantenemos el orden original de las filas en las ventas creadas
+    to_create.sort(key=lambda item: item[0])
+    InventoryMovement.objects.bulk_create(movements)
+    created = Sale.objects.bulk_create([sale for _, sale in to_create], batch_size=BULK_BATCH_SIZE)
+    # bulk_create no emite post_save: anotamos las altas explícitamente
+    changelog.record_many(created, ChangeLog.ACTION_CREATE)
+    if created:
+        sales_bulk_created.send(sender=Sale, queryset=Sale.objects.filter(pk__in=[sale.pk for sale in created]))
+    return created
+
+
+def ingest_sales(rows, idempotency_key=None, keep_dates=False):
+    """
+    Inserta en bloque una lista de ventas ``{'customer', 'product', 'quantity'}``.
+
+    Las filas inválidas o sin stock se reportan en ``errors`` (con su índice en
+    el lote) y no impiden insertar el resto. Si se indica ``idempotency_key`` y
+    ese lote ya se procesó, se devuelve el resultado original con
+    ``replayed=True`` sin tocar ventas ni stock.
+
+    Con ``keep_dates`` (sólo para llamadas internas de confianza, como el
+    volcado del journal) las filas pueden traer ``sale_date`` en ISO 8601; sin
+    ella la venta toma la hora de inserción.
+    """
+    if idempotency_key:
+        previous = SaleIngestion.objects.filter(idempotency_key=idempotency_key).first()
+        if previous is not None:
+            return {**previous.result, 'replayed': True}
+
+    valid_rows, errors = _validate_rows(rows)
+    dates = {}
+    if keep_dates:
+        valid_rows, dates = _parse_sale_dates(rows, valid_rows, errors)
+
+    try:
+        with transaction.atomic():
+            created = _apply_batch(valid_rows, errors, dates) if valid_rows else []
+            errors.sort(key=lambda error: error['index'])
+            result = {
+                'created': len(created),
+                'sale_ids': [sale.pk for sale in created],
+                'errors': errors,
+            }
+            if idempotency_key:
+                SaleIngestion.objects.create(
+                    idempotency_key=idempotency_key,
+                    created_count=len(created),
+                    error_count=len(errors),
+                    result=result,
+                )
+    except IntegrityError as exc:
+        if not idempotency_key:
+            raise
+        # Otro reintento concurrente con la misma clave ganó la carrera...
+        try:
+            previous = SaleIngestion.objects.get(idempotency_key=idempotency_key)
+        except SaleIngestion.DoesNotExist:
+            # ...o el error es otro (p. ej. un cliente borrado a mitad de lote)
+            raise exc from None
+        return {**previous.result, 'replayed': True}
+
+    return {**result, 'replayed': False}
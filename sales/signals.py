@@ -0,0 +1,78 @@
+# sales/signals.py
+"""
+Anotación en ChangeLog de los cambios hechos a través de los modelos,
+mantenimiento de las estadísticas por cliente/producto y del calendario del
+admin, y señales
+``sales_bulk_created`` y ``product_prices_updated`` para las escrituras en
+bloque que no emiten post_save.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal
+
+from . import calendar_days, changelog, stats
+from .models import ChangeLog, Customer, Sale
+
+# Ventas insertadas sin Sale.save (ingest_sales, import_sales).
+# Argumentos: ``queryset`` con las ventas nuevas. Se envía dentro de la transacción.
+sales_bulk_created = Signal()
+
+# Productos con precio o coste cambiado con ``QuerySet.update()``, que no emite
+# post_save. Argumentos: ``queryset`` con los productos. Se envía dentro de la transacción.
+product_prices_updated = Signal()
+
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata: los fixtures no son cambios de negocio
+        return
+    changelog.record(instance, ChangeLog.ACTION_CREATE if created else ChangeLog.ACTION_UPDATE)
+
+
+def record_delete(sender, instance, **kwargs):
+    changelog.record(instance, ChangeLog.ACTION_DELETE)
+
+
+def remember_sale_owner(sender, instance, raw=False, **kwargs):
+    # Cliente/producto anteriores: si cambian, hay que recalcular ambos
+    instance._stats_previous = None
+    if instance.pk is not None and not raw:
+        instance._stats_previous = (
+            Sale.objects.filter(pk=instance.pk).values_list('customer_id', 'product_id').first()
+        )
+
+
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.record_sale(instance)
+        return
+    previous = getattr(instance, '_stats_previous', None) or (instance.customer_id, instance.product_id)
+    stats.refresh({instance.customer_id, previous[0]}, {instance.product_id, previous[1]})
+
+
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.refresh_on_commit([instance.customer_id], [instance.product_id])
+
+
+def update_stats_on_bulk(sender, queryset, **kwargs):
+    stats.refresh_for_sales(queryset)
+
+
+def update_calendar_on_bulk(sender, queryset, **kwargs):
+    calendar_days.add_queryset(queryset, 'sale_date')
+
+
+def connect():
+    for model in changelog.ENTITIES:
+        post_save.connect(record_save, sender=model, dispatch_uid=f'changelog_save_{model.__name__}')
+        post_delete.connect(record_delete, sender=model, dispatch_uid=f'changelog_delete_{model.__name__}')
+
+    pre_save.connect(remember_sale_owner, sender=Sale, dispatch_uid='stats_sale_owner')
+    post_save.connect(update_stats_on_save, sender=Sale, dispatch_uid='stats_sale_save')
+    post_delete.connect(update_stats_on_delete, sender=Sale, dispatch_uid='stats_sale_delete')
+    sales_bulk_created.connect(update_stats_on_bulk, sender=Sale, dispatch_uid='stats_sale_bulk')
+
+    calendar_days.track(Sale, 'sale_date')
+    calendar_days.track(Customer, 'created_at')
+    sales_bulk_created.connect(update_calendar_on_bulk, sender=Sale, dispatch_uid='calendar_sale_bulk')
@@ -0,0 +1,158 @@
+# sales/stats.py
+"""
+Estadísticas precalculadas por cliente y por producto.
+
+``CustomerStats`` / ``ProductStats`` guardan número de compras, unidades,
+facturación, media y fechas de primera y última compra. Se mantienen en cada
+escritura de ventas (``sales.signals``):
+
+- alta de una venta: un UPDATE incremental por cliente y por producto;
+- modificación, baja o inserción en bloque: se recalculan sólo los clientes y
+  productos afectados con un ``INSERT ... SELECT ... GROUP BY``. Las bajas se
+  acumulan y se recalculan una vez al confirmar la transacción
+  (``refresh_on_commit``).
+
+``rebuild`` (``manage.py rebuild_stats``) recalcula todas las filas con dos
+sentencias, sin cargar ventas en Python.
+"""
+import threading
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DateTimeField, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import CustomerStats, ProductStats, Sale
+
+# (modelo de estadísticas, campo de Sale que agrupa)
+TARGETS = (
+    (CustomerStats, 'customer'),
+    (ProductStats, 'product'),
+)
+
+STATS_COLUMNS = ('sales_count', 'quantity', 'revenue', 'first_purchase', 'last_purchase')
+
+
+def _rebuild(model, key, ids=None):
+    """Sustituye las estadísticas (de ``ids`` o de todos) por las calculadas desde las ventas."""
+    stats = model.objects.all()
+    sales = Sale.objects.all()
+    if ids is not None:
+        ids = list(set(ids))
+        if not ids:
+            return 0
+        stats = stats.filter(pk__in=ids)
+        sales = sales.filter(**{f'{key}_id__in': ids})
+
+    rows = (
+        sales.order_by()
+        .values(f'{key}_id')
+        .annotate(
+            stat_count=Count('pk'),
+            stat_quantity=Sum('quantity'),
+            stat_revenue=Sum('total_price'),
+            stat_first=Min('sale_date'),
+            stat_last=Max('sale_date'),
+        )
+    )
+    select_sql, params = rows.query.sql_with_params()
+
+    opts = model._meta
+    qn = connection.ops.quote_name
+    columns = ', '.join(
+        qn(opts.get_field(name).column) for name in (key, *STATS_COLUMNS)
+    )
+    with transaction.atomic():
+        stats.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {qn(opts.db_table)} ({columns}) {select_sql}", params)
+            return cursor.rowcount
+
+
+def _add_sale(model, object_id, sale):
+    """Suma una venta nueva a las estadísticas de un cliente o producto."""
+    sale_date = Value(sale.sale_date, output_field=DateTimeField())
+    updated = model.objects.filter(pk=object_id).update(
+        sales_count=F('sales_count') + 1,
+        quantity=F('quantity') + sale.quantity,
+        revenue=F('revenue') + sale.total_price,
+        first_purchase=Least(Coalesce(F('first_purchase'), sale_date), sale_date),
+        last_purchase=Greatest(Coalesce(F('last_purchase'), sale_date), sale_date),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                pk=object_id,
+                sales_count=1,
+                quantity=sale.quantity,
+                revenue=sale.total_price,
+                first_purchase=sale.sale_date,
+                last_purchase=sale.sale_date,
+            )
+    except IntegrityError:
+        # Otra venta creó la fila a la vez: recalculamos la de este objeto
+        _rebuild(model, model._meta.pk.name, [object_id])
+
+
+def record_sale(sale):
+    """Actualiza incrementalmente las estadísticas tras el alta de ``sale``."""
+    _add_sale(CustomerStats, sale.customer_id, sale)
+    _add_sale(ProductStats, sale.product_id, sale)
+
+
+def refresh(customer_ids=(), product_ids=()):
+    """Recalcula las estadísticas de los clientes y productos indicados."""
+    _rebuild(CustomerStats, 'customer', customer_ids)
+    _rebuild(ProductStats, 'product', product_ids)
+
+
+# Clientes y productos pendientes de recalcular, por hilo y conexión
+_pending = threading.local()
+
+
+def _pending_ids(using):
+    by_alias = getattr(_pending, 'by_alias', None)
+    if by_alias is None:
+        by_alias = _pending.by_alias = {}
+    return by_alias.setdefault(using, (set(), set()))
+
+
+def _refresh_pending(using):
+    customer_ids, product_ids = _pending_ids(using)
+    if not customer_ids and not product_ids:
+        # Ya lo recalculó otro callback de la misma transacción
+        return
+    customers, products = list(customer_ids), list(product_ids)
+    customer_ids.clear()
+    product_ids.clear()
+    refresh(customers, products)
+
+
+def refresh_on_commit(customer_ids=(), product_ids=(), using=None):
+    """
+    Como ``refresh``, pero al confirmar la transacción y una sola vez por
+    transacción: borrar N ventas (o un cliente con sus ventas en cascada) cuesta
+    dos ``GROUP BY``, no 2N. Fuera de una transacción se recalcula en el acto.
+
+    Cada llamada registra su callback (si la transacción o un savepoint se
+    revierten, Django descarta los suyos), pero sólo el primero que se ejecuta
+    recalcula; el resto encuentra los conjuntos vacíos. Los ids de una
+    transacción revertida se recalculan con la siguiente: sobra, pero no falla.
+    """
+    using = using or connection.alias
+    pending_customers, pending_products = _pending_ids(using)
+    pending_customers.update(customer_ids)
+    pending_products.update(product_ids)
+    transaction.on_commit(lambda: _refresh_pending(using), using=using)
+
+
+def refresh_for_sales(sales):
+    """Recalcula las estadísticas de los clientes y productos de un queryset de ventas."""
+    ids = list(sales.order_by().values_list('customer_id', 'product_id'))
+    refresh({customer_id for customer_id, _ in ids}, {product_id for _, product_id in ids})
+
+
+def rebuild():
+    """Recalcula todas las estadísticas. Devuelve ``(clientes, productos)``."""
+    return _rebuild(CustomerStats, 'customer'), _rebuild(ProductStats, 'product')
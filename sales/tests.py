@@ -1,3 +1,582 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+
+from rest_framework.test import APIClient
+
+from users.models import RevUser
+from . import calendar_days, changelog, inventory, stats
+from .buffer import SaleWriteBuffer
+from .models import CalendarDay, ChangeLog, Customer, CustomerStats, InventoryMovement, ProductStats, Product, Sale, SaleIngestion, StockShard
+from .services import ingest_sales
+
+
+class BulkSaleIngestionTests(TestCase):
+    """Ingesta en bloque con validación agregada de stock e idempotencia."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente TPV", email="tpv@test.com")
+        self.product = Product.objects.create(name="Producto TPV", price=Decimal("2.50"), in_stock=10)
+
+    def row(self, quantity, **overrides):
+        return {'customer': self.customer.pk, 'product': self.product.pk, 'quantity': quantity, **overrides}
+
+    def test_stock_is_validated_in_aggregate(self):
+        result = ingest_sales([self.row(4), self.row(5), self.row(3), self.row(1)])
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual([error['index'] for error in result['errors']], [2])
+        self.assertEqual(inventory.available_stock(self.product.pk), 0)
+        self.assertEqual(Sale.objects.filter(product=self.product).count(), 3)
+        self.assertEqual(
+            Sale.objects.get(pk=result['sale_ids'][0]).total_price,
+            Decimal("10.00"),
+        )
+
+    def test_invalid_rows_are_reported_per_row(self):
+        result = ingest_sales([self.row(0), self.row(1, customer=999999), {'foo': 'bar'}, self.row(2)])
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['index'] for error in result['errors']], [0, 1, 2])
+
+    def test_idempotency_key_prevents_double_counting(self):
+        first = ingest_sales([self.row(2)], idempotency_key="lote-1")
+        second = ingest_sales([self.row(2)], idempotency_key="lote-1")
+
+        self.assertFalse(first['replayed'])
+        self.assertTrue(second['replayed'])
+        self.assertEqual(first['sale_ids'], second['sale_ids'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(SaleIngestion.objects.count(), 1)
+        self.assertEqual(inventory.available_stock(self.product.pk), 8)
+
+    def test_other_integrity_errors_are_not_taken_for_a_replay(self):
+        error = IntegrityError("FOREIGN KEY constraint failed")
+        with mock.patch("sales.services._apply_batch", side_effect=error):
+            with self.assertRaises(IntegrityError):
+                ingest_sales([self.row(1)], idempotency_key="lote-roto")
+        self.assertFalse(SaleIngestion.objects.exists())
+
+    def test_bulk_endpoint_requires_authentication_and_ingests(self):
+        client = APIClient()
+        url = reverse("analytics_api:bulk")
+        payload = {'sales': [self.row(1), self.row(1)]}
+
+        self.assertEqual(client.post(url, payload, format='json').status_code, 403)
+
+        user = RevUser.objects.create_user(username="tpv", password="secreto-123")
+        client.force_authenticate(user)
+        response = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY="lote-api")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+
+        retry = client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY="lote-api")
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class ImportSalesCommandTests(TestCase):
+    """Importación histórica con fechas originales y reanudación por checkpoint."""
+
+    CSV = (
+        "customer_email,customer_name,product_name,product_category,product_price,quantity,sale_date\n"
+        "ana@test.com,Ana,Teclado,Periféricos,20.00,2,2019-03-01T10:00:00+00:00\n"
+        "luis@test.com,Luis,Teclado,Periféricos,20.00,1,2019-03-02T11:30:00+00:00\n"
+        "ana@test.com,Ana,Ratón,Periféricos,8.50,3,2020-01-15\n"
+        "sin-email,,Ratón,Periféricos,8.50,x,2020-01-16\n"
+    )
+
+    def setUp(self):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        handle.write(self.CSV)
+        handle.close()
+        self.path = handle.name
+        self.addCleanup(os.unlink, self.path)
+
+    def run_import(self, *args):
+        call_command('import_sales', self.path, '--batch-size', '2', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_preserves_timestamps_and_upserts(self):
+        self.run_import()
+
+        self.assertEqual(Sale.objects.count(), 3)
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(Product.objects.count(), 2)
+        first = Sale.objects.order_by('sale_date').first()
+        self.assertEqual(first.sale_date, datetime(2019, 3, 1, 10, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(first.total_price, Decimal("40.00"))
+
+    def test_existing_customers_are_kept_and_new_entities_are_logged(self):
+        Customer.objects.create(name="Ana García", email="ana@test.com")
+        before = changelog.latest_seq()
+        self.run_import()
+
+        self.assertEqual(Customer.objects.get(email="ana@test.com").name, "Ana García")
+        logged = set(
+            ChangeLog.objects.filter(seq__gt=before)
+            .exclude(entity=ChangeLog.ENTITY_SALE)
+            .values_list('entity', 'action', 'payload__name')
+        )
+        self.assertEqual(logged, {
+            (ChangeLog.ENTITY_CUSTOMER, ChangeLog.ACTION_CREATE, "Luis"),
+            (ChangeLog.ENTITY_PRODUCT, ChangeLog.ACTION_CREATE, "Teclado"),
+            (ChangeLog.ENTITY_PRODUCT, ChangeLog.ACTION_CREATE, "Ratón"),
+        })
+
+    def test_resume_skips_committed_batches(self):
+        self.run_import()
+        self.run_import()
+        self.assertEqual(Sale.objects.count(), 3)
+
+        self.run_import('--restart')
+        self.assertEqual(Sale.objects.count(), 6)
+        self.assertEqual(Customer.objects.count(), 2)
+
+
+class InventoryLedgerTests(TestCase):
+    """Ledger de inventario y contadores de stock repartidos."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente Stock", email="stock@test.com")
+        self.product = Product.objects.create(name="Producto Stock", price=Decimal("1.00"), in_stock=5)
+
+    def test_sales_restock_and_adjustments_are_recorded(self):
+        sale = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=3)
+        sale.quantity = 1
+        sale.save()
+        inventory.restock(self.product.pk, 10)
+        inventory.set_stock(self.product.pk, 4)
+
+        self.assertEqual(inventory.available_stock(self.product.pk), 4)
+        movements = InventoryMovement.objects.filter(product=self.product)
+        self.assertEqual(
+            sorted(movements.values_list('kind', 'quantity')),
+            [('adjustment', -10), ('restock', 10), ('sale', -3), ('sale', 2)],
+        )
+        self.assertEqual(sum(movements.values_list('quantity', flat=True)), 4 - 5)
+
+        with self.assertRaises(ValidationError):
+            Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=5)
+
+    def test_compact_consolidates_shards(self):
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=2)
+        call_command('compact_stock', stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 3)
+        shards = list(StockShard.objects.filter(product=self.product).values_list('available', flat=True))
+        self.assertEqual(sum(shards), 3)
+        self.assertLessEqual(max(shards) - min(shards), 1)
+
+
+class SaleWriteBufferTests(TestCase):
+    """Escritura diferida con journal local y recuperación tras caída."""
+
+    def setUp(self):
+        self.journal = tempfile.TemporaryDirectory()
+        self.addCleanup(self.journal.cleanup)
+        self.customer = Customer.objects.create(name="Cliente Pico", email="pico@test.com")
+        self.product = Product.objects.create(name="Producto Pico", price=Decimal("3.00"), in_stock=5)
+
+    def make_buffer(self):
+        return SaleWriteBuffer(self.journal.name, flush_size=100, autostart=False)
+
+    def test_submit_reserves_in_memory_and_flushes_in_batch(self):
+        buffer = self.make_buffer()
+        buffer.submit(self.customer.pk, self.product.pk, 3)
+        buffer.submit(self.customer.pk, self.product.pk, 2)
+        with self.assertRaises(ValidationError):
+            buffer.submit(self.customer.pk, self.product.pk, 1)
+        self.assertEqual(Sale.objects.count(), 0)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(Sale.objects.filter(product=self.product).count(), 2)
+        self.assertEqual(inventory.available_stock(self.product.pk), 0)
+        self.assertEqual(os.listdir(self.journal.name), [])
+
+    def test_stock_is_reread_each_window_and_rejections_are_queryable(self):
+        buffer = self.make_buffer()
+        with self.assertRaises(ValidationError):
+            buffer.submit(self.customer.pk, self.product.pk, 10)  # deja leído el stock (5)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 3}])
+        buffer.flush()
+        with self.assertRaises(ValidationError):
+            buffer.submit(self.customer.pk, self.product.pk, 3)
+
+        accepted = buffer.submit(self.customer.pk, self.product.pk, 1)
+        rejected = buffer.submit(self.customer.pk, self.product.pk, 1)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}])
+        self.assertEqual(buffer.flush(), 1)
+
+        client = APIClient()
+        client.force_authenticate(RevUser.objects.create_user(username="tpv", password="secreto-123"))
+
+        def status(ticket):
+            return client.get(reverse("analytics_api:buffered_status", args=[ticket])).json()
+
+        self.assertEqual(status(accepted)["status"], "created")
+        self.assertEqual(status(rejected)["status"], "rejected")
+        self.assertIn("quantity", status(rejected)["errors"])
+        self.assertEqual(status("desconocido")["status"], "pending")
+
+    def test_orphan_journal_is_replayed_once(self):
+        segment = os.path.join(self.journal.name, "caido.jsonl")
+        with open(segment, "w") as handle:
+            handle.write('{"ticket": "t1", "customer": %d, "product": %d, "quantity": 2}\n'
+                         % (self.customer.pk, self.product.pk))
+            handle.write('{"ticket": "t2", "cust')  # escritura interrumpida por la caída
+
+        self.make_buffer()
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertFalse(os.path.exists(segment))
+
+        # Caída tras confirmar el lote pero antes de borrar el segmento: no se duplica
+        with open(segment, "w") as handle:
+            handle.write('{"ticket": "t1", "customer": %d, "product": %d, "quantity": 2}\n'
+                         % (self.customer.pk, self.product.pk))
+        call_command('replay_sale_journal', '--journal-dir', self.journal.name, stdout=StringIO())
+        self.assertEqual(Sale.objects.count(), 1)
+
+
+    def test_replayed_sale_keeps_acknowledgement_date(self):
+        acknowledged = timezone.now() - timedelta(days=1)
+        segment = os.path.join(self.journal.name, "ayer.jsonl")
+        with open(segment, "w") as handle:
+            handle.write(json.dumps({
+                "ticket": "t1", "customer": self.customer.pk, "product": self.product.pk,
+                "quantity": 1, "at": acknowledged.isoformat(),
+            }) + "\n")
+
+        self.make_buffer()
+        sale = Sale.objects.get()
+        self.assertEqual(sale.sale_date, acknowledged)
+        self.assertEqual(CustomerStats.objects.get(pk=self.customer.pk).last_purchase, acknowledged)
+
+
+class ChangeLogTests(TestCase):
+    """Registro de cambios transaccional y consumo incremental por offset."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente Log", email="log@test.com")
+        self.product = Product.objects.create(name="Producto Log", price=Decimal("2.00"), in_stock=50)
+        changelog._gaps_seen.clear()
+
+    def test_model_and_bulk_changes_are_logged_in_order(self):
+        sale = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        sale.quantity = 2
+        sale.save()
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}])
+        sale.delete()
+
+        entries = list(ChangeLog.objects.values_list('entity', 'action'))
+        self.assertEqual(entries, [
+            ('customer', 'create'), ('product', 'create'),
+            ('sale', 'create'), ('sale', 'update'), ('sale', 'create'), ('sale', 'delete'),
+        ])
+        update = ChangeLog.objects.get(entity='sale', action='update')
+        self.assertEqual(update.payload['quantity'], 2)
+        self.assertEqual(update.payload['total_price'], "4.00")
+
+    def test_consumer_reads_batches_from_stored_offset(self):
+        for _ in range(3):
+            Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+
+        first = changelog.consume('cache', limit=2, entities=['sale'])
+        second = changelog.consume('cache', limit=10, entities=['sale'])
+        self.assertEqual(len(first), 0)
+        self.assertEqual(len(second), 3)
+        self.assertEqual(changelog.consume('cache'), [])
+        self.assertEqual(changelog.get_offset('cache'), ChangeLog.objects.last().seq)
+
+        out = StringIO()
+        call_command('consume_changes', 'export', '--entity', 'sale', stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+    def test_reader_stops_at_recent_gap(self):
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        last = ChangeLog.objects.last()
+        # Simula una transacción aún en vuelo con el seq siguiente
+        ChangeLog.objects.create(seq=last.seq + 2, entity='sale', object_id=1, action='update')
+
+        changes, offset = changelog.read_changes(0)
+        self.assertEqual(offset, last.seq)
+        with self.settings(CHANGELOG_GAP_GRACE=-1):
+            changes, offset = changelog.read_changes(0)
+        self.assertEqual(offset, last.seq + 2)
+
+    def test_gap_age_counts_from_first_sight_not_from_next_row(self):
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        last = ChangeLog.objects.last()
+        # Un escritor lento retiene last.seq + 1 mientras la fila siguiente ya es antigua
+        ChangeLog.objects.create(seq=last.seq + 2, entity='sale', object_id=1, action='update')
+        ChangeLog.objects.filter(seq=last.seq + 2).update(created_at=timezone.now() - timedelta(minutes=10))
+
+        with self.settings(CHANGELOG_GAP_GRACE=5):
+            self.assertEqual(changelog.read_changes(0)[1], last.seq)
+            self.assertEqual(changelog.stable_offset(), last.seq)
+
+            # El escritor confirma: el cambio retenido no se ha perdido
+            ChangeLog.objects.create(seq=last.seq + 1, entity='sale', object_id=2, action='update')
+            changes, offset = changelog.read_changes(last.seq)
+        self.assertEqual([change['seq'] for change in changes], [last.seq + 1, last.seq + 2])
+        self.assertEqual(offset, last.seq + 2)
+
+
+class EntityStatsTests(TestCase):
+    """Estadísticas precalculadas por cliente y producto."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente Stats", email="stats@test.com")
+        self.other = Customer.objects.create(name="Otro Stats", email="otro-stats@test.com")
+        self.product = Product.objects.create(name="Producto Stats", price=Decimal("10.00"), in_stock=100)
+
+    def snapshot(self):
+        fields = ('sales_count', 'quantity', 'revenue', 'average', 'first_purchase', 'last_purchase')
+        return (
+            list(CustomerStats.objects.order_by('pk').values_list('pk', *fields)),
+            list(ProductStats.objects.order_by('pk').values_list('pk', *fields)),
+        )
+
+    def test_incremental_maintenance_matches_rebuild(self):
+        first = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        second = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=3)
+        ingest_sales([{'customer': self.other.pk, 'product': self.product.pk, 'quantity': 2}])
+        second.customer = self.other
+        second.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+
+        incremental = self.snapshot()
+        stats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+        product_stats = ProductStats.objects.get(pk=self.product.pk)
+        self.assertEqual((product_stats.sales_count, product_stats.quantity), (2, 5))
+        self.assertEqual(product_stats.average, Decimal("25.00"))
+        self.assertFalse(CustomerStats.objects.filter(pk=self.customer.pk).exists())
+
+    def test_average_keeps_decimals(self):
+        ingest_sales([
+            {'customer': self.customer.pk, 'product': self.product.pk, 'quantity': quantity}
+            for quantity in (1, 1, 2)
+        ])
+        # 40.00 / 3: en SQLite sería división entera sin el * 1.0 de la columna
+        self.assertEqual(CustomerStats.objects.get(pk=self.customer.pk).average, Decimal("13.33"))
+        stats.rebuild()
+        self.assertEqual(ProductStats.objects.get(pk=self.product.pk).average, Decimal("13.33"))
+
+    def test_deletes_refresh_once_per_transaction(self):
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}] * 3)
+        ingest_sales([{'customer': self.other.pk, 'product': self.product.pk, 'quantity': 2}] * 2)
+
+        with mock.patch.object(stats, "refresh", wraps=stats.refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for sale in Sale.objects.filter(customer=self.customer):
+                        sale.delete()
+        self.assertEqual(refresh.call_count, 1)
+
+        self.assertFalse(CustomerStats.objects.filter(pk=self.customer.pk).exists())
+        product_stats = ProductStats.objects.get(pk=self.product.pk)
+        self.assertEqual((product_stats.sales_count, product_stats.quantity), (2, 4))
+
+    def test_admin_changelist_queries_do_not_grow_with_rows(self):
+        admin_user = RevUser.objects.create_superuser(username="admin-stats", password="secreto-123")
+        self.client.force_login(admin_user)
+        url = reverse("admin:sales_customer_changelist")
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        baseline = count_queries()
+        for index in range(10):
+            customer = Customer.objects.create(name=f"Cliente {index}", email=f"c{index}@test.com")
+            Sale.objects.create(customer=customer, product_id=self.product.pk, quantity=1)
+        self.assertEqual(count_queries(), baseline)
+
+
+class CalendarDayTests(TestCase):
+    """Calendario de la navegación por fechas del admin."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cliente Calendario", email="calendario@test.com")
+        self.product = Product.objects.create(name="Producto Calendario", price=Decimal("4.00"), in_stock=100)
+
+    def snapshot(self):
+        return list(CalendarDay.objects.order_by('source', 'day').values_list('source', 'day', 'count'))
+
+    def test_incremental_maintenance_matches_rebuild(self):
+        first = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=2)
+        first.delete()
+        first = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}])
+        first.delete()
+        old = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        Sale.objects.filter(pk=old.pk).update(sale_date=datetime(2020, 3, 14, 12, tzinfo=dt_timezone.utc))
+        calendar_days.rebuild(Sale, 'sale_date')
+        old.refresh_from_db()
+        old.delete()
+
+        incremental = self.snapshot()
+        for model, field in calendar_days.TRACKED.items():
+            calendar_days.rebuild(model, field)
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(
+            CalendarDay.objects.get(source='sales.Sale.sale_date').count,
+            Sale.objects.count(),
+        )
+
+    def test_admin_date_hierarchy_reads_the_calendar(self):
+        admin_user = RevUser.objects.create_superuser(username="admin-calendario", password="secreto-123")
+        self.client.force_login(admin_user)
+        Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+        today = timezone.localdate()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:sales_sale_changelist"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [choice['title'] for choice in response.context['calendar_hierarchy']['choices']],
+            [capfirst(formats.date_format(today, 'MONTH_DAY_FORMAT'))],
+        )
+        self.assertFalse([q for q in queries if 'sale_date' in q['sql'] and ('DISTINCT' in q['sql'] or 'MIN(' in q['sql'])])
+
+        # Con un filtro activo se usa la navegación de Django sobre el listado filtrado
+        response = self.client.get(reverse("admin:sales_sale_changelist"), {'customer__id__exact': self.customer.pk})
+        self.assertNotIn('calendar_hierarchy', response.context)
+
+
+class AdminAutocompleteFilterTests(TestCase):
+    """Filtros y campos de cliente/producto por autocompletado con búsqueda por prefijo."""
+
+    def setUp(self):
+        self.client.force_login(RevUser.objects.create_superuser(username="admin-filtros", password="secreto-123"))
+        self.customer = Customer.objects.create(name="Ávila Pérez", email="avila@test.com")
+        self.product = Product.objects.create(name="Tornillo", price=Decimal("1.00"), category="Ferretería", in_stock=50)
+        Customer.objects.bulk_create(
+            Customer(name=f"Sin compras {index}", email=f"sin-compras{index}@test.com") for index in range(30)
+        )
+        self.sale = Sale.objects.create(customer=self.customer, product_id=self.product.pk, quantity=1)
+
+    def autocomplete(self, field_name, term):
+        response = self.client.get(reverse("admin:autocomplete"), {
+            'app_label': 'sales', 'model_name': 'sale', 'field_name': field_name, 'term': term,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [result['text'] for result in response.json()['results']]
+
+    def test_autocomplete_matches_normalized_prefix(self):
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).name_normalized, "avila perez")
+        self.assertEqual(self.autocomplete('customer', "ÁVI"), ["Ávila Pérez"])
+        self.assertEqual(self.autocomplete('customer', "perez"), [])
+        self.assertEqual(self.autocomplete('product', "torn"), ["Tornillo"])
+
+    def test_sale_changelist_does_not_list_every_customer(self):
+        url = reverse("admin:sales_sale_changelist")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Sin compras 7")
+        self.assertContains(response, 'data-filter-parameter="customer__id__exact"')
+
+        response = self.client.get(url, {'customer__id__exact': self.customer.pk, 'product__category__istartswith': 'ferr'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.sale])
+        # El filtro sólo incluye el cliente seleccionado como opción del select
+        self.assertContains(response, f'<option value="{self.customer.pk}" selected>Ávila Pérez</option>', html=True)
+
+        response = self.client.get(reverse("admin:sales_sale_change", args=[self.sale.pk]))
+        self.assertNotContains(response, "Sin compras 7")
+
+
+class LazySalesPanelTests(TestCase):
+    """Ventas paginadas y cargadas bajo demanda en los formularios de cliente y producto."""
+
+    def setUp(self):
+        self.client.force_login(RevUser.objects.create_superuser(username="admin-panel", password="secreto-123"))
+        self.customer = Customer.objects.create(name="Cliente Mayorista", email="mayorista@test.com")
+        self.product = Product.objects.create(name="Palé", price=Decimal("3.00"), in_stock=100)
+        ingest_sales([{'customer': self.customer.pk, 'product': self.product.pk, 'quantity': 1}] * 30)
+
+    def test_change_form_renders_first_page_only(self):
+        response = self.client.get(reverse("admin:sales_customer_change", args=[self.customer.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/change/">', count=25)
+        self.assertContains(response, 'data-sales-sentinel')
+
+    def test_next_pages_are_fetched_by_cursor(self):
+        for name, obj in (("admin:sales_customer_sales", self.customer), ("admin:sales_product_sales", self.product)):
+            url = reverse(name, args=[obj.pk])
+            first = self.client.get(url).json()
+            second = self.client.get(url, {'after': first['next']}).json()
+
+            self.assertIsNotNone(first['next'])
+            self.assertIsNone(second['next'])
+            self.assertEqual(first['html'].count('<tr>') + second['html'].count('<tr>'), 30)
+
+        self.assertEqual(self.client.get(url, {'after': 'no-es-un-cursor'}).status_code, 400)
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    """Ventas concurrentes del mismo producto: nunca se vende más de lo disponible."""
+
+    STOCK = 20
+    THREADS = 8
+    SALES_PER_THREAD = 5
+
+    def test_concurrent_sales_never_oversell(self):
+        customer = Customer.objects.create(name="Cliente Carrera", email="carrera@test.com")
+        product = Product.objects.create(name="Producto Carrera", price=Decimal("1.00"), in_stock=self.STOCK)
+        results = {'sold': 0, 'rejected': 0}
+        lock = threading.Lock()
+
+        def buyer():
+            try:
+                for _ in range(self.SALES_PER_THREAD):
+                    # SQLite serializa las escrituras: reintentamos si la BD está bloqueada
+                    for _ in range(50):
+                        try:
+                            Sale.objects.create(customer_id=customer.pk, product_id=product.pk, quantity=1)
+                            outcome = 'sold'
+                        except ValidationError:
+                            outcome = 'rejected'
+                        except OperationalError:
+                            continue
+                        with lock:
+                            results[outcome] += 1
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results['sold'], self.STOCK)
+        self.assertEqual(Sale.objects.filter(product=product).count(), self.STOCK)
+        self.assertEqual(inventory.available_stock(product.pk), 0)
+        self.assertFalse(StockShard.objects.filter(product=product, available__lt=0).exists())
+        self.assertEqual(
+            sum(InventoryMovement.objects.filter(product=product).values_list('quantity', flat=True)),
+            -self.STOCK,
+        )
@@ -0,0 +1,29 @@
+'use strict';
+// Filtros del admin con control de entrada (revintel/admin_filters.py):
+// al elegir un valor se recarga el listado con el parámetro del filtro.
+{
+    const $ = django.jQuery;
+
+    function applyFilter(control) {
+        const base = control.closest('[data-filter-url]').dataset.filterUrl;
+        const url = new URL(base, window.location.href);
+        const value = (control.value || '').trim();
+        if (value) {
+            url.searchParams.set(control.dataset.filterParameter, value);
+        } else {
+            url.searchParams.delete(control.dataset.filterParameter);
+        }
+        window.location.assign(url);
+    }
+
+    // select2 lanza "change" con jQuery: hay que escucharlo con jQuery
+    $(document).on('change', 'select[data-filter-parameter]', function() {
+        applyFilter(this);
+    });
+    $(document).on('keydown', 'input[data-filter-parameter]', function(event) {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            applyFilter(this);
+        }
+    });
+}
@@ -0,0 +1,55 @@
+'use strict';
+// Panel de ventas del admin (LazySalesMixin en sales/admin.py): pide la página
+// siguiente cuando el final de la tabla entra en pantalla.
+{
+    function setupPanel(panel) {
+        const body = panel.querySelector('tbody');
+        const sentinel = panel.querySelector('[data-sales-sentinel]');
+        let next = panel.dataset.next;
+        let loading = false;
+        if (!sentinel || !next) {
+            return;
+        }
+
+        const observer = new IntersectionObserver(async (entries) => {
+            if (loading || !next || !entries.some((entry) => entry.isIntersecting)) {
+                return;
+            }
+            loading = true;
+            try {
+                const url = new URL(panel.dataset.url, window.location.href);
+                url.searchParams.set('after', next);
+                const response = await fetch(url, {headers: {'Accept': 'application/json'}});
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                const data = await response.json();
+                body.insertAdjacentHTML('beforeend', data.html);
+                next = data.next;
+            } catch (error) {
+                console.error('Error cargando ventas:', error);
+                sentinel.textContent = 'No se pudieron cargar más ventas.';
+                next = null;
+            } finally {
+                loading = false;
+            }
+
+            if (!next) {
+                observer.disconnect();
+                if (sentinel.textContent.startsWith('Cargando')) {
+                    sentinel.remove();
+                }
+            } else {
+                // Si el final sigue visible no habrá un nuevo evento: volvemos a observar
+                observer.unobserve(sentinel);
+                observer.observe(sentinel);
+            }
+        }, {root: panel.querySelector('.sales-panel-scroll')});
+
+        observer.observe(sentinel);
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-sales-panel]').forEach(setupPanel);
+    });
+}
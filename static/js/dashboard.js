@@ -27,42 +27,35 @@ const chartColors = [
 
 // ============ API CALLS ============
 
-async function fetchKPIs() {
-    const query = buildQueryString(currentFilters);
-    const res = await fetch(`${API_BASE}/kpis/${query}`);
-    return res.json();
-}
+// Respuestas por URL con su ETag: se revalidan con If-None-Match y un 304
+// reutiliza los datos ya descargados
+const responseCache = new Map();
+// Petición en curso de cada panel: una nueva la cancela
+const inFlight = {};
 
-async function fetchSalesByPeriod(groupBy = 'day') {
-    const params = { ...currentFilters, group_by: groupBy };
-    const query = buildQueryString(params);
-    const res = await fetch(`${API_BASE}/by-period/${query}`);
-    return res.json();
-}
+async function fetchPanel(panel, url, { cache = true } = {}) {
+    if (inFlight[panel]) inFlight[panel].abort();
+    const controller = new AbortController();
+    inFlight[panel] = controller;
 
-async function fetchSalesByCategory() {
-    const query = buildQueryString(currentFilters);
-    const res = await fetch(`${API_BASE}/by-category/${query}`);
-    return res.json();
-}
-
-async function fetchTopCustomers() {
-    const query = buildQueryString({ ...currentFilters, limit: 10 });
-    const res = await fetch(`${API_BASE}/top-customers/${query}`);
-    return res.json();
-}
-
-async function fetchProductDistribution() {
-    const query = buildQueryString({ ...currentFilters, limit: 10 });
-    const res = await fetch(`${API_BASE}/products/${query}`);
-    return res.json();
-}
-
-async function fetchSalesList(page = 1) {
-    const params = { ...currentFilters, page, per_page: 15 };
-    const query = buildQueryString(params);
-    const res = await fetch(`${API_BASE}/list/${query}`);
-    return res.json();
+    const cached = cache ? responseCache.get(url) : undefined;
+    try {
+        const res = await fetch(url, {
+            signal: controller.signal,
+            headers: cached ? { 'If-None-Match': cached.etag } : {}
+        });
+        if (res.status === 304 && cached) {
+            return { data: cached.data, changed: false, watermark: cached.watermark };
+        }
+        if (!res.ok) throw new Error(`HTTP ${res.status} en ${url}`);
+        const data = await res.json();
+        const etag = res.headers.get('ETag');
+        const watermark = res.headers.get('X-Sales-Watermark');
+        if (etag && cache) responseCache.set(url, { etag, data, watermark });
+        return { data, changed: true, watermark };
+    } finally {
+        if (inFlight[panel] === controller) delete inFlight[panel];
+    }
 }
 
 // ============ UI UPDATES ============
@@ -81,25 +74,37 @@ function updateLastUpdate() {
 
 // ============ CHARTS ============
 
-function createTrendChart(data) {
-    const ctx = document.getElementById('sales-trend-chart').getContext('2d');
-    
-    if (charts.trend) charts.trend.destroy();
-    
-    charts.trend = new Chart(ctx, {
+// Crea el gráfico la primera vez; después sólo sustituye etiquetas y datos
+function renderChart(key, canvasId, config) {
+    const chart = charts[key];
+    if (!chart) {
+        charts[key] = new Chart(document.getElementById(canvasId).getContext('2d'), config);
+        return;
+    }
+    chart.data.labels = config.data.labels;
+    config.data.datasets.forEach((dataset, i) => {
+        chart.data.datasets[i].data = dataset.data;
+    });
+    chart.update();
+}
+
+// La serie llega en columnas (?format=columnar): cada una es ya un array para
+// Chart.js. Se copian porque patchTrend las modifica y la respuesta está en caché.
+function createTrendChart({ data }) {
+    renderChart('trend', 'sales-trend-chart', {
         type: 'line',
         data: {
-            labels: data.map(d => d.period),
+            labels: [...data.period],
             datasets: [{
                 label: 'Ventas ($)',
-                data: data.map(d => parseFloat(d.total)),
+                data: [...data.total],
                 borderColor: '#3498db',
                 backgroundColor: 'rgba(52, 152, 219, 0.1)',
                 fill: true,
                 tension: 0.3
             }, {
                 label: 'Órdenes',
-                data: data.map(d => d.count),
+                data: [...data.count],
                 borderColor: '#e74c3c',
                 backgroundColor: 'transparent',
                 yAxisID: 'y1',
@@ -119,11 +124,7 @@ function createTrendChart(data) {
 }
 
 function createCategoryChart(data) {
-    const ctx = document.getElementById('category-chart').getContext('2d');
-    
-    if (charts.category) charts.category.destroy();
-    
-    charts.category = new Chart(ctx, {
+    renderChart('category', 'category-chart', {
         type: 'doughnut',
         data: {
             labels: data.map(d => d.category),
@@ -143,11 +144,7 @@ function createCategoryChart(data) {
 }
 
 function createProductsChart(data) {
-    const ctx = document.getElementById('products-chart').getContext('2d');
-    
-    if (charts.products) charts.products.destroy();
-    
-    charts.products = new Chart(ctx, {
+    renderChart('products', 'products-chart', {
         type: 'bar',
         data: {
             labels: data.map(d => d.product_name),
@@ -167,11 +164,7 @@ function createProductsChart(data) {
 }
 
 function createCustomersChart(data) {
-    const ctx = document.getElementById('customers-chart').getContext('2d');
-    
-    if (charts.customers) charts.customers.destroy();
-    
-    charts.customers = new Chart(ctx, {
+    renderChart('customers', 'customers-chart', {
         type: 'bar',
         data: {
             labels: data.map(d => d.customer_name),
@@ -195,7 +188,11 @@ function createCustomersChart(data) {
 
 // ============ TABLE ============
 
+// Página que muestra la tabla (para aplicarle cambios incrementales)
+let tableData = null;
+
 function updateTable(response) {
+    tableData = response;
     const tbody = document.getElementById('sales-table-body');
     tbody.innerHTML = '';
     
@@ -228,27 +225,74 @@ function updateTable(response) {
 
 // ============ DATA LOADING ============
 
-async function loadAllData() {
-    try {
-        const [kpis, trend, categories, products, customers, sales] = await Promise.all([
-            fetchKPIs(),
-            fetchSalesByPeriod(document.getElementById('period-selector').value),
-            fetchSalesByCategory(),
-            fetchProductDistribution(),
-            fetchTopCustomers(),
-            fetchSalesList(currentPage)
-        ]);
-        
-        updateKPIs(kpis);
-        createTrendChart(trend);
-        createCategoryChart(categories);
-        createProductsChart(products);
-        createCustomersChart(customers);
-        updateTable(sales);
-        updateLastUpdate();
-    } catch (error) {
-        console.error('Error cargando datos:', error);
+// Cada panel: URL según sus entradas (filtros, período, página) y cómo pintarlo
+const panels = {
+    kpis: {
+        url: () => `${API_BASE}/kpis/${buildQueryString(currentFilters)}`,
+        render: updateKPIs
+    },
+    trend: {
+        url: () => `${API_BASE}/by-period/${buildQueryString({
+            ...currentFilters, group_by: document.getElementById('period-selector').value, format: 'columnar'
+        })}`,
+        render: createTrendChart
+    },
+    categories: {
+        url: () => `${API_BASE}/by-category/${buildQueryString(currentFilters)}`,
+        render: createCategoryChart
+    },
+    products: {
+        url: () => `${API_BASE}/products/${buildQueryString({ ...currentFilters, limit: 10 })}`,
+        render: createProductsChart
+    },
+    customers: {
+        url: () => `${API_BASE}/top-customers/${buildQueryString({ ...currentFilters, limit: 10 })}`,
+        render: createCustomersChart
+    },
+    sales: {
+        url: () => `${API_BASE}/list/${buildQueryString({ ...currentFilters, page: currentPage, per_page: 15 })}`,
+        render: updateTable
     }
+};
+
+// URL de los datos que muestra cada panel y su marca del ChangeLog
+// (X-Sales-Watermark), desde la que se piden los cambios con ?since=
+const renderedUrls = {};
+const watermarks = {};
+
+// Datos sin filtros incrustados por la vista (dashboard/snapshot.py): la
+// primera carga no necesita llamar a la API
+function readSnapshot() {
+    const element = document.getElementById('dashboard-snapshot');
+    return element ? JSON.parse(element.textContent) : null;
+}
+
+function renderSnapshot(snapshot) {
+    Object.entries(panels).forEach(([name, panel]) => {
+        panel.render(snapshot[name]);
+        renderedUrls[name] = panel.url();
+        watermarks[name] = snapshot.watermark;
+    });
+    updateLastUpdate();
+}
+
+// Carga los paneles indicados. Los que ya muestran la URL pedida no se piden
+// salvo con ``revalidate``, y sólo se repintan si la respuesta ha cambiado.
+async function loadPanels(names = Object.keys(panels), { revalidate = false } = {}) {
+    const results = await Promise.allSettled(names.map(async (name) => {
+        const url = panels[name].url();
+        if (renderedUrls[name] === url && !revalidate) return;
+        const { data, changed, watermark } = await fetchPanel(name, url);
+        if (changed || renderedUrls[name] !== url) {
+            panels[name].render(data);
+            renderedUrls[name] = url;
+            watermarks[name] = watermark;
+        }
+    }));
+    results
+        .filter(result => result.status === 'rejected' && result.reason.name !== 'AbortError')
+        .forEach(result => console.error('Error cargando datos:', result.reason));
+    updateLastUpdate();
 }
 
 // ============ FILTERS ============
@@ -269,7 +313,151 @@ function clearFilters() {
     document.getElementById('filters-form').reset();
     currentFilters = {};
     currentPage = 1;
-    loadAllData();
+    loadPanels();
+    updateExportLinks();
+    startLiveUpdates();
+}
+
+// ============ TYPEAHEAD ============
+
+// Sugerencias por prefijo para los filtros de cliente y categoría
+// (/api/sales/typeahead/<tipo>/): el formulario no lleva todas las opciones
+async function fetchSuggestions(kind, q) {
+    const res = await fetch(`${API_BASE}/typeahead/${kind}/${buildQueryString({ q, limit: 10 })}`);
+    return res.json();
+}
+
+function setupTypeahead(input, toOption, onPick) {
+    const datalist = document.getElementById(input.getAttribute('list'));
+    let timeout;
+    let requested = 0;
+    let byLabel = new Map();
+
+    input.addEventListener('input', () => {
+        const value = input.value;
+        if (onPick) onPick(byLabel.get(value) ?? null, value);
+        clearTimeout(timeout);
+        timeout = setTimeout(async () => {
+            const current = ++requested;
+            try {
+                const items = await fetchSuggestions(input.dataset.typeahead, value);
+                // Descarta respuestas de una búsqueda ya superada
+                if (current !== requested) return;
+                byLabel = new Map();
+                datalist.replaceChildren(...items.map(item => {
+                    const [label, id] = toOption(item);
+                    byLabel.set(label, id);
+                    return new Option(label, label);
+                }));
+                if (onPick) onPick(byLabel.get(input.value) ?? null, input.value);
+            } catch (error) {
+                console.error('Error cargando sugerencias:', error);
+            }
+        }, 150);
+    });
+}
+
+function setupFilterTypeaheads() {
+    const customerId = document.getElementById('customer');
+    setupTypeahead(
+        document.getElementById('customer-name'),
+        customer => [customer.name, customer.id],
+        // Sólo se filtra por cliente cuando el texto coincide con una sugerencia
+        id => { customerId.value = id ?? ''; }
+    );
+    setupTypeahead(document.getElementById('category'), category => [category, category]);
+}
+
+// ============ LIVE ============
+
+// KPIs empujados por el servidor (/api/sales/live/kpis/, SSE) en lugar de
+// sondear los endpoints; cada evento indica además que hay cambios que aplicar
+let liveSource = null;
+
+// Cambios de un panel desde su marca (?since=); null si ya no muestra esos datos
+async function fetchDelta(panel) {
+    const url = panels[panel].url();
+    if (renderedUrls[panel] !== url || !watermarks[panel]) return null;
+
+    const deltaUrl = new URL(url, window.location.href);
+    deltaUrl.searchParams.set('since', watermarks[panel]);
+    // Cada marca da una URL distinta: las respuestas incrementales no se guardan
+    const { data } = await fetchPanel(`${panel}-delta`, deltaUrl.toString(), { cache: false });
+    if (data.reset) {
+        await loadPanels([panel], { revalidate: true });
+        return null;
+    }
+    watermarks[panel] = data.watermark;
+    return data;
+}
+
+async function patchTrend() {
+    const delta = await fetchDelta('trend');
+    const chart = charts.trend;
+    if (!delta || !chart || !delta.periods.length) return;
+
+    const labels = chart.data.labels;
+    const [totals, counts] = chart.data.datasets;
+    delta.periods.forEach(period => {
+        let index = labels.indexOf(period.period);
+        if (period.count === 0) {
+            if (index !== -1) [labels, totals.data, counts.data].forEach(values => values.splice(index, 1));
+            return;
+        }
+        if (index === -1) {
+            index = labels.findIndex(label => label > period.period);
+            if (index === -1) index = labels.length;
+            [labels, totals.data, counts.data].forEach(values => values.splice(index, 0, null));
+        }
+        labels[index] = period.period;
+        totals.data[index] = parseFloat(period.total);
+        counts.data[index] = period.count;
+    });
+    chart.update();
+}
+
+// Sólo la primera página: las ventas nuevas entran arriba
+async function patchTable() {
+    if (currentPage !== 1 || !tableData) return;
+    const delta = await fetchDelta('sales');
+    if (!delta || (!delta.upserted.length && !delta.removed.length)) return;
+
+    const rows = tableData.data;
+    const shown = new Set(rows.map(sale => sale.id));
+    const oldest = rows.length ? Date.parse(rows[rows.length - 1].sale_date) : -Infinity;
+    const changed = new Set([...delta.removed, ...delta.upserted.map(sale => sale.id)]);
+    const incoming = delta.upserted.filter(sale =>
+        shown.has(sale.id) || rows.length < tableData.per_page || Date.parse(sale.sale_date) >= oldest
+    );
+    const added = incoming.filter(sale => !shown.has(sale.id)).length;
+    const removed = delta.removed.filter(id => shown.has(id)).length;
+
+    const data = [...incoming, ...rows.filter(sale => !changed.has(sale.id))]
+        .sort((a, b) => Date.parse(b.sale_date) - Date.parse(a.sale_date) || b.id - a.id)
+        .slice(0, tableData.per_page);
+    // Total aproximado hasta la siguiente recarga completa de la tabla
+    const total = Math.max(tableData.total + added - removed, data.length);
+    updateTable({ ...tableData, data, total, total_pages: Math.max(1, Math.ceil(total / tableData.per_page)) });
+}
+
+async function applyDeltas() {
+    const results = await Promise.allSettled([patchTrend(), patchTable()]);
+    results
+        .filter(result => result.status === 'rejected' && result.reason.name !== 'AbortError')
+        .forEach(result => console.error('Error aplicando cambios:', result.reason));
+}
+
+function startLiveUpdates() {
+    if (!window.EventSource) return;
+    if (liveSource) liveSource.close();
+
+    liveSource = new EventSource(`${API_BASE}/live/kpis/${buildQueryString(currentFilters)}`);
+    liveSource.addEventListener('kpis', (event) => {
+        updateKPIs(JSON.parse(event.data).kpis);
+        // La serie y la tabla se ponen al día con ?since= (sólo lo cambiado)
+        applyDeltas();
+        updateLastUpdate();
+    });
 }
 
 // ============ EXPORT ============
@@ -278,54 +466,62 @@ function updateExportLinks() {
     const query = buildQueryString(currentFilters);
     document.getElementById('export-csv').href = `/reports/export/csv/${query}`;
     document.getElementById('export-pdf').href = `/reports/export/pdf/${query}`;
+    document.getElementById('export-pdf-full').href =
+        `/reports/export/pdf/${buildQueryString({ ...currentFilters, mode: 'full' })}`;
 }
 
 // ============ EVENT LISTENERS ============
 
 document.addEventListener('DOMContentLoaded', () => {
     // Carga inicial
-    loadAllData();
+    const snapshot = readSnapshot();
+    if (snapshot) {
+        renderSnapshot(snapshot);
+    } else {
+        loadPanels();
+    }
     updateExportLinks();
+    startLiveUpdates();
+
+    setupFilterTypeaheads();
     
     // Filtros
     document.getElementById('filters-form').addEventListener('submit', (e) => {
         e.preventDefault();
         currentFilters = getFiltersFromForm();
         currentPage = 1;
-        loadAllData();
+        // Reenviar los mismos filtros comprueba si hay datos nuevos (ETag)
+        loadPanels(undefined, { revalidate: true });
         updateExportLinks();
+        startLiveUpdates();
     });
     
     document.getElementById('clear-filters').addEventListener('click', clearFilters);
     
     // Selector de período
-    document.getElementById('period-selector').addEventListener('change', async (e) => {
-        const data = await fetchSalesByPeriod(e.target.value);
-        createTrendChart(data);
-    });
+    document.getElementById('period-selector').addEventListener('change', () => loadPanels(['trend']));
     
     // Paginación
-    document.getElementById('prev-page').addEventListener('click', async () => {
+    document.getElementById('prev-page').addEventListener('click', () => {
         if (currentPage > 1) {
-            const data = await fetchSalesList(currentPage - 1);
-            updateTable(data);
+            currentPage -= 1;
+            loadPanels(['sales']);
         }
     });
     
-    document.getElementById('next-page').addEventListener('click', async () => {
-        const data = await fetchSalesList(currentPage + 1);
-        updateTable(data);
+    document.getElementById('next-page').addEventListener('click', () => {
+        currentPage += 1;
+        loadPanels(['sales']);
     });
     
     // Búsqueda en tabla (debounce)
     let searchTimeout;
     document.getElementById('table-search').addEventListener('input', (e) => {
         clearTimeout(searchTimeout);
-        searchTimeout = setTimeout(async () => {
+        searchTimeout = setTimeout(() => {
             currentFilters.search = e.target.value;
             currentPage = 1;
-            const data = await fetchSalesList(1);
-            updateTable(data);
+            loadPanels(['sales']);
         }, 300);
     });
 });
@@ -3,12 +3,16 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 from django.db.models import Count
+from revintel.query_budget import QueryBudgetMixin
 from .models import RevUser
 
 
 @admin.register(RevUser)
-class RevUserAdmin(BaseUserAdmin):
+class RevUserAdmin(QueryBudgetMixin, BaseUserAdmin):
     """Administrador personalizado para usuarios extendidos"""
+
+    changelist_query_budget = 7
+    changeform_query_budget = 8
     
     # Campos a mostrar en la lista
     list_display = [